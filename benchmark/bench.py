@@ -0,0 +1,184 @@
+"""
+Latency benchmark suite for the DynamoDB, DAX, Redis and MySQL read paths
+
+python bench.py dax-query ddb-query redis --requests 1000 --concurrency 8
+python bench.py dax-get --mode open --rate 200 --duration 30 --output run.json --baseline base.json
+python bench.py dax-get redis ddb-get --mode open --arrival poisson --sweep 100,200,400,800
+DDB_BACKEND=local python bench.py dax-query ddb-query    # offline, see common/local_backend.py
+"""
+
+import os
+import sys
+import argparse
+import importlib.util
+from harness import (
+    run_closed_loop,
+    save_results,
+    load_results,
+    compare,
+    format_results,
+)
+from loadgen import run_open_loop, sweep
+
+# repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# app directories holding the client modules
+APPS = {
+    "restaurant": os.path.join(ROOT, "dynamodb-dax", "web-app-restaurant"),
+    "gameplayer": os.path.join(ROOT, "dynamodb-dax", "web-app"),
+    "mysql": os.path.join(ROOT, "rds-elastic-redis", "web-app"),
+}
+# number of keys each target cycles through
+NUM_KEYS = 100
+
+
+def load_module(app, name):
+    """
+    import a client module from an app directory, which also becomes the working
+    directory since the modules read items.json and configs.json relative to it
+    """
+    module_name = f"{app}_{name}"
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    path = APPS[app]
+    os.chdir(path)
+    sys.path.insert(0, path)
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(path, name + ".py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def restaurant_query(mode):
+    """
+    GSI1 query for a restaurant and its latest reviews
+    """
+    dax_client = load_module("restaurant", "dax_client")
+    client = dax_client.get_client(mode)
+    names = dax_client.scan_restaurant(limit=NUM_KEYS)
+    return lambda index: dax_client.fetch_restaurant_summary(client, names[index % len(names)])
+
+
+def gameplayer_get(mode):
+    """
+    get_item by primary key on the GamePlayer table
+    """
+    dax_client = load_module("gameplayer", "dax_client")
+    table = dax_client.get_table(dax_client.TABLE_NAME, mode)
+    user_ids = dax_client.scan_user_ids(dax_client.TABLE_NAME, NUM_KEYS, mode)
+    return lambda index: table.get_item(Key={"UserId": user_ids[index % len(user_ids)]})
+
+
+def redis_read_through():
+    """
+    restaurant summary through the Redis read-through cache
+    """
+    redis_client = load_module("restaurant", "redis_client")
+    names = redis_client.scan_restaurant(limit=NUM_KEYS)
+    return lambda index: redis_client.restaurant_cache.get(names[index % len(names)])
+
+
+def mysql_query(cached):
+    """
+    first page of the demo search, straight to MySQL or through the Redis cache
+    """
+    cacheLib = load_module("mysql", "cacheLib")
+    configs = cacheLib.context.configs
+    query = cacheLib.query_mysql_and_cache if cached else cacheLib.query_mysql
+    sql, params = cacheLib.build_query(cacheLib.context.search_term)
+    args = (sql, configs["db_host"], configs["db_username"], configs["db_password"], configs["db_name"], params)
+    return lambda index: query(*args)
+
+
+# target name -> factory returning a callable issuing request number index
+TARGETS = {
+    "ddb-query": lambda: restaurant_query("ddb"),
+    "dax-query": lambda: restaurant_query("dax"),
+    "ddb-get": lambda: gameplayer_get("ddb"),
+    "dax-get": lambda: gameplayer_get("dax"),
+    "redis": redis_read_through,
+    "mysql": lambda: mysql_query(False),
+    "mysql-cache": lambda: mysql_query(True),
+}
+
+
+def plot_results(results, path):
+    """
+    percentile curve per target, labels follow the plotted lines
+    """
+    import matplotlib.pyplot as plt
+    fig, axes = plt.subplots(1, 1, figsize=(10, 5))
+    for target, result in results.items():
+        latency = result["latency_ms"]
+        names = ["p50", "p90", "p99", "p999"]
+        axes.plot(names, [latency[name] for name in names], "--o", markersize=3, linewidth=0.5, label=target)
+    axes.legend()
+    axes.set_ylabel("milisecond")
+    axes.set_xlabel("percentile")
+    axes.set_ylim(bottom=0)
+    fig.suptitle("read latency")
+    fig.savefig(path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="latency benchmark for the cache demos")
+    parser.add_argument("targets", nargs="+", choices=sorted(TARGETS))
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--requests", type=int, default=1000, help="closed loop request count")
+    parser.add_argument("--concurrency", type=int, default=1, help="closed loop workers, open loop max in flight")
+    parser.add_argument("--warmup", type=int, default=10, help="discarded requests before measuring")
+    parser.add_argument("--rate", type=float, default=100.0, help="open loop requests per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="open loop seconds")
+    parser.add_argument("--arrival", choices=["constant", "poisson"], default="constant", help="open loop arrivals")
+    parser.add_argument("--seed", type=int, help="poisson arrival seed")
+    parser.add_argument("--sweep", help="comma separated open loop rates, reports where latency degrades")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare against saved JSON results")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative regression")
+    parser.add_argument("--plot", help="save a percentile plot")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # resolve paths before modules change the working directory
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    plot = os.path.abspath(args.plot) if args.plot else None
+
+    # the app modules log at ERROR only, unless LOG_LEVEL asks otherwise
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    results = {}
+    for target in args.targets:
+        fn = TARGETS[target]()
+        if args.sweep:
+            rates = [float(rate) for rate in args.sweep.split(",")]
+            swept = sweep(fn, rates, args.duration, args.concurrency, args.warmup, args.arrival, args.seed)
+            for result in swept["results"]:
+                results[f'{target}@{result["rate"]:g}'] = result
+            print(f'{target} degrades at {swept["knee_rate"]} req/s' if swept["knee_rate"] else f"{target} held every rate")
+            continue
+        if args.mode == "open":
+            results[target] = run_open_loop(
+                fn, args.rate, args.duration, args.concurrency, args.warmup, args.arrival, args.seed
+            )
+        else:
+            results[target] = run_closed_loop(fn, args.requests, args.concurrency, args.warmup)
+        results[target]["warmup"] = args.warmup
+    print(format_results(results))
+
+    if output:
+        save_results(results, output)
+    if plot:
+        plot_results(results, plot)
+    if baseline:
+        regressions = compare(results, load_results(baseline), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Latency benchmark harness
+warmup, closed-loop load, log-bucketed percentiles, throughput,
+JSON results and comparison against a saved baseline,
+open-loop load lives in loadgen.py
+"""
+
+import os
+import sys
+import json
+import threading
+import time
+# helpers shared by the demo apps, see common/ at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.histogram import Histogram, PERCENTILES
+
+
+def timed_call(fn, index, histogram, errors):
+    """
+    call fn once and record its latency in ms, counting failures
+    """
+    start = time.perf_counter()
+    try:
+        fn(index)
+    except Exception:
+        errors.append(index)
+        return
+    histogram.record((time.perf_counter() - start) * 1000)
+
+
+def warm_up(fn, warmup):
+    """
+    run and discard the first calls, replacing the old [1:] / [10:] slicing
+    """
+    for index in range(warmup):
+        try:
+            fn(index)
+        except Exception:
+            pass
+
+
+def run_closed_loop(fn, requests=1000, concurrency=1, warmup=10):
+    """
+    concurrency workers each issue the next request as soon as the previous one returns
+    """
+    warm_up(fn, warmup)
+    histogram, errors = Histogram(), []
+    counter = iter(range(requests))
+    counter_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with counter_lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            timed_call(fn, index, histogram, errors)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return report("closed", histogram, errors, elapsed, concurrency=concurrency)
+
+
+def report(mode, histogram, errors, elapsed, **settings):
+    """
+    machine readable result of one run
+    """
+    result = {
+        "mode": mode,
+        "requests": histogram.count + len(errors),
+        "errors": len(errors),
+        "seconds": elapsed,
+        "throughput_rps": histogram.count / elapsed if elapsed else 0.0,
+        "latency_ms": histogram.summary(),
+    }
+    result.update(settings)
+    return result
+
+
+def save_results(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    list regressions against a baseline: higher percentiles or lower throughput
+    by more than tolerance, for every target present in both
+    """
+    regressions = []
+    for target, result in results.items():
+        # only runs of the same load model are comparable
+        if target not in baseline or baseline[target]["mode"] != result["mode"]:
+            continue
+        base = baseline[target]
+        for name in PERCENTILES:
+            current, previous = result["latency_ms"][name], base["latency_ms"][name]
+            if previous and current > previous * (1 + tolerance):
+                regressions.append(f"{target} {name} {previous:.3f}ms -> {current:.3f}ms")
+        current, previous = result["throughput_rps"], base["throughput_rps"]
+        if previous and current < previous * (1 - tolerance):
+            regressions.append(f"{target} throughput {previous:.1f}/s -> {current:.1f}/s")
+    return regressions
+
+
+def format_results(results):
+    """
+    one line per target for the console
+    """
+    lines = [f'{"target":<18}{"mode":<8}{"rps":>10}{"p50":>10}{"p99":>10}{"p999":>10}{"errors":>8}']
+    for target, result in results.items():
+        latency = result["latency_ms"]
+        lines.append(
+            f'{target:<18}{result["mode"]:<8}{result["throughput_rps"]:>10.1f}'
+            f'{latency["p50"]:>10.3f}{latency["p99"]:>10.3f}{latency["p999"]:>10.3f}{result["errors"]:>8}'
+        )
+    return "\n".join(lines)
@@ -0,0 +1,93 @@
+"""
+Open-loop load generator
+requests start on a fixed-rate schedule (constant or Poisson arrivals) and
+latency is measured from the intended start, so time spent queued behind a
+slow request is counted instead of hidden (coordinated omission)
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from harness import Histogram, warm_up, report
+
+# a request counts as started late when it waited longer than this, in ms
+LATE_START_MS = 1.0
+# a sweep step degrades when its p99 grows past this factor of the first step
+DEGRADED_P99_FACTOR = 2.0
+# or when it completes less than this fraction of the target rate
+DEGRADED_THROUGHPUT = 0.95
+
+
+def arrival_times(rate, duration, arrival="constant", seed=None):
+    """
+    intended start offsets in seconds: evenly spaced, or exponential gaps for Poisson arrivals
+    """
+    if arrival == "constant":
+        return [index / rate for index in range(int(rate * duration))]
+    rng = random.Random(seed)
+    offsets, offset = [], rng.expovariate(rate)
+    while offset < duration:
+        offsets.append(offset)
+        offset += rng.expovariate(rate)
+    return offsets
+
+
+def run_open_loop(fn, rate=100.0, duration=10.0, concurrency=16, warmup=10, arrival="constant", seed=None):
+    """
+    send requests at their intended start times whether or not earlier ones returned,
+    recording both the corrected response time (end - intended start) and the
+    service time (end - actual start)
+    """
+    warm_up(fn, warmup)
+    response, service = Histogram(), Histogram()
+    errors, late = [], []
+    offsets = arrival_times(rate, duration, arrival, seed)
+
+    def call(index, intended):
+        started = time.perf_counter()
+        try:
+            fn(index)
+        except Exception:
+            errors.append(index)
+            return
+        ended = time.perf_counter()
+        service.record((ended - started) * 1000)
+        response.record((ended - intended) * 1000)
+        if (started - intended) * 1000 > LATE_START_MS:
+            late.append(index)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for index, offset in enumerate(offsets):
+            intended = start + offset
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            # a late dispatch still keeps its intended start time
+            executor.submit(call, index, intended)
+    elapsed = time.perf_counter() - start
+
+    result = report("open", response, errors, elapsed, concurrency=concurrency, rate=rate, arrival=arrival)
+    result["service_ms"] = service.summary()
+    result["late_starts"] = len(late)
+    return result
+
+
+def sweep(fn, rates, duration=10.0, concurrency=16, warmup=10, arrival="constant", seed=None):
+    """
+    run the open loop at increasing rates and find the first rate where latency degrades,
+    either p99 beyond DEGRADED_P99_FACTOR times the lowest rate or throughput below target
+    """
+    results, knee = [], None
+    for rate in sorted(rates):
+        result = run_open_loop(fn, rate, duration, concurrency, warmup, arrival, seed)
+        results.append(result)
+        reference = results[0]["latency_ms"]["p99"]
+        degraded = (
+            result["latency_ms"]["p99"] > reference * DEGRADED_P99_FACTOR
+            or result["throughput_rps"] < rate * DEGRADED_THROUGHPUT
+        )
+        if degraded and knee is None:
+            knee = rate
+    return {"results": results, "knee_rate": knee}
@@ -0,0 +1,5 @@
+"""
+Helpers shared by the DynamoDB, DAX, Redis and MySQL demo apps
+the app modules put the repository root on sys.path and import from here, so
+every app and the benchmark run the same copy
+"""
@@ -0,0 +1,91 @@
+"""
+Leveled logging
+records are queued to a listener thread that formats and writes them, so request
+threads never wait on stdout or format a message that is filtered out, per item
+records go to a sampled child logger
+
+LOG_LEVEL=DEBUG python app.py                  # per item latencies
+LOG_LEVEL=DEBUG LOG_SAMPLE=0.01 python app.py  # one item in a hundred
+LOG_LEVEL=ERROR python app.py                  # errors only
+"""
+
+import os
+import queue
+import atexit
+import logging
+import itertools
+from logging.handlers import QueueHandler, QueueListener
+
+# parent of every app logger
+ROOT = "app"
+# level used unless LOG_LEVEL is set
+DEFAULT_LEVEL = "INFO"
+# level of benchmark runs, the logging cost would be part of the latencies
+QUIET_LEVEL = "ERROR"
+# fraction of per item records written at debug level
+LOG_SAMPLE = float(os.environ.get("LOG_SAMPLE", 1.0))
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+# listener thread draining the queue, started on first use
+listener = None
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    queue the record unformatted, the message is built on the listener thread,
+    safe since the queue never leaves the process
+    """
+    def prepare(self, record):
+        return record
+
+
+class Sample(logging.Filter):
+    """
+    pass one record in every 1 / rate
+    """
+    def __init__(self, rate):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self.counter = itertools.count()
+
+    def filter(self, record):
+        return self.every > 0 and next(self.counter) % self.every == 0
+
+
+def setup(level=None):
+    """
+    attach the queue handler to the app logger and start the listener, once
+    """
+    global listener
+    root = logging.getLogger(ROOT)
+    if listener is None:
+        records = queue.SimpleQueue()
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        listener = QueueListener(records, handler)
+        root.addHandler(DeferredQueueHandler(records))
+        root.propagate = False
+        root.setLevel(os.environ.get("LOG_LEVEL", DEFAULT_LEVEL).upper())
+        listener.start()
+        # flush what is queued at exit
+        atexit.register(listener.stop)
+    if level is not None:
+        root.setLevel(level)
+    return root
+
+
+def quiet():
+    """
+    errors only unless LOG_LEVEL asks otherwise, for benchmark runs
+    """
+    setup(os.environ.get("LOG_LEVEL", QUIET_LEVEL).upper())
+
+
+def get_logger(name, sample=None):
+    """
+    logger under the app logger, sampled when a rate below 1 is given
+    """
+    setup()
+    logger = logging.getLogger(f"{ROOT}.{name}")
+    if sample is not None and sample < 1 and not logger.filters:
+        logger.addFilter(Sample(sample))
+    return logger
@@ -0,0 +1,177 @@
+"""
+Parallel bulk loader
+stream items into a table with 25-item BatchWriteItem requests
+"""
+
+import json
+import math
+import queue
+import random
+import threading
+import time
+import boto3
+from boto3.dynamodb.types import TypeSerializer
+from .applog import get_logger
+
+# max items per BatchWriteItem request
+BATCH_WRITE_SIZE = 25
+# number of writer threads
+NUM_WORKERS = 8
+# max retries of one batch before giving up
+MAX_RETRIES = 10
+# items buffered per worker
+QUEUE_SIZE = 1000
+# low-level item serializer
+serializer = TypeSerializer()
+log = get_logger(__name__)
+
+
+class RateLimiter:
+    """
+    token bucket refilled at a write capacity rate, halved on throttling
+    and slowly raised back to the provisioned rate on success
+    """
+    def __init__(self, rate):
+        self.max_rate = rate
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens):
+        if not self.max_rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                # a request larger than one second of capacity waits for a full bucket
+                if self.tokens >= min(tokens, self.rate):
+                    self.tokens -= tokens
+                    return
+                wait = (min(tokens, self.rate) - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def throttled(self):
+        with self.lock:
+            if self.max_rate:
+                self.rate = max(1.0, self.rate / 2)
+
+    def succeeded(self):
+        with self.lock:
+            if self.max_rate:
+                self.rate = min(self.max_rate, self.rate + 1.0)
+
+
+def provisioned_wcu(table_name, client=None):
+    """
+    provisioned write capacity of a table, None for on-demand tables
+    """
+    res = (client or boto3.client("dynamodb")).describe_table(TableName=table_name)
+    wcu = res["Table"].get("ProvisionedThroughput", {}).get("WriteCapacityUnits", 0)
+    return wcu or None
+
+
+def iter_items_from_file(path):
+    """
+    stream one json item per line
+    """
+    with open(path, "r") as f:
+        for row in f:
+            if row.strip():
+                yield json.loads(row)
+
+
+def write_units(item):
+    """
+    write capacity consumed by an item, one unit per started KB
+    """
+    return max(1, math.ceil(len(json.dumps(item, default=str)) / 1024))
+
+
+def request_key(request):
+    """
+    identity of a write request, unprocessed items come back as equal copies
+    """
+    return json.dumps(request, sort_keys=True, default=str)
+
+
+def bulk_load(client, table_name, items, partition_key, num_workers=NUM_WORKERS, wcu=None):
+    """
+    stream items to worker threads partitioned by partition key, each sending 25-item
+    BatchWriteItem requests, and report items/sec and throttle counts
+    """
+    limiter = RateLimiter(wcu)
+    queues = [queue.Queue(maxsize=QUEUE_SIZE) for _ in range(num_workers)]
+    stats = {"items": 0, "batches": 0, "throttles": 0, "retries": 0, "errors": 0}
+    stats_lock = threading.Lock()
+    done = object()
+
+    def send(batch):
+        requests = [{"PutRequest": {"Item": item}} for item, _ in batch]
+        sizes = {request_key(request): size for request, (_, size) in zip(requests, batch)}
+        units = sum(size for _, size in batch)
+        throttles, retries = 0, 0
+        for attempt in range(MAX_RETRIES + 1):
+            limiter.acquire(units)
+            try:
+                res = client.batch_write_item(RequestItems={table_name: requests})
+                requests = res.get("UnprocessedItems", {}).get(table_name, [])
+            except Exception as e:
+                code = getattr(e, "response", {}).get("Error", {}).get("Code", "")
+                if code not in ("ProvisionedThroughputExceededException", "ThrottlingException"):
+                    log.error("batch write failed: %s", e)
+                    break
+            if not requests:
+                limiter.succeeded()
+                break
+            # unprocessed items or a throttled request
+            throttles += 1
+            retries += 1
+            limiter.throttled()
+            # retried items are charged by size like the first send
+            units = sum(sizes.get(request_key(request), 1) for request in requests)
+            time.sleep(random.uniform(0, min(5.0, 0.05 * 2 ** attempt)))
+        with stats_lock:
+            stats["items"] += len(batch) - len(requests)
+            stats["batches"] += 1
+            stats["throttles"] += throttles
+            stats["retries"] += retries
+            stats["errors"] += len(requests)
+
+    def worker(items_queue):
+        batch = []
+        while True:
+            entry = items_queue.get()
+            if entry is done:
+                break
+            batch.append(entry)
+            if len(batch) == BATCH_WRITE_SIZE:
+                send(batch)
+                batch = []
+        if batch:
+            send(batch)
+
+    threads = [threading.Thread(target=worker, args=(q,), daemon=True) for q in queues]
+    for thread in threads:
+        thread.start()
+
+    start = time.perf_counter()
+    for item in items:
+        # same partition key always goes to the same worker
+        index = hash(item[partition_key]) % num_workers
+        queues[index].put(({name: serializer.serialize(value) for name, value in item.items()}, write_units(item)))
+    for q in queues:
+        q.put(done)
+    for thread in threads:
+        thread.join()
+    end = time.perf_counter()
+
+    stats["seconds"] = end - start
+    stats["items_per_sec"] = stats["items"] / stats["seconds"] if stats["seconds"] else 0.0
+    log.info(
+        "loaded %d items in %.2fs (%.1f items/sec), %d throttles, %d failed",
+        stats["items"], stats["seconds"], stats["items_per_sec"], stats["throttles"], stats["errors"],
+    )
+    return stats
@@ -0,0 +1,43 @@
+import os
+import json
+
+# redis_cache reads these at import, the tests use the in-process table and fakeredis
+os.environ.setdefault("REDIS_HOSTNAME", "localhost")
+os.environ.setdefault("MPLBACKEND", "Agg")
+from common import local_backend
+# the backend is read when common.local_backend is first imported, maybe by other tests
+local_backend.BACKEND = "local"
+
+import fakeredis
+import pytest
+
+from common import redis_cache
+
+RESTAURANT = {"PK": "REST#Thai", "SK": "REST#Thai", "GSI1PK": "REST#Thai", "GSI1SK": "REST#Thai", "name": "Thai", "cuisine": "Thai"}
+SEED = [RESTAURANT] + [
+    {"PK": f"USER#user{num}", "SK": "REST#Thai", "GSI1PK": "REST#Thai", "GSI1SK": f"#REVIEW#2022-06-{num:02d}T00:00:00#{num:040d}",
+     "id": f"{num:040d}", "restaurant": "Thai", "username": f"user{num}", "rating": num, "review": "ok",
+     "created_at": f"2022-06-{num:02d}T00:00:00"}
+    for num in range(1, 4)
+]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    server = fakeredis.FakeRedis()
+    monkeypatch.setattr(redis_cache, "r", server)
+    return server
+
+
+@pytest.fixture
+def table(monkeypatch, tmp_path):
+    """
+    Restaurants table of the local backend holding one restaurant and its reviews
+    """
+    path = tmp_path / "seed.json"
+    path.write_text("".join(json.dumps(item) + "\n" for item in SEED))
+    store = local_backend.LocalStore()
+    store.seed("Restaurants", str(path))
+    client = local_backend.LocalDynamoDB(store, latency_ms=0)
+    monkeypatch.setattr(redis_cache, "dynamodb", client)
+    return store.table("Restaurants")
@@ -0,0 +1,59 @@
+"""
+Log bucketed latency histogram
+shared by the benchmark harness and the request tracing of the apps
+"""
+
+import math
+import threading
+
+# relative width of a histogram bucket, percentiles are exact to within it
+HISTOGRAM_PRECISION = 0.01
+# percentiles reported by the benchmark and the metrics endpoints
+PERCENTILES = {"p50": 50.0, "p90": 90.0, "p99": 99.0, "p999": 99.9}
+
+
+class Histogram:
+    """
+    HDR style histogram: values are counted in logarithmic buckets so memory
+    stays constant and percentiles keep a fixed relative precision
+    """
+    def __init__(self, precision=HISTOGRAM_PRECISION):
+        self.base = math.log1p(precision)
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, value):
+        # bucket n holds [exp(n * base), exp((n + 1) * base)), floor keeps sub-millisecond
+        # values in their own negative buckets, zero goes below all of them
+        bucket = math.floor(math.log(value) / self.base) if value > 0 else -math.inf
+        with self.lock:
+            self.counts[bucket] = self.counts.get(bucket, 0) + 1
+            self.count += 1
+            self.total += value
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * percent / 100.0)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                # upper edge of the bucket, clipped to the observed range
+                return min(max(math.exp((bucket + 1) * self.base), self.min), self.max)
+        return self.max
+
+    def summary(self):
+        with self.lock:
+            summary = {name: self.percentile(percent) for name, percent in PERCENTILES.items()}
+            summary["count"] = self.count
+            summary["min"] = self.min if self.count else 0.0
+            summary["max"] = self.max
+            summary["mean"] = self.total / self.count if self.count else 0.0
+        return summary
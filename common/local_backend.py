@@ -0,0 +1,455 @@
+"""
+Local DynamoDB/DAX stand-in
+in-process tables answering the low-level calls used by the demo scripts,
+with simulated network latency and throttling, for offline benchmarks
+
+DDB_BACKEND=local              use this backend instead of AWS
+LOCAL_DDB_LATENCY_MS=5         mean simulated round trip of DynamoDB
+LOCAL_DAX_LATENCY_MS=1         mean simulated round trip of DAX
+LOCAL_LATENCY_JITTER=0.2       relative standard deviation of the round trip
+LOCAL_THROTTLE_RATE=0.0        probability a request or batch entry is throttled
+LOCAL_SEED_FILE=items.json     items loaded into the restaurant tables on start
+"""
+
+import os
+import re
+import json
+import time
+import zlib
+import random
+import threading
+from decimal import Decimal
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from boto3.dynamodb.conditions import ConditionExpressionBuilder
+
+# backend selection
+BACKEND = os.environ.get("DDB_BACKEND", "aws")
+# simulated network
+LATENCY_MS = {
+    "ddb": float(os.environ.get("LOCAL_DDB_LATENCY_MS", 5)),
+    "dax": float(os.environ.get("LOCAL_DAX_LATENCY_MS", 1)),
+}
+LATENCY_JITTER = float(os.environ.get("LOCAL_LATENCY_JITTER", 0.2))
+THROTTLE_RATE = float(os.environ.get("LOCAL_THROTTLE_RATE", 0.0))
+SEED_FILE = os.environ.get("LOCAL_SEED_FILE", "items.json")
+# restaurant tables share a schema
+RESTAURANT_SCHEMA = {
+    "keys": ("PK", "SK"),
+    "indexes": {"GSI1": ("GSI1PK", "GSI1SK")},
+    "wcu": 5,
+}
+# key schemas of the demo tables
+TABLES = {
+    "Restaurants": RESTAURANT_SCHEMA,
+    "RestaurantsDax": RESTAURANT_SCHEMA,
+    "GamePlayer": {"keys": ("UserId", None), "indexes": {}, "wcu": None},
+    "DaxTable": {"keys": ("UserId", "CreatedTime"), "indexes": {}, "wcu": None},
+}
+
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+
+
+def use_local():
+    """
+    true when the scripts should talk to the in-process backend
+    """
+    return BACKEND == "local"
+
+
+class LocalClientError(Exception):
+    """
+    mimics botocore ClientError so callers can read e.response
+    """
+    def __init__(self, code, message):
+        super().__init__(f"{code}: {message}")
+        self.response = {"Error": {"Code": code, "Message": message}}
+
+
+class LocalTable:
+    """
+    items of one table keyed by primary key, plus its key schema
+    """
+    def __init__(self, name, keys, indexes=None, wcu=None):
+        self.name = name
+        self.keys = keys
+        self.indexes = indexes or {}
+        self.wcu = wcu
+        self.items = {}
+
+    def key_attributes(self, index_name=None):
+        if index_name is None:
+            return self.keys
+        if index_name not in self.indexes:
+            raise LocalClientError("ValidationException", f"index {index_name} not found")
+        return self.indexes[index_name]
+
+    def primary_key(self, item):
+        hash_key, range_key = self.keys
+        if hash_key not in item:
+            raise LocalClientError("ValidationException", f"missing key {hash_key}")
+        return (value_of(item[hash_key]), value_of(item[range_key]) if range_key else None)
+
+    def key_item(self, item, index_name=None):
+        names = set(self.keys) | set(self.key_attributes(index_name))
+        return {name: item[name] for name in names if name and name in item}
+
+
+class LocalStore:
+    """
+    tables shared by all local clients, so ddb and dax modes see the same data
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.tables = {
+            name: LocalTable(name, schema["keys"], schema["indexes"], schema["wcu"])
+            for name, schema in TABLES.items()
+        }
+
+    def table(self, name):
+        if name not in self.tables:
+            raise LocalClientError("ResourceNotFoundException", f"table {name} not found")
+        return self.tables[name]
+
+    def seed(self, table_name, path):
+        """
+        load one json item per line into a table
+        """
+        table = self.table(table_name)
+        with open(path, "r") as f:
+            for row in f:
+                if row.strip():
+                    item = serialize_item(json.loads(row))
+                    table.items[table.primary_key(item)] = item
+
+
+class LocalDynamoDB:
+    """
+    low-level client answering query, get_item, put_item, batch_get_item,
+    scan, batch_write_item and describe_table
+    """
+    def __init__(self, store, latency_ms=5.0, jitter=LATENCY_JITTER, throttle_rate=THROTTLE_RATE):
+        self.store = store
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+
+    def network(self):
+        if self.latency_ms > 0:
+            delay = random.gauss(self.latency_ms, self.latency_ms * self.jitter)
+            time.sleep(max(0.0, delay) / 1000)
+
+    def throttled(self):
+        return self.throttle_rate > 0 and random.random() < self.throttle_rate
+
+    def check_throttle(self):
+        if self.throttled():
+            raise LocalClientError("ProvisionedThroughputExceededException", "simulated throttling")
+
+    def describe_table(self, TableName):
+        self.network()
+        table = self.store.table(TableName)
+        return {
+            "Table": {
+                "TableName": TableName,
+                "ItemCount": len(table.items),
+                "ProvisionedThroughput": {"WriteCapacityUnits": table.wcu or 0},
+            }
+        }
+
+    def get_item(self, TableName, Key, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        self.network()
+        self.check_throttle()
+        table = self.store.table(TableName)
+        item = table.items.get(table.primary_key(Key))
+        if item is None:
+            return {}
+        return {"Item": project(item, ProjectionExpression, ExpressionAttributeNames)}
+
+    def put_item(self, TableName, Item, **kwargs):
+        self.network()
+        self.check_throttle()
+        table = self.store.table(TableName)
+        with self.store.lock:
+            table.items[table.primary_key(Item)] = dict(Item)
+        return {}
+
+    def query(self, TableName, KeyConditionExpression, ExpressionAttributeValues=None,
+              ExpressionAttributeNames=None, IndexName=None, ScanIndexForward=True, Limit=None,
+              ExclusiveStartKey=None, ProjectionExpression=None, **kwargs):
+        self.network()
+        self.check_throttle()
+        table = self.store.table(TableName)
+        hash_key, range_key = table.key_attributes(IndexName)
+        conditions = parse_key_condition(KeyConditionExpression, ExpressionAttributeNames or {})
+        values = ExpressionAttributeValues or {}
+        with self.store.lock:
+            candidates = list(table.items.values())
+        items = [
+            item for item in candidates
+            if hash_key in item and all(matches(item, condition, values) for condition in conditions)
+        ]
+        if not any(attribute == hash_key and op == "=" for attribute, op, _ in conditions):
+            raise LocalClientError("ValidationException", f"query needs an equality condition on {hash_key}")
+        # index items with the same range key are kept in primary key order, so pages never overlap
+        def order(item):
+            return (sort_value(item.get(range_key)) if range_key else (0, ""), sort_key(table.primary_key(item)))
+
+        items.sort(key=order, reverse=not ScanIndexForward)
+        return paginate(table, items, Limit, ExclusiveStartKey, IndexName, ProjectionExpression, ExpressionAttributeNames,
+                        order, not ScanIndexForward)
+
+    def scan(self, TableName, Limit=None, ExclusiveStartKey=None, Segment=None, TotalSegments=None,
+             ProjectionExpression=None, ExpressionAttributeNames=None, IndexName=None, **kwargs):
+        self.network()
+        self.check_throttle()
+        table = self.store.table(TableName)
+        def order(item):
+            return sort_key(table.primary_key(item))
+
+        with self.store.lock:
+            items = sorted(table.items.values(), key=order)
+        if TotalSegments:
+            items = [
+                item for item in items
+                if zlib.crc32(repr(table.primary_key(item)[0]).encode()) % TotalSegments == Segment
+            ]
+        return paginate(table, items, Limit, ExclusiveStartKey, IndexName, ProjectionExpression, ExpressionAttributeNames, order)
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self.network()
+        responses, unprocessed = {}, {}
+        if sum(len(request["Keys"]) for request in RequestItems.values()) > 100:
+            raise LocalClientError("ValidationException", "too many items requested for the BatchGetItem call")
+        for table_name, request in RequestItems.items():
+            table = self.store.table(table_name)
+            keys = [table.primary_key(key) for key in request["Keys"]]
+            if len(set(keys)) != len(keys):
+                raise LocalClientError("ValidationException", "provided list of item keys contains duplicates")
+            responses[table_name] = []
+            for key, raw_key in zip(keys, request["Keys"]):
+                if self.throttled():
+                    unprocessed.setdefault(table_name, dict(request, Keys=[]))["Keys"].append(raw_key)
+                    continue
+                item = table.items.get(key)
+                if item is not None:
+                    responses[table_name].append(
+                        project(item, request.get("ProjectionExpression"), request.get("ExpressionAttributeNames"))
+                    )
+        return {"Responses": responses, "UnprocessedKeys": unprocessed}
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self.network()
+        unprocessed = {}
+        if sum(len(requests) for requests in RequestItems.values()) > 25:
+            raise LocalClientError("ValidationException", "too many items requested for the BatchWriteItem call")
+        for table_name, requests in RequestItems.items():
+            table = self.store.table(table_name)
+            keys = [table.primary_key(request["PutRequest"]["Item"] if "PutRequest" in request else request["DeleteRequest"]["Key"])
+                    for request in requests]
+            if len(set(keys)) < len(keys):
+                raise LocalClientError("ValidationException", "provided list of item keys contains duplicates")
+            for request in requests:
+                if self.throttled():
+                    unprocessed.setdefault(table_name, []).append(request)
+                    continue
+                with self.store.lock:
+                    if "PutRequest" in request:
+                        item = request["PutRequest"]["Item"]
+                        table.items[table.primary_key(item)] = dict(item)
+                    else:
+                        table.items.pop(table.primary_key(request["DeleteRequest"]["Key"]), None)
+        return {"UnprocessedItems": unprocessed}
+
+
+class LocalTableResource:
+    """
+    resource style Table on top of a local client, taking python values and
+    boto3 conditions like boto3.resource('dynamodb').Table
+    """
+    def __init__(self, client, table_name):
+        self.client = client
+        self.name = table_name
+
+    def get_item(self, Key, **kwargs):
+        res = self.client.get_item(TableName=self.name, Key=serialize_item(Key), **kwargs)
+        if "Item" in res:
+            res["Item"] = deserialize_item(res["Item"])
+        return res
+
+    def put_item(self, Item, **kwargs):
+        return self.client.put_item(TableName=self.name, Item=serialize_item(Item), **kwargs)
+
+    def query(self, KeyConditionExpression, **kwargs):
+        if not isinstance(KeyConditionExpression, str):
+            expression = ConditionExpressionBuilder().build_expression(KeyConditionExpression, is_key_condition=True)
+            KeyConditionExpression = expression.condition_expression
+            kwargs["ExpressionAttributeNames"] = dict(kwargs.get("ExpressionAttributeNames", {}), **expression.attribute_name_placeholders)
+            kwargs["ExpressionAttributeValues"] = dict(kwargs.get("ExpressionAttributeValues", {}), **expression.attribute_value_placeholders)
+        if "ExpressionAttributeValues" in kwargs:
+            kwargs["ExpressionAttributeValues"] = serialize_item(kwargs["ExpressionAttributeValues"])
+        if "ExclusiveStartKey" in kwargs:
+            kwargs["ExclusiveStartKey"] = serialize_item(kwargs["ExclusiveStartKey"])
+        res = self.client.query(TableName=self.name, KeyConditionExpression=KeyConditionExpression, **kwargs)
+        return self.deserialize_page(res)
+
+    def scan(self, **kwargs):
+        if "ExclusiveStartKey" in kwargs:
+            kwargs["ExclusiveStartKey"] = serialize_item(kwargs["ExclusiveStartKey"])
+        return self.deserialize_page(self.client.scan(TableName=self.name, **kwargs))
+
+    def delete(self):
+        table = self.client.store.table(self.name)
+        with self.client.store.lock:
+            table.items.clear()
+        return {"TableDescription": {"TableName": self.name}}
+
+    def deserialize_page(self, res):
+        res["Items"] = [deserialize_item(item) for item in res["Items"]]
+        if "LastEvaluatedKey" in res:
+            res["LastEvaluatedKey"] = deserialize_item(res["LastEvaluatedKey"])
+        return res
+
+
+def serialize_item(item):
+    return {name: serializer.serialize(value) for name, value in item.items()}
+
+
+def deserialize_item(item):
+    return {name: deserializer.deserialize(value) for name, value in item.items()}
+
+
+def value_of(attribute):
+    """
+    comparable python value of a typed key attribute
+    """
+    if "N" in attribute:
+        return Decimal(attribute["N"])
+    if "S" in attribute:
+        return attribute["S"]
+    if "B" in attribute:
+        return bytes(attribute["B"])
+    raise LocalClientError("ValidationException", f"unsupported key type {attribute}")
+
+
+def sort_value(attribute):
+    # items missing the attribute sort first
+    return (0, "") if attribute is None else (1, value_of(attribute))
+
+
+def sort_key(key):
+    return tuple((0, "") if value is None else (1, value) for value in key)
+
+
+def resolve(name, names):
+    return names.get(name, name)
+
+
+def parse_key_condition(expression, names):
+    """
+    split a key condition into (attribute, op, placeholders) tuples,
+    supporting =, <, <=, >, >=, BETWEEN and begins_with
+    """
+    clauses = []
+    for part in re.split(r"\s+AND\s+", expression.strip(), flags=re.IGNORECASE):
+        # the AND inside BETWEEN :a AND :b belongs to the previous clause
+        if clauses and re.search(r"\bBETWEEN\s+\S+$", clauses[-1], re.IGNORECASE):
+            clauses[-1] += " AND " + part
+        else:
+            clauses.append(part)
+
+    conditions = []
+    for clause in clauses:
+        clause = clause.strip().strip("()").strip()
+        m = re.match(r"^begins_with\s*\(\s*([#\w]+)\s*,\s*(:\w+)\s*\)$", clause, re.IGNORECASE)
+        if m:
+            conditions.append((resolve(m.group(1), names), "begins_with", (m.group(2),)))
+            continue
+        m = re.match(r"^([#\w]+)\s+BETWEEN\s+(:\w+)\s+AND\s+(:\w+)$", clause, re.IGNORECASE)
+        if m:
+            conditions.append((resolve(m.group(1), names), "between", (m.group(2), m.group(3))))
+            continue
+        m = re.match(r"^([#\w]+)\s*(=|<=|>=|<|>)\s*(:\w+)$", clause)
+        if m:
+            conditions.append((resolve(m.group(1), names), m.group(2), (m.group(3),)))
+            continue
+        raise LocalClientError("ValidationException", f"unsupported key condition {clause}")
+    return conditions
+
+
+def matches(item, condition, values):
+    attribute, op, placeholders = condition
+    if attribute not in item:
+        return False
+    value = value_of(item[attribute])
+    operands = [value_of(values[placeholder]) for placeholder in placeholders]
+    if op == "=":
+        return value == operands[0]
+    if op == "<":
+        return value < operands[0]
+    if op == "<=":
+        return value <= operands[0]
+    if op == ">":
+        return value > operands[0]
+    if op == ">=":
+        return value >= operands[0]
+    if op == "between":
+        return operands[0] <= value <= operands[1]
+    return isinstance(value, str) and value.startswith(operands[0])
+
+
+def project(item, projection, names):
+    if not projection:
+        return dict(item)
+    attributes = [resolve(name.strip(), names or {}) for name in projection.split(",")]
+    return {name: item[name] for name in attributes if name in item}
+
+
+def paginate(table, items, limit, start_key, index_name, projection, names, order, reverse=False):
+    """
+    apply ExclusiveStartKey and Limit, returning LastEvaluatedKey when cut short,
+    items come sorted by order and the page resumes after the sort position of the
+    start key, like DynamoDB, so it works even if that item was deleted since
+    """
+    if start_key:
+        key_names = set(table.keys) | set(table.key_attributes(index_name))
+        if any(name and name not in start_key for name in key_names):
+            raise LocalClientError("ValidationException", "the provided starting key is invalid")
+        start = order(start_key)
+        items = [item for item in items if (order(item) < start if reverse else order(item) > start)]
+    res = {}
+    if limit and len(items) > limit:
+        items = items[:limit]
+        res["LastEvaluatedKey"] = table.key_item(items[-1], index_name)
+    res["Items"] = [project(item, projection, names) for item in items]
+    res["Count"] = len(items)
+    return res
+
+
+# one store shared by every local client in the process
+store = None
+clients = {}
+clients_lock = threading.Lock()
+
+
+def get_local_client(mode="ddb"):
+    """
+    local client for ddb or dax mode, both reading the same tables
+    """
+    global store
+    with clients_lock:
+        if store is None:
+            store = LocalStore()
+            if os.path.exists(SEED_FILE):
+                store.seed("Restaurants", SEED_FILE)
+                store.seed("RestaurantsDax", SEED_FILE)
+        if mode not in clients:
+            clients[mode] = LocalDynamoDB(store, latency_ms=LATENCY_MS.get(mode, LATENCY_MS["ddb"]))
+        return clients[mode]
+
+
+def get_local_table(table_name, mode="ddb"):
+    """
+    resource style table backed by the local client of a mode
+    """
+    return LocalTableResource(get_local_client(mode), table_name)
@@ -0,0 +1,164 @@
+"""
+Restaurant and Review models
+slotted objects built from plain dicts, DynamoDB wire format items or cached json,
+star counts and review text from the wire are decoded on first access
+"""
+
+from .ddb_codec import decode_value
+
+# wire format string tag
+STRING = "S"
+
+
+class Raw:
+    """
+    a wire format value not decoded yet
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+def wire_string(item, name):
+    value = item.get(name)
+    return value[STRING] if value else None
+
+
+def lazy(slot):
+    """
+    property decoding a Raw value on first access and keeping the result
+    """
+    def get(self):
+        value = getattr(self, slot)
+        if type(value) is Raw:
+            value = decode_value(value.value)
+            setattr(self, slot, value)
+        return value
+
+    def set(self, value):
+        setattr(self, slot, value)
+
+    return property(get, set)
+
+
+STAR_FIELDS = ("five_stars", "four_stars", "three_stars", "two_stars", "one_stars")
+
+
+class Restaurant:
+    __slots__ = (
+        "name", "cuisine", "address",
+        "_five_stars", "_four_stars", "_three_stars", "_two_stars", "_one_stars",
+        "reviews", "latency", "cache_latency", "load_latency", "tier",
+    )
+
+    five_stars = lazy("_five_stars")
+    four_stars = lazy("_four_stars")
+    three_stars = lazy("_three_stars")
+    two_stars = lazy("_two_stars")
+    one_stars = lazy("_one_stars")
+
+    def __init__(self, item):
+        self.name = item.get("name")
+        self.cuisine = item.get("cuisine")
+        self.address = item.get("address")
+        self._five_stars = item.get("five_stars", {})
+        self._four_stars = item.get("four_stars", {})
+        self._three_stars = item.get("three_stars", {})
+        self._two_stars = item.get("two_stars", {})
+        self._one_stars = item.get("one_stars", {})
+        self.reviews = []
+        self.latency = -1
+        self.cache_latency = -1
+        self.load_latency = -1
+        self.tier = None
+
+    @classmethod
+    def from_ddb(cls, item):
+        """
+        build from a low-level item, star counts stay encoded until read
+        """
+        restaurant = cls.__new__(cls)
+        restaurant.name = wire_string(item, "name")
+        restaurant.cuisine = wire_string(item, "cuisine")
+        restaurant.address = wire_string(item, "address")
+        for field in STAR_FIELDS:
+            value = item.get(field)
+            setattr(restaurant, "_" + field, Raw(value) if value else {})
+        restaurant.reviews = []
+        restaurant.latency = -1
+        restaurant.cache_latency = -1
+        restaurant.load_latency = -1
+        restaurant.tier = None
+        return restaurant
+
+    @classmethod
+    def from_cache(cls, data):
+        """
+        build from the decoded json written by to_dict, reviews included
+        """
+        restaurant = cls(data)
+        restaurant.reviews = [Review(review) for review in data.get("reviews", [])]
+        return restaurant
+
+    def to_dict(self):
+        data = {
+            "name": self.name,
+            "cuisine": self.cuisine,
+            "address": self.address,
+            "reviews": [review.to_dict() for review in self.reviews],
+            "latency": self.latency,
+            "cache_latency": self.cache_latency,
+            "load_latency": self.load_latency,
+        }
+        for field in STAR_FIELDS:
+            data[field] = getattr(self, field)
+        return data
+
+    def __repr__(self):
+        return "Restaurant<{} -- {}>".format(self.name, self.cuisine)
+
+
+class Review:
+    __slots__ = ("restaurant", "username", "rating", "_review", "id", "created_at")
+
+    review = lazy("_review")
+
+    def __init__(self, item):
+        self.restaurant = item.get("restaurant")
+        self.username = item.get("username")
+        self.rating = item.get("rating")
+        self._review = item.get("review")
+        self.id = item.get("id")
+        self.created_at = item.get("created_at")
+
+    @classmethod
+    def from_ddb(cls, item):
+        """
+        build from a low-level item, the review text stays encoded until read
+        """
+        review = cls.__new__(cls)
+        review.restaurant = wire_string(item, "restaurant")
+        review.username = wire_string(item, "username")
+        rating = item.get("rating")
+        review.rating = decode_value(rating) if rating else None
+        text = item.get("review")
+        review._review = Raw(text) if text else None
+        review.id = wire_string(item, "id")
+        review.created_at = wire_string(item, "created_at")
+        return review
+
+    def to_dict(self):
+        return {
+            "restaurant": self.restaurant,
+            "username": self.username,
+            "rating": self.rating,
+            "review": self.review,
+            "id": self.id,
+            "created_at": self.created_at,
+        }
+
+    def __repr__(self):
+        return "Review<{} -- {} ({})>".format(
+            self.restaurant, self.username, self.created_at
+        )
@@ -0,0 +1,83 @@
+"""
+Rendered page cache
+serves a page from redis with a content hash etag while no restaurant summary
+was written since it was rendered, 304 when the client already holds it, and
+renders uncached while redis is unavailable
+"""
+
+import asyncio
+import functools
+import redis
+from .applog import get_logger
+from .redis_cache import page_key, page_etag, get_cached_page, cache_page
+
+log = get_logger(__name__)
+
+
+def lookup(path, args, etags):
+    """
+    cache key, etag, body and version of a page, the version is None when redis
+    could not be read so the page is rendered but not stored
+    """
+    key = page_key(path, args)
+    try:
+        return (key,) + get_cached_page(key, etags)
+    except redis.RedisError as e:
+        log.warning('page cache unavailable, rendering %s uncached: %s', path, e)
+        return key, None, None, None
+
+
+def store(key, body, version):
+    """
+    etag of a rendered page, stored under its version when redis is available
+    """
+    if version is None:
+        return page_etag(body)
+    try:
+        return cache_page(key, body, version)
+    except redis.RedisError as e:
+        log.warning('page cache unavailable, not storing %s: %s', key, e)
+        return page_etag(body)
+
+
+def page_cached(view):
+    """
+    Flask view decorator, flask is imported here so the module loads without it
+    """
+    from flask import current_app, request, make_response
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key, etag, body, version = lookup(request.path, request.args.items(multi=True), request.if_none_match)
+        if etag and body is None:
+            response = current_app.response_class(status=304)
+        elif body is not None:
+            response = current_app.response_class(body, mimetype='text/html')
+        else:
+            response = make_response(view(*args, **kwargs))
+            etag = store(key, response.get_data(), version)
+        response.set_etag(etag)
+        return response.make_conditional(request)
+    return wrapper
+
+
+def async_page_cached(view):
+    """
+    Quart view decorator, the redis calls run on a worker thread
+    """
+    from quart import current_app, request, make_response
+
+    @functools.wraps(view)
+    async def wrapper(*args, **kwargs):
+        args_items = list(request.args.items(multi=True))
+        key, etag, body, version = await asyncio.to_thread(lookup, request.path, args_items, request.if_none_match)
+        if etag and body is None:
+            response = current_app.response_class("", status=304)
+        elif body is not None:
+            response = current_app.response_class(body, mimetype='text/html')
+        else:
+            response = await make_response(await view(*args, **kwargs))
+            etag = await asyncio.to_thread(store, key, await response.get_data(), version)
+        response.set_etag(etag)
+        return await response.make_conditional(request)
+    return wrapper
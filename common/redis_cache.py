@@ -0,0 +1,548 @@
+"""
+Redis read-through cache of restaurant summaries
+pooled client, DynamoDB or local file loaders, write-through and write-behind
+review updates and the rendered page cache, shared by the restaurant apps
+"""
+
+import os
+import mmap
+import hashlib
+import time
+import random
+import queue
+import threading
+import redis 
+import boto3
+import json
+from decimal import Decimal
+from boto3.dynamodb.types import TypeSerializer
+from .local_backend import use_local, get_local_client
+from .applog import get_logger, quiet, LOG_SAMPLE
+from .scanner import scan_values
+from .models import Restaurant, Review
+from .tracing import span
+import matplotlib.pyplot as plt 
+
+# redis endpoint 
+HOST = os.environ["REDIS_HOSTNAME"].replace(":6379", "")
+# boto3 db client, or the in-process stand-in with DDB_BACKEND=local 
+dynamodb = get_local_client("ddb") if use_local() else boto3.client("dynamodb")
+# table name 
+TABLE_NAME = "Restaurants"
+# loader used on a cache miss: ddb or local 
+CACHE_LOADER = os.environ.get("CACHE_LOADER", "ddb")
+# review update mode: write-through or write-behind 
+CACHE_WRITE_MODE = os.environ.get("CACHE_WRITE_MODE", "write-through")
+# max retries of unprocessed review writes 
+PUT_RETRIES = 8
+# redis connection pool shared by all requests
+POOL = redis.ConnectionPool(
+    host=HOST,
+    port=6379,
+    max_connections=50,
+    socket_keepalive=True,
+    socket_timeout=1.0,
+    socket_connect_timeout=1.0,
+    health_check_interval=30,
+)
+# redis client
+r = redis.Redis(connection_pool=POOL)
+# cache ttl in seconds
+CACHE_TTL = 900
+# rendered pages are kept at most this many seconds 
+PAGE_TTL = int(os.environ.get("PAGE_TTL", 60))
+# bumped on every summary write, pages rendered before a bump are stale 
+PAGE_VERSION_KEY = "page:version"
+# local fallback data, one item per line 
+LOCAL_FILE = "items.json"
+# offset index over the local file, replaced as a whole when the file changes 
+local_index = {"stamp": None, "restaurants": {}, "reviews": {}, "data": None}
+# page summaries, and per item records sampled at debug level 
+log = get_logger(__name__)
+item_log = get_logger(__name__ + '.items', sample=LOG_SAMPLE)
+
+
+def fetch_restaurant_summary(restaurant_name):
+    """
+    fetch from cache and write to cache 
+    """
+    restaurant = restaurant_cache.get(restaurant_name)
+    # hit cache and return 
+    if restaurant.load_latency < 0:
+        item_log.debug('cache query latency %.4fms, using cached result', restaurant.cache_latency)
+        print_restaurant(restaurant)
+        return restaurant
+    # log response 
+    item_log.debug('cache query latency %.4fms, %s load latency %.4fms, using uncached result',
+                   restaurant.cache_latency, CACHE_LOADER, restaurant.load_latency)
+    return restaurant
+
+
+class ReadThroughCache:
+    """
+    redis in front of a pluggable loader, with write-through or write-behind review updates 
+    """
+    def __init__(self, loader, write_mode="write-through"):
+        self.loader = loader
+        self.write_mode = write_mode
+        self.pending = queue.Queue()
+        self.writer = None
+        self.lock = threading.Lock()
+
+    def get(self, restaurant_name):
+        """
+        read from cache, load and write back on a miss, and record per tier latency 
+        """
+        start = time.perf_counter()
+        restaurant = fetch_restaurant_summary_from_cache(restaurant_name)
+        end = time.perf_counter()
+        if restaurant:
+            restaurant.cache_latency = (end - start) * 1000
+            restaurant.latency = restaurant.cache_latency
+            return restaurant
+        restaurant = self.loader(restaurant_name)
+        load_end = time.perf_counter()
+        store_restaurant_summary_in_cache(restaurant)
+        restaurant.cache_latency = (end - start) * 1000
+        restaurant.load_latency = (load_end - end) * 1000
+        # total includes the write back 
+        restaurant.latency = (time.perf_counter() - start) * 1000
+        return restaurant
+
+    def put_review(self, item):
+        """
+        write a review to the db and the cached summary 
+        """
+        if self.write_mode == "write-behind":
+            add_review_to_cache(item)
+            self.pending.put(item)
+            self.start_writer()
+        else:
+            put_reviews_to_db([item])
+            add_review_to_cache(item)
+
+    def start_writer(self):
+        """
+        start the background thread draining write-behind reviews 
+        """
+        with self.lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.drain, daemon=True)
+                self.writer.start()
+
+    def drain(self):
+        """
+        write queued reviews to the db in batches of 25 
+        """
+        while True:
+            items = [self.pending.get()]
+            while len(items) < 25:
+                try:
+                    items.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                put_reviews_to_db(items)
+            except Exception:
+                log.exception('write-behind failed for %d reviews: %s', len(items), [item["id"] for item in items])
+            for _ in items:
+                self.pending.task_done()
+
+    def flush(self):
+        """
+        block until all write-behind reviews reached the db 
+        """
+        self.pending.join()
+
+
+def load_restaurant_summary_from_db(restaurant_name):
+    """
+    loader querying GSI1 for a restaurant and its latest reviews 
+    """
+    with span("db-query", "ddb"):
+        resp = dynamodb.query(
+            TableName=TABLE_NAME,
+            IndexName="GSI1",
+            KeyConditionExpression="GSI1PK = :gsi1pk",
+            ExpressionAttributeValues={
+                ":gsi1pk": {"S": "REST#{}".format(restaurant_name)},
+            },
+            ScanIndexForward=False,
+            Limit=6,
+        )
+    with span("model"):
+        restaurant = Restaurant.from_ddb(resp["Items"][0])
+        restaurant.reviews = [Review.from_ddb(item) for item in resp["Items"][1:]]
+    return restaurant
+
+
+def put_reviews_to_db(items):
+    """
+    write reviews with batch_write_item, one request per key with the last write winning
+    since a batch must not hold the same key twice, and retry unprocessed ones with
+    jittered backoff, raises when some are still unprocessed after PUT_RETRIES 
+    """
+    latest = {(item["PK"], item["SK"]): item for item in items}
+    requests = [
+        {"PutRequest": {"Item": {key: serializer.serialize(value) for key, value in item.items()}}}
+        for item in latest.values()
+    ]
+    for attempt in range(PUT_RETRIES + 1):
+        resp = dynamodb.batch_write_item(RequestItems={TABLE_NAME: requests})
+        requests = resp.get("UnprocessedItems", {}).get(TABLE_NAME, [])
+        if not requests:
+            return
+        time.sleep(random.uniform(0, min(1.0, 0.05 * 2 ** attempt)))
+    raise RuntimeError(f'{len(requests)} reviews unprocessed after {PUT_RETRIES} retries')
+
+
+def add_review_to_cache(item):
+    """
+    add a review to a cached summary, keeping the 5 latest 
+    """
+    key = item["restaurant"]
+    with r.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(key)
+                response = pipe.get(key)
+                # not cached, the next read loads it, pages showing the db are stale 
+                if not response:
+                    pipe.unwatch()
+                    r.incr(PAGE_VERSION_KEY)
+                    return False
+                restaurant = parse_cached_restaurant(response)
+                restaurant.reviews = sorted(
+                    restaurant.reviews + [Review(item)], key=lambda x: (x.created_at, x.id), reverse=True
+                )[:5]
+                pipe.multi()
+                pipe.set(key, json.dumps(restaurant, cls=ObjectEncoder), ex=CACHE_TTL)
+                pipe.incr(PAGE_VERSION_KEY)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                continue
+
+
+def new_review(restaurant_name, username, rating, text=""):
+    """
+    review item in the layout of the sample data, raises ValueError on a bad rating 
+    """
+    if not restaurant_name or not username:
+        raise ValueError("restaurant and username are required")
+    rating = int(rating)
+    if not 1 <= rating <= 5:
+        raise ValueError("rating must be between 1 and 5")
+    created_at = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())
+    review_id = hashlib.sha1(f"{restaurant_name}|{username}|{created_at}".encode()).hexdigest()
+    return {
+        "PK": f"USER#{username}",
+        "SK": f"REST#{restaurant_name}",
+        "GSI1PK": f"REST#{restaurant_name}",
+        # newest first in the descending GSI1 query, as in the cached summary 
+        "GSI1SK": f"#REVIEW#{created_at}#{review_id}",
+        "id": review_id,
+        "restaurant": restaurant_name,
+        "username": username,
+        "rating": rating,
+        "review": text,
+        "created_at": created_at,
+    }
+
+
+def fetch_restaurant_summary_from_db(restaurant_name):
+    """
+    from directory from db 
+    """
+    start = time.perf_counter()
+    with span("db-query", "ddb"):
+        resp = dynamodb.query(
+            TableName="Restaurants",
+            IndexName="GSI1",
+            KeyConditionExpression="GSI1PK = :gsi1pk",
+            ExpressionAttributeValues={
+                ":gsi1pk": {"S": "REST#{}".format(restaurant_name)},
+            },
+            ScanIndexForward=False,
+            Limit=6,
+        )
+    end = time.perf_counter()
+    item_log.debug('db query latency %.4fms', (end - start) * 1000)
+    with span("model"):
+        restaurant = Restaurant.from_ddb(resp["Items"][0])
+        restaurant.reviews = [Review.from_ddb(item) for item in resp["Items"][1:]]
+    restaurant.latency = (end - start) * 1000
+    print_restaurant(restaurant)
+    # return 
+    return restaurant
+
+
+def scan_restaurant(limit=100):
+    """
+    first limit restaurant names of a paged scan reading about limit items 
+    """
+    with span("scan", "ddb"):
+        return scan_values(dynamodb, TABLE_NAME, "restaurant", limit)
+
+
+class ObjectEncoder(json.JSONEncoder):
+    def default(self, o):
+        # numbers deserialized from the db 
+        if isinstance(o, Decimal):
+            return int(o) if o == o.to_integral_value() else float(o)
+        # slotted models 
+        if hasattr(o, "to_dict"):
+            return o.to_dict()
+        return o.__dict__
+
+
+def store_restaurant_summary_in_cache(restaurant):
+    """
+    store to cache
+    """
+    key = restaurant.name
+    with span("cache-set", "redis"):
+        pipe = r.pipeline(transaction=False)
+        pipe.set(key, json.dumps(restaurant, cls=ObjectEncoder), ex=CACHE_TTL)
+        pipe.incr(PAGE_VERSION_KEY)
+        pipe.execute()
+
+    return True
+
+
+def store_restaurant_summaries_in_cache(restaurants):
+    """
+    store many summaries to cache with one pipelined batch 
+    """
+    with span("cache-set", "redis"):
+        pipe = r.pipeline(transaction=False)
+        for restaurant in restaurants:
+            pipe.set(restaurant.name, json.dumps(restaurant, cls=ObjectEncoder), ex=CACHE_TTL)
+        pipe.incr(PAGE_VERSION_KEY)
+        pipe.execute()
+
+    return True
+
+
+def fetch_restaurant_summary_from_cache(restaurant_name):
+    """
+    fetch from cache
+    """
+    with span("cache-get", "redis"):
+        response = r.get(restaurant_name)
+    if response:
+        return parse_cached_restaurant(response)
+    return None
+
+
+def parse_cached_restaurant(response):
+    """
+    build a restaurant from its cached json 
+    """
+    with span("deserialize"):
+        data = json.loads(response)
+    with span("model"):
+        return Restaurant.from_cache(data)
+
+
+def fetch_restaurant_summaries(restaurant_names):
+    """
+    fetch many summaries with one MGET and write the misses back in one batch 
+    """
+    start = time.perf_counter()
+    with span("cache-get", "redis"):
+        responses = r.mget(restaurant_names)
+    end = time.perf_counter()
+    log.info('cache mget latency %.4fms for %d keys', (end - start) * 1000, len(restaurant_names))
+    restaurants, misses = [], []
+    for name, response in zip(restaurant_names, responses):
+        if response:
+            restaurant = parse_cached_restaurant(response)
+        else:
+            load_start = time.perf_counter()
+            restaurant = restaurant_cache.loader(name)
+            restaurant.load_latency = (time.perf_counter() - load_start) * 1000
+            misses.append(restaurant)
+        # every item was served by the same round trip
+        restaurant.cache_latency = (end - start) * 1000
+        restaurant.latency = restaurant.cache_latency + max(restaurant.load_latency, 0)
+        restaurants.append(restaurant)
+    # write back misses 
+    if misses:
+        store_restaurant_summaries_in_cache(misses)
+    log.info('%d cached, %d uncached results', len(restaurant_names) - len(misses), len(misses))
+    return restaurants
+
+
+def page_key(path, args):
+    """
+    response cache key of a route and its sorted query parameters 
+    """
+    query = "&".join(f"{name}={value}" for name, value in sorted(args))
+    return f"page:{path}?{query}"
+
+
+def get_cached_page(key, etags=()):
+    """
+    etag and body of a page rendered since the last summary write, and the current
+    page version to store a fresh rendering under, the body is not fetched when the
+    client already holds the etag 
+    """
+    with span("cache-get", "redis"):
+        pipe = r.pipeline(transaction=False)
+        pipe.hmget(key, "etag", "version")
+        pipe.get(PAGE_VERSION_KEY)
+        (etag, version), current = pipe.execute()
+    current = current or b"0"
+    if etag is None or version != current:
+        return None, None, current
+    etag = etag.decode()
+    if etag in etags:
+        return etag, None, current
+    return etag, r.hget(key, "body"), current
+
+
+def page_etag(body):
+    """
+    etag of a rendered page, a hash of its body 
+    """
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def cache_page(key, body, version):
+    """
+    store a rendered page under the version read before rendering, returns its etag 
+    """
+    etag = page_etag(body)
+    pipe = r.pipeline(transaction=False)
+    pipe.hset(key, mapping={"etag": etag, "version": version, "body": body})
+    pipe.expire(key, PAGE_TTL)
+    pipe.execute()
+    return etag
+
+
+def print_restaurant(restaurant):
+    """
+    log a restaurant and its reviews as one debug record, formatted on the log thread 
+    """
+    item_log.debug('%r %r', restaurant, restaurant.reviews)
+
+
+
+
+def build_local_index(path=LOCAL_FILE):
+    """
+    map restaurant name to the byte range of its record and of its reviews, newest first 
+    """
+    restaurants, reviews = {}, {}
+    offset = 0
+    with open(path, "rb") as f:
+        for row in f:
+            data = json.loads(row)
+            if data["PK"].startswith("REST#"):
+                restaurants[data["name"]] = [offset, len(row)]
+            else:
+                reviews.setdefault(data["restaurant"], []).append([data["created_at"], offset, len(row)])
+            offset += len(row)
+    # stable sort keeps file order for equal timestamps 
+    for name, rows in reviews.items():
+        rows.sort(key=lambda row: row[0], reverse=True)
+        reviews[name] = [[start, length] for _, start, length in rows]
+    return {"restaurants": restaurants, "reviews": reviews}
+
+
+def load_local_index(path=LOCAL_FILE):
+    """
+    load the index from its on-disk copy, rebuilding it when the local file changed,
+    and memory-map the local file so worker processes share its pages 
+    """
+    global local_index
+    stat = os.stat(path)
+    stamp = [stat.st_mtime_ns, stat.st_size]
+    if local_index["stamp"] == stamp:
+        return local_index
+    index_path = path + ".idx"
+    try:
+        with open(index_path, "r") as f:
+            index = json.load(f)
+        if index["stamp"] != stamp:
+            raise ValueError("stale index")
+    except (OSError, ValueError, KeyError):
+        index = build_local_index(path)
+        index["stamp"] = stamp
+        # write then rename so other workers never read a partial index 
+        tmp_path = f"{index_path}.{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+    data = None
+    # an empty file cannot be mapped, its index is empty and never reads data 
+    if stat.st_size:
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # a new snapshot is swapped in, readers keep the one they hold and the old map
+    # is closed when the last of them drops it 
+    local_index = dict(index, data=data)
+    return local_index
+
+
+def fetch_restaurant_summary_from_local(restaurant_name):
+    """
+    look up a restaurant and its 5 latest reviews in the local index 
+    """
+    index = load_local_index()
+    data = index["data"]
+    start, length = index["restaurants"][restaurant_name]
+    with span("db-query", "local"):
+        restaurant = Restaurant(json.loads(data[start:start + length]))
+        restaurant.reviews = [
+            Review(json.loads(data[start:start + length]))
+            for start, length in index["reviews"].get(restaurant_name, [])[:5]
+        ]
+
+    return restaurant
+
+
+
+def test_connect():
+    """
+    test connect redis 
+    """
+    r.ping()
+    log.info("Connected to Redis!")
+
+
+def plot_performance(db_latencies, cache_latencies):
+    """
+    """
+    fig,axes = plt.subplots(1,1,figsize=(10,5))
+    axes.plot(db_latencies,'k--o',markersize=3,linewidth=0.5)
+    axes.plot(cache_latencies,'b--o',markersize=3,linewidth=0.5)
+    axes.legend(['db-query','redis-query'])
+    axes.set_ylabel('milisecond')
+    axes.set_xlabel('read db')
+    axes.set_ylim(bottom=0)
+    fig.suptitle('cache latency')
+    fig.savefig('redis-ddb-performance.png')
+
+
+def fetch_multiple_restaurants(mode='ddb', limit=100):
+    """
+    """
+    names = scan_restaurant(limit=limit)
+    if (mode=='cache'):
+        restaurants = fetch_restaurant_summaries(names)
+    else: 
+        restaurants =  [fetch_restaurant_summary_from_db(name) for name in names]
+    return restaurants 
+
+
+# low-level item serializer 
+serializer = TypeSerializer()
+# loaders for a cache miss 
+LOADERS = {
+    "ddb": load_restaurant_summary_from_db,
+    "local": fetch_restaurant_summary_from_local,
+}
+# read-through cache used by the app 
+restaurant_cache = ReadThroughCache(LOADERS[CACHE_LOADER], write_mode=CACHE_WRITE_MODE)
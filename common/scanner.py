@@ -0,0 +1,85 @@
+"""
+Parallel segmented scan
+stream one attribute of every item without holding the table in memory, and a
+plain paged scan for the few values a page needs
+"""
+
+import os
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+# number of scan segments, one worker thread each
+SCAN_SEGMENTS = int(os.environ.get("SCAN_SEGMENTS", os.cpu_count() or 4))
+# items per scan page
+SCAN_PAGE_SIZE = 1000
+
+
+def scan_page(client, table_name, attribute, page_size, start_key=None, segment=None, total_segments=None):
+    """
+    string values of one scan page and the key to continue from, None after the last page
+    """
+    kwargs = {
+        "TableName": table_name,
+        "ProjectionExpression": "#attr",
+        "ExpressionAttributeNames": {"#attr": attribute},
+        "Limit": page_size,
+    }
+    if total_segments:
+        kwargs["Segment"] = segment
+        kwargs["TotalSegments"] = total_segments
+    if start_key:
+        kwargs["ExclusiveStartKey"] = start_key
+    res = client.scan(**kwargs)
+    values = [item[attribute]["S"] for item in res["Items"] if attribute in item]
+    return values, res.get("LastEvaluatedKey")
+
+
+def scan_values(client, table_name, attribute, limit):
+    """
+    first limit values of a sequential scan, each page asks only for the values still
+    missing, for request paths that need a handful of keys
+    """
+    values, start_key = [], None
+    while len(values) < limit:
+        page, start_key = scan_page(client, table_name, attribute, min(SCAN_PAGE_SIZE, limit - len(values)), start_key)
+        values += page
+        if start_key is None:
+            break
+    return values[:limit]
+
+
+def parallel_scan(client, table_name, attribute, total_segments=SCAN_SEGMENTS, limit=None):
+    """
+    yield the string attribute of every item that has it, scanning segments in parallel
+    and following LastEvaluatedKey until each segment is exhausted
+
+    every round reads the next page of each unfinished segment concurrently and yields
+    the pages in segment order, so a table gives the same sequence on every run, with
+    a limit a page holds at most ceil(remaining / unfinished segments) items so the
+    whole scan reads about limit items instead of a full page per segment
+    """
+    start_keys = {segment: None for segment in range(total_segments)}
+    remaining = limit
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        while start_keys and (remaining is None or remaining > 0):
+            segments = sorted(start_keys)
+            page_size = SCAN_PAGE_SIZE
+            if remaining is not None:
+                page_size = min(page_size, math.ceil(remaining / len(segments)))
+            pages = executor.map(
+                lambda segment: scan_page(
+                    client, table_name, attribute, page_size, start_keys[segment], segment, total_segments
+                ),
+                segments,
+            )
+            for segment, (values, start_key) in zip(segments, list(pages)):
+                if start_key is None:
+                    del start_keys[segment]
+                else:
+                    start_keys[segment] = start_key
+                for value in values:
+                    yield value
+                    if remaining is not None:
+                        remaining -= 1
+                        if not remaining:
+                            return
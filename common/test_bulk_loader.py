@@ -0,0 +1,70 @@
+import time
+
+from common import bulk_loader
+from common.bulk_loader import RateLimiter, bulk_load
+from common.local_backend import LocalDynamoDB, LocalStore
+
+
+def test_rate_limiter_waits_beyond_one_second_of_capacity():
+    limiter = RateLimiter(100)
+    start = time.monotonic()
+    for _ in range(150):
+        limiter.acquire(1)
+    # the first 100 tokens are in the bucket, the next 50 refill at 100/s
+    assert 0.4 <= time.monotonic() - start < 2.0
+
+
+def test_rate_limiter_halves_on_throttle_and_recovers():
+    limiter = RateLimiter(8)
+    limiter.throttled()
+    limiter.throttled()
+    assert limiter.rate == 2
+    for _ in range(10):
+        limiter.succeeded()
+    assert limiter.rate == 8
+
+
+def test_rate_limiter_without_capacity_never_waits():
+    limiter = RateLimiter(None)
+    start = time.monotonic()
+    for _ in range(1000):
+        limiter.acquire(25)
+    assert time.monotonic() - start < 0.5
+
+
+def test_bulk_load_retries_throttled_items():
+    client = LocalDynamoDB(LocalStore(), latency_ms=0, throttle_rate=0.3)
+    items = [{"UserId": f"user-{i}", "score": i} for i in range(200)]
+    stats = bulk_load(client, "GamePlayer", items, "UserId", num_workers=4)
+    assert stats["items"] == 200
+    assert stats["errors"] == 0
+    assert stats["throttles"] > 0
+    assert len(client.store.table("GamePlayer").items) == 200
+
+
+def test_bulk_load_charges_retried_items_by_size(monkeypatch):
+    charges = []
+
+    class RecordingLimiter(RateLimiter):
+        def acquire(self, tokens):
+            charges.append(tokens)
+
+    class FirstHalfUnprocessed:
+        def __init__(self):
+            self.calls = 0
+
+        def batch_write_item(self, RequestItems):
+            self.calls += 1
+            requests = RequestItems["GamePlayer"]
+            if self.calls == 1:
+                # copies, as a real response would deserialize them
+                return {"UnprocessedItems": {"GamePlayer": [dict(r) for r in requests[:2]]}}
+            return {"UnprocessedItems": {}}
+
+    monkeypatch.setattr(bulk_loader, "RateLimiter", RecordingLimiter)
+    monkeypatch.setattr(bulk_loader.time, "sleep", lambda seconds: None)
+    # 3 units each
+    items = [{"UserId": f"user-{i}", "bio": "x" * 2500} for i in range(4)]
+    stats = bulk_load(FirstHalfUnprocessed(), "GamePlayer", items, "UserId", num_workers=1, wcu=100)
+    assert charges == [12, 6]
+    assert stats["items"] == 4
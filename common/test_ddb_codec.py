@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from common.ddb_codec import GAMEPLAYER_SCHEMA, Deserializer, decode_value, for_table
+
+ITEM = {
+    "UserId": "42",
+    "Score": 5310,
+    "CreatedTime": 1655098896759,
+    "ratio": Decimal("0.25"),
+    "active": True,
+    "nickname": None,
+    "tags": {"a", "b"},
+    "levels": {1, 2, 3},
+    "history": [1, "two", {"three": Decimal("3.5")}],
+    "profile": {"city": "Hanoi", "wins": 7},
+}
+
+
+def wire(item):
+    serializer = TypeSerializer()
+    return {name: serializer.serialize(value) for name, value in item.items()}
+
+
+def test_decimal_mode_matches_type_deserializer():
+    raw = wire(ITEM)
+    type_deserializer = TypeDeserializer()
+    expected = {name: type_deserializer.deserialize(value) for name, value in raw.items()}
+    assert Deserializer(GAMEPLAYER_SCHEMA, native_numbers=False).item(raw) == expected
+    assert Deserializer(native_numbers=False).item(raw) == expected
+
+
+def test_native_numbers():
+    item = for_table("GamePlayer").item(wire(ITEM))
+    assert item["Score"] == 5310 and type(item["Score"]) is int
+    assert item["ratio"] == 0.25 and type(item["ratio"]) is float
+    assert item["history"][2]["three"] == 3.5
+    assert item["levels"] == {1, 2, 3}
+
+
+def test_schema_decoder_falls_back_on_an_unexpected_type():
+    # Score is declared N, a string value still decodes
+    raw = wire({"UserId": "1", "Score": "high"})
+    assert for_table("GamePlayer").item(raw) == {"UserId": "1", "Score": "high"}
+    assert decode_value({"NULL": True}) is None
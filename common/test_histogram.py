@@ -0,0 +1,43 @@
+import pytest
+
+from common.histogram import HISTOGRAM_PRECISION, Histogram
+
+
+def close(value, expected):
+    return abs(value - expected) <= expected * HISTOGRAM_PRECISION
+
+
+@pytest.fixture
+def histogram():
+    # 50 x 0.2ms, 40 x 0.5ms, 9 x 5ms, 1 x 50ms
+    histogram = Histogram()
+    for value, count in ((0.2, 50), (0.5, 40), (5.0, 9), (50.0, 1)):
+        for _ in range(count):
+            histogram.record(value)
+    return histogram
+
+
+def test_sub_millisecond_percentiles(histogram):
+    assert close(histogram.percentile(50), 0.2)
+    assert close(histogram.percentile(90), 0.5)
+
+
+def test_multi_millisecond_percentiles(histogram):
+    assert close(histogram.percentile(91), 5.0)
+    assert close(histogram.percentile(99), 5.0)
+    assert histogram.percentile(99.9) == 50.0
+
+
+def test_values_just_below_one_keep_their_precision():
+    histogram = Histogram()
+    histogram.record(0.95)
+    histogram.record(1.5)
+    assert close(histogram.percentile(50), 0.95)
+
+
+def test_summary(histogram):
+    summary = histogram.summary()
+    assert summary["count"] == 100
+    assert summary["min"] == 0.2 and summary["max"] == 50.0
+    assert summary["mean"] == pytest.approx(1.25)
+    assert Histogram().summary()["p99"] == 0.0
@@ -0,0 +1,49 @@
+import pytest
+
+from common.local_backend import LocalClientError, LocalDynamoDB, LocalStore, serialize_item
+
+
+def game_client():
+    store = LocalStore()
+    table = store.table("DaxTable")
+    for i in range(6):
+        item = serialize_item({"UserId": "user-1", "CreatedTime": i})
+        table.items[table.primary_key(item)] = item
+    return LocalDynamoDB(store, latency_ms=0)
+
+
+def query(client, **kwargs):
+    res = client.query(
+        TableName="DaxTable",
+        KeyConditionExpression="UserId = :id",
+        ExpressionAttributeValues={":id": {"S": "user-1"}},
+        **kwargs,
+    )
+    return [int(item["CreatedTime"]["N"]) for item in res["Items"]]
+
+
+def test_page_resumes_after_a_start_key_deleted_since():
+    client = game_client()
+    res = client.query(
+        TableName="DaxTable",
+        KeyConditionExpression="UserId = :id",
+        ExpressionAttributeValues={":id": {"S": "user-1"}},
+        Limit=2,
+    )
+    start_key = res["LastEvaluatedKey"]
+    client.store.table("DaxTable").items.pop(("user-1", 1))
+    assert query(client, ExclusiveStartKey=start_key) == [2, 3, 4, 5]
+    assert query(client, ExclusiveStartKey=start_key, ScanIndexForward=False) == [0]
+
+
+def test_scan_resumes_after_a_missing_start_key():
+    client = game_client()
+    res = client.scan(TableName="DaxTable", ExclusiveStartKey={"UserId": {"S": "user-1"}, "CreatedTime": {"N": "2.5"}})
+    assert [int(item["CreatedTime"]["N"]) for item in res["Items"]] == [3, 4, 5]
+
+
+def test_start_key_without_the_key_attributes_is_rejected():
+    client = game_client()
+    with pytest.raises(LocalClientError) as e:
+        query(client, ExclusiveStartKey={"UserId": {"S": "user-1"}})
+    assert e.value.response["Error"]["Code"] == "ValidationException"
@@ -0,0 +1,26 @@
+from boto3.dynamodb.types import TypeSerializer
+
+from common.models import Raw, Restaurant, Review
+
+
+def wire(item):
+    serializer = TypeSerializer()
+    return {name: serializer.serialize(value) for name, value in item.items()}
+
+
+def test_star_counts_decode_on_first_access():
+    restaurant = Restaurant.from_ddb(wire({"name": "Pho 24", "cuisine": "Vietnamese", "five_stars": 12}))
+    assert type(restaurant._five_stars) is Raw
+    assert restaurant.five_stars == 12
+    assert restaurant._five_stars == 12
+    assert restaurant.one_stars == {}
+
+
+def test_cache_round_trip_keeps_reviews():
+    restaurant = Restaurant.from_ddb(wire({"name": "Pho 24", "cuisine": "Vietnamese", "four_stars": 3}))
+    restaurant.reviews = [
+        Review.from_ddb(wire({"restaurant": "Pho 24", "username": "lan", "rating": 4, "review": "good"}))
+    ]
+    cached = Restaurant.from_cache(restaurant.to_dict())
+    assert cached.to_dict() == restaurant.to_dict()
+    assert cached.reviews[0].review == "good"
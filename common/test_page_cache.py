@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+import redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+from flask import Flask
+from quart import Quart
+
+from common import redis_cache
+from common.page_cache import page_cached, async_page_cached
+
+
+def flask_app(renders):
+    app = Flask(__name__)
+
+    @app.route("/page")
+    @page_cached
+    def page():
+        renders.append(1)
+        return "<html>page</html>"
+    return app
+
+
+def quart_app(renders):
+    app = Quart(__name__)
+
+    @app.route("/page")
+    @async_page_cached
+    async def page():
+        renders.append(1)
+        return "<html>page</html>"
+    return app
+
+
+@pytest.fixture
+def down(monkeypatch):
+    # nothing listens on port 1, every call fails fast with ConnectionError
+    monkeypatch.setattr(redis_cache, "r", redis.Redis(port=1, socket_connect_timeout=0.1, retry=Retry(NoBackoff(), 0)))
+
+
+def test_page_is_served_from_cache_until_a_summary_write(cache):
+    renders = []
+    client = flask_app(renders).test_client()
+    first = client.get("/page")
+    assert first.status_code == 200 and first.headers["ETag"]
+    assert client.get("/page").get_data() == b"<html>page</html>"
+    assert client.get("/page", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+    assert len(renders) == 1
+    cache.incr(redis_cache.PAGE_VERSION_KEY)
+    client.get("/page")
+    assert len(renders) == 2
+
+
+def test_page_renders_uncached_while_redis_is_down(down):
+    renders = []
+    client = flask_app(renders).test_client()
+    for _ in range(2):
+        res = client.get("/page")
+        assert res.status_code == 200 and res.get_data() == b"<html>page</html>"
+    assert len(renders) == 2
+
+
+def test_async_page_cache_matches_the_flask_one(cache):
+    renders = []
+
+    async def requests():
+        client = quart_app(renders).test_client()
+        first = await client.get("/page")
+        cached = await client.get("/page")
+        conditional = await client.get("/page", headers={"If-None-Match": first.headers["ETag"]})
+        return first.status_code, await cached.get_data(), conditional.status_code
+
+    assert asyncio.run(requests()) == (200, b"<html>page</html>", 304)
+    assert len(renders) == 1
+
+
+def test_async_page_renders_uncached_while_redis_is_down(down):
+    renders = []
+
+    async def request():
+        res = await quart_app(renders).test_client().get("/page")
+        return res.status_code, await res.get_data()
+
+    assert asyncio.run(request()) == (200, b"<html>page</html>")
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from common import local_backend, redis_cache
+
+RESTAURANT = {"PK": "REST#Thai", "SK": "REST#Thai", "name": "Thai", "cuisine": "Thai"}
+
+
+def review(num):
+    return {"PK": f"REVIEW#{num}", "SK": "REST#Thai", "restaurant": "Thai", "created_at": f"2022-06-{num:02d}", "rating": num}
+
+
+def write_items(path, items):
+    path.write_text("".join(json.dumps(item) + "\n" for item in items))
+
+
+def test_reloaded_index_leaves_held_snapshots_readable(tmp_path):
+    path = tmp_path / "items.json"
+    write_items(path, [RESTAURANT, review(1)])
+    old = redis_cache.load_local_index(str(path))
+    assert redis_cache.load_local_index(str(path)) is old
+
+    write_items(path, [RESTAURANT, review(1), review(2), review(3)])
+    new = redis_cache.load_local_index(str(path))
+    assert new is not old and redis_cache.local_index is new
+    # a reader still holding the old snapshot reads a consistent index and an open map
+    start, length = old["reviews"]["Thai"][0]
+    assert json.loads(old["data"][start:start + length])["rating"] == 1
+    start, length = new["reviews"]["Thai"][0]
+    assert json.loads(new["data"][start:start + length])["rating"] == 3
+
+
+def test_empty_local_file_loads_an_empty_index(tmp_path):
+    path = tmp_path / "items.json"
+    path.write_text("")
+    index = redis_cache.load_local_index(str(path))
+    assert index["restaurants"] == {} and index["reviews"] == {}
+    assert index["data"] is None
+
+
+def stored_reviews(table):
+    return sorted(item["id"]["S"] for item in table.items.values() if item["PK"]["S"].startswith("USER#"))
+
+
+def test_write_through_updates_the_summary_and_invalidates_pages(cache, table):
+    reviews = redis_cache.ReadThroughCache(redis_cache.load_restaurant_summary_from_db)
+    assert [review.rating for review in reviews.get("Thai").reviews] == [3, 2, 1]
+    key = redis_cache.page_key("/query-redis", [])
+    _, _, version = redis_cache.get_cached_page(key)
+    redis_cache.cache_page(key, b"<html>", version)
+
+    item = redis_cache.new_review("Thai", "alice", 5, "great")
+    reviews.put_review(item)
+    assert item["id"] in stored_reviews(table)
+    assert [review.username for review in reviews.get("Thai").reviews][0] == "alice"
+    assert redis_cache.get_cached_page(key)[1] is None
+
+
+def test_write_behind_drains_to_the_table(cache, table):
+    reviews = redis_cache.ReadThroughCache(redis_cache.load_restaurant_summary_from_db, write_mode="write-behind")
+    reviews.get("Thai")
+    items = [redis_cache.new_review("Thai", f"guest{num}", 4) for num in range(30)]
+    for item in items:
+        reviews.put_review(item)
+    # the cached summary is updated before the writes reach the table
+    assert [review.username for review in reviews.get("Thai").reviews][0].startswith("guest")
+    reviews.flush()
+    assert set(item["id"] for item in items) <= set(stored_reviews(table))
+
+
+@pytest.mark.parametrize("args", [("Thai", "bob", 0), ("Thai", "bob", "five"), ("Thai", None, 3), ("Thai", "bob", None)])
+def test_new_review_rejects_bad_input(args):
+    with pytest.raises((TypeError, ValueError)):
+        redis_cache.new_review(*args)
+
+
+def test_reloaded_summary_shows_the_same_latest_reviews(cache, table):
+    reviews = redis_cache.ReadThroughCache(redis_cache.load_restaurant_summary_from_db)
+    reviews.get("Thai")
+    for num in range(3):
+        reviews.put_review(redis_cache.new_review("Thai", f"guest{num}", 5))
+    written = [review.id for review in reviews.get("Thai").reviews]
+    cache.delete("Thai")
+    assert [review.id for review in reviews.get("Thai").reviews] == written
+
+
+def test_same_key_twice_in_a_batch_keeps_the_last_write(table):
+    first = redis_cache.new_review("Thai", "alice", 1, "bad")
+    second = dict(first, rating=5, review="better")
+    redis_cache.put_reviews_to_db([first, second])
+    item = table.items[("USER#alice", "REST#Thai")]
+    assert item["review"]["S"] == "better"
+
+
+def test_unprocessed_reviews_are_given_up_after_the_retries(table, monkeypatch):
+    monkeypatch.setattr(redis_cache, "dynamodb", local_backend.LocalDynamoDB(redis_cache.dynamodb.store, latency_ms=0, throttle_rate=1.0))
+    monkeypatch.setattr(redis_cache, "PUT_RETRIES", 2)
+    monkeypatch.setattr(redis_cache.time, "sleep", lambda seconds: None)
+    with pytest.raises(RuntimeError, match="1 reviews unprocessed after 2 retries"):
+        redis_cache.put_reviews_to_db([redis_cache.new_review("Thai", "alice", 3)])
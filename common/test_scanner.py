@@ -0,0 +1,49 @@
+from common.local_backend import LocalDynamoDB, LocalStore, serialize_item
+from common.scanner import parallel_scan, scan_values
+
+
+class CountingClient:
+    """
+    local client recording the items each scan call returned
+    """
+    def __init__(self, client):
+        self.client = client
+        self.pages = []
+
+    def scan(self, **kwargs):
+        res = self.client.scan(**kwargs)
+        self.pages.append(len(res["Items"]))
+        return res
+
+
+def player_client(count=500):
+    store = LocalStore()
+    table = store.table("GamePlayer")
+    for i in range(count):
+        item = serialize_item({"UserId": f"user-{i:04d}", "score": i})
+        table.items[table.primary_key(item)] = item
+    return CountingClient(LocalDynamoDB(store, latency_ms=0))
+
+
+def test_limited_scan_reads_about_limit_items():
+    client = player_client()
+    values = list(parallel_scan(client, "GamePlayer", "UserId", total_segments=8, limit=100))
+    assert len(values) == 100
+    # one page of ceil(100 / 8) items per segment, not SCAN_PAGE_SIZE
+    assert sum(client.pages) < 120
+
+
+def test_scan_order_is_deterministic():
+    runs = [list(parallel_scan(player_client(), "GamePlayer", "UserId", total_segments=8, limit=100)) for _ in range(3)]
+    assert runs[0] == runs[1] == runs[2]
+    full = [list(parallel_scan(player_client(), "GamePlayer", "UserId", total_segments=8)) for _ in range(2)]
+    assert full[0] == full[1]
+    assert sorted(full[0]) == [f"user-{i:04d}" for i in range(500)]
+
+
+def test_scan_values_is_sequential_and_capped():
+    client = player_client()
+    values = scan_values(client, "GamePlayer", "UserId", 100)
+    assert len(values) == 100 == len(set(values))
+    assert client.pages == [100]
+    assert len(scan_values(player_client(20), "GamePlayer", "UserId", 100)) == 20
@@ -0,0 +1,203 @@
+"""
+Request scoped tracing
+spans time the cache gets, db queries, deserialization, model construction and
+template render of a request, the response gets a Server-Timing header and every
+span feeds an in-process histogram per route, span and backend served as JSON
+"""
+
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from .histogram import Histogram
+
+
+class Trace:
+    """
+    span totals of one request, shared by the pool threads the request fans out to
+    """
+    def __init__(self, route):
+        self.route = route
+        self.start = time.perf_counter()
+        self.spans = {}
+        self.render_start = None
+        self.lock = threading.Lock()
+
+    def add(self, name, backend, duration):
+        with self.lock:
+            totals = self.spans.setdefault((name, backend), [0.0, 0])
+            totals[0] += duration
+            totals[1] += 1
+
+    def server_timing(self):
+        """
+        Server-Timing header value, one metric per span and backend, durations summed
+        over the calls of the request so fanned out spans can exceed the total
+        """
+        with self.lock:
+            spans = list(self.spans.items())
+        entries = [
+            f'{label(name, backend)};dur={total:.3f};desc="{count} calls"'
+            for (name, backend), (total, count) in spans
+        ]
+        entries.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.3f}")
+        return ", ".join(entries)
+
+
+# trace of the request being served, None outside requests
+current = contextvars.ContextVar("trace", default=None)
+# (route, span, backend) -> Histogram
+metrics = {}
+metrics_lock = threading.Lock()
+
+
+def label(name, backend):
+    return f"{name}.{backend}" if backend else name
+
+
+def observe(route, name, backend, duration):
+    """
+    record a duration in ms in the histogram of a route, span and backend
+    """
+    key = (route, name, backend)
+    histogram = metrics.get(key)
+    if histogram is None:
+        with metrics_lock:
+            histogram = metrics.setdefault(key, Histogram())
+    histogram.record(duration)
+
+
+@contextmanager
+def span(name, backend=None):
+    """
+    time a block as part of the current request, does nothing outside a request
+    """
+    trace = current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = (time.perf_counter() - start) * 1000
+        trace.add(name, backend, duration)
+        observe(trace.route, name, backend, duration)
+
+
+def propagate(fn):
+    """
+    wrap fn so calls on pool threads record into the trace of the submitting request
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # a context can only be entered by one thread at a time
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def snapshot():
+    """
+    histogram summaries by route, then by span and backend
+    """
+    with metrics_lock:
+        items = list(metrics.items())
+    routes = {}
+    for (route, name, backend), histogram in sorted(items, key=lambda item: tuple(map(str, item[0]))):
+        routes.setdefault(route, {})[label(name, backend)] = histogram.summary()
+    return routes
+
+
+def init_app(app, endpoint="/metrics"):
+    """
+    trace every request of a Flask app, time template rendering and serve the histograms
+    """
+    from flask import request, jsonify, before_render_template, template_rendered
+
+    @app.before_request
+    def start_trace():
+        route = request.url_rule.rule if request.url_rule else request.path
+        current.set(Trace(route))
+
+    @app.after_request
+    def finish_trace(response):
+        trace = current.get()
+        if trace is not None:
+            response.headers["Server-Timing"] = trace.server_timing()
+            observe(trace.route, "request", None, (time.perf_counter() - trace.start) * 1000)
+        return response
+
+    @app.teardown_request
+    def clear_trace(exc):
+        current.set(None)
+
+    def render_started(sender, template, context, **extra):
+        trace = current.get()
+        if trace is not None:
+            trace.render_start = time.perf_counter()
+
+    def render_finished(sender, template, context, **extra):
+        trace = current.get()
+        if trace is not None and trace.render_start is not None:
+            duration = (time.perf_counter() - trace.render_start) * 1000
+            trace.add("render", None, duration)
+            observe(trace.route, "render", None, duration)
+            trace.render_start = None
+
+    # signals hold weak references, keep the receivers on the app
+    app.extensions["tracing"] = (render_started, render_finished)
+    before_render_template.connect(render_started, app)
+    template_rendered.connect(render_finished, app)
+
+    @app.route(endpoint)
+    def metrics_endpoint():
+        return jsonify(snapshot())
+
+
+def init_async_app(app, endpoint="/metrics"):
+    """
+    init_app for a Quart app, blocking calls the app runs on a pool need propagate
+    to record their spans into the request trace
+    """
+    from quart import request, jsonify
+    from quart.signals import before_render_template, template_rendered
+
+    @app.before_request
+    async def start_trace():
+        route = request.url_rule.rule if request.url_rule else request.path
+        current.set(Trace(route))
+
+    @app.after_request
+    async def finish_trace(response):
+        trace = current.get()
+        if trace is not None:
+            response.headers["Server-Timing"] = trace.server_timing()
+            observe(trace.route, "request", None, (time.perf_counter() - trace.start) * 1000)
+        return response
+
+    @app.teardown_request
+    async def clear_trace(exc):
+        current.set(None)
+
+    async def render_started(sender, template, context, **extra):
+        trace = current.get()
+        if trace is not None:
+            trace.render_start = time.perf_counter()
+
+    async def render_finished(sender, template, context, **extra):
+        trace = current.get()
+        if trace is not None and trace.render_start is not None:
+            duration = (time.perf_counter() - trace.render_start) * 1000
+            trace.add("render", None, duration)
+            observe(trace.route, "render", None, duration)
+            trace.render_start = None
+
+    app.extensions["tracing"] = (render_started, render_finished)
+    before_render_template.connect(render_started, app)
+    template_rendered.connect(render_finished, app)
+
+    @app.route(endpoint)
+    async def metrics_endpoint():
+        return jsonify(snapshot())
@@ -4,6 +4,7 @@ DynamoDB with DAX Performance
 """
 
 import os
+import sys
 from tokenize import Double
 import amazondax 
 import boto3
@@ -12,6 +13,10 @@ import datetime
 from boto3.dynamodb.conditions import Key
 import time
 import matplotlib.pyplot as plt
+# helpers shared by the demo apps, see common/ at the repository root 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from common.local_backend import use_local, get_local_table
+from common.applog import get_logger, quiet, LOG_SAMPLE
 
 # configure region 
 REGION = os.environ.get("AWS_DEFAULT_REGION", "ap-southeast-1")
@@ -27,6 +32,9 @@ USER_IDS = [str(x) for x in range(100, 121)]
 # user_id and time_stamp to get 
 USER_ID_CHECK = "120" 
 CREATED_TIME_CHECK = 1655098896759
+# per item records, sampled at debug level 
+log = get_logger(__name__)
+item_log = get_logger(__name__ + '.items', sample=LOG_SAMPLE)
 
 
 def create_table(table_name: str) -> None:
@@ -63,8 +71,8 @@ def create_table(table_name: str) -> None:
         # PROVISIONED when load is predictable
         BillingMode="PAY_PER_REQUEST"
     )
-    # print table meta data 
-    print(res)
+    # log table meta data 
+    log.info('%s', res)
 
 
 
@@ -72,27 +80,39 @@ def get_table(table_name: str):
   """
   get table 
   """
+  if use_local():
+    return get_local_table(table_name, 'ddb')
   # create ddb client
   ddb = boto3.resource('dynamodb')
   # table
   table = ddb.Table(table_name)
   # return 
   return table 
-    
 
 
-def write_table(table_name: str) -> None:
+def get_dax_table(table_name: str):
   """
-  write data items to a table 
+  get table through dax 
   """
-  # table 
-  # table = get_table(table_name)
+  if use_local():
+    return get_local_table(table_name, 'dax')
   # dax client 
   dax = amazondax.AmazonDaxClient.resource(
     endpoint_url=DAX_ENDPOINT
   )
   # table  
-  table = dax.Table(table_name)
+  return dax.Table(table_name)
+    
+
+
+def write_table(table_name: str) -> None:
+  """
+  write data items to a table 
+  """
+  # table 
+  # table = get_table(table_name)
+  # table through dax 
+  table = get_dax_table(table_name)
   # create a new item
   for game_title in GAME_TITLES:
       for user_id in USER_IDS:
@@ -106,7 +126,7 @@ def write_table(table_name: str) -> None:
                   'CreatedTime': int(datetime.datetime.now().timestamp() * 1000)
               }
           )
-          print(res)
+          item_log.debug('%s', res)
 
 def get_items_by_primary_key(table: str, mode='dax', no_iter=10):
   """
@@ -115,12 +135,7 @@ def get_items_by_primary_key(table: str, mode='dax', no_iter=10):
   time_lags = []
   # table 
   if mode=='dax':
-    # dax client 
-    dax = amazondax.AmazonDaxClient.resource(
-      endpoint_url=DAX_ENDPOINT
-    )
-    # table  
-    table = dax.Table(table_name)
+    table = get_dax_table(table_name)
   else:
     table = get_table(table_name)
   # loop get item 
@@ -132,7 +147,7 @@ def get_items_by_primary_key(table: str, mode='dax', no_iter=10):
     end = time.perf_counter()
     # time lag in ms 
     duration = (end - start) * 1000
-    print(f'{mode} et-item latency: {duration:.4f}ms')
+    item_log.debug('%s get-item latency: %.4fms', mode, duration)
     time_lags.append(duration)
     # response 
     # print(res)
@@ -147,12 +162,7 @@ def query_items(table: str, mode='dax', no_iter=10):
   time_lags = []
     # table 
   if mode=='dax':
-    # dax client 
-    dax = amazondax.AmazonDaxClient.resource(
-      endpoint_url=DAX_ENDPOINT
-    )
-    # table  
-    table = dax.Table(table_name)
+    table = get_dax_table(table_name)
   else:
     table = get_table(table_name)
   # query 
@@ -167,7 +177,7 @@ def query_items(table: str, mode='dax', no_iter=10):
       end = time.perf_counter()
       # time lag 
       duration = (end - start) * 1000
-      print(f'{mode} latency query {duration:.4f} ms')
+      item_log.debug('%s latency query %.4f ms', mode, duration)
       # buffer time lag 
       time_lags.append(duration)
   # return 
@@ -182,10 +192,11 @@ def delete_table(table_name) -> None:
   table = get_table(table_name)
   # delete table 
   res = table.delete()
-  # print 
-  print(res)
+  # log 
+  log.info('%s', res)
 
 if __name__=="__main__":
+  quiet()
   table_name = "DaxTable"
   # create_table(table_name)
   # write_table(table_name)
@@ -201,7 +212,6 @@ if __name__=="__main__":
   axes.legend(['wo-dax','wi-dax'])
   axes.set_ylabel('milisecond')
   axes.set_xlabel('read db')
-  axes.set_yticks([k for k in range(10)])
-  axes.set_ylim(0,10)
+  axes.set_ylim(bottom=0)
   fig.suptitle('DAX performance')
   fig.savefig('dax_performance.png')
\ No newline at end of file
@@ -2,12 +2,17 @@
 # Setup flask 
 
 from flask import Flask
-from flask import Flask, render_template
+from flask import Flask, render_template, jsonify, request, abort
 from dax_client import *
 import redis_client
+import router
+from common import tracing
+from common.page_cache import page_cached
 
 
 app = Flask(__name__)
+tracing.init_app(app)
+
 
 @app.route("/")
 def index():
@@ -16,18 +21,41 @@ def index():
 @app.route("/query-ddb")
 def query_dax():
     restaurants = fetch_multiple_restaurants(mode='ddb', limit=120)
-    return render_template('query_ddb.html', restaurants=restaurants[10:])
+    return render_template('query_ddb.html', restaurants=restaurants)
 
 @app.route("/query-dax")
 def query_ddb():
     restaurants = fetch_multiple_restaurants(mode='dax', limit=120)
-    return render_template('query_dax.html', restaurants=restaurants[10:])
+    return render_template('query_dax.html', restaurants=restaurants)
 
 
 @app.route("/query-redis")
+@page_cached
 def query_redis():
     restaurants = redis_client.fetch_multiple_restaurants(mode='cache', limit=120)
-    return render_template('query_redis.html', restaurants=restaurants[10:])
+    return render_template('query_redis.html', restaurants=restaurants)
+
+
+@app.route("/query-routed")
+def query_routed():
+    restaurants = router.fetch_multiple_restaurants(limit=120)
+    return render_template('query_routed.html', restaurants=restaurants)
+
+
+@app.route("/reviews", methods=["POST"])
+def post_review():
+    body = request.get_json(silent=True) or {}
+    try:
+        item = redis_client.new_review(body.get("restaurant"), body.get("username"), body.get("rating"), body.get("review", ""))
+    except (TypeError, ValueError) as e:
+        abort(400, description=str(e))
+    redis_client.restaurant_cache.put_review(item)
+    return jsonify({"id": item["id"], "write_mode": redis_client.restaurant_cache.write_mode}), 201
+
+
+@app.route("/router-stats")
+def router_stats():
+    return jsonify(router.router.snapshot())
 
 
 if __name__=="__main__":
@@ -0,0 +1,125 @@
+# ASGI variant of app.py, same routes and templates with async handlers
+# blocking DAX, DynamoDB and redis calls run on a bounded thread pool and the
+# queries of a page fan out concurrently, so one worker serves many page loads at once
+# hypercorn asgi_app:app --bind 0.0.0.0:5000
+
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from quart import Quart, render_template, jsonify, request, abort
+import dax_client
+import redis_client
+import router
+from common import tracing
+from common.page_cache import async_page_cached
+
+# backend calls in flight per worker process, shared by all page loads
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT", 64))
+
+app = Quart(__name__)
+tracing.init_async_app(app)
+executor = ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT)
+
+
+async def run(fn, *args):
+    """
+    run a blocking backend call on the shared pool, its spans go to the request trace
+    """
+    return await asyncio.get_running_loop().run_in_executor(executor, tracing.propagate(fn), *args)
+
+
+async def fan_out(fn, keys):
+    """
+    one call per key, concurrently, results in key order
+    """
+    return await asyncio.gather(*(run(fn, key) for key in keys))
+
+
+async def fetch_multiple_restaurants(mode, limit):
+    """
+    GSI1 query per restaurant on the shared client of the mode
+    """
+    client = dax_client.get_client(mode)
+    names = await run(dax_client.scan_restaurant, limit)
+    return await fan_out(lambda name: dax_client.fetch_restaurant_summary(client, name), names)
+
+
+def load_restaurant(name):
+    """
+    cache miss loader timed like the sync path
+    """
+    start = time.perf_counter()
+    restaurant = redis_client.restaurant_cache.loader(name)
+    restaurant.load_latency = (time.perf_counter() - start) * 1000
+    return restaurant
+
+
+async def fetch_restaurant_summaries(names):
+    """
+    one MGET, the misses loaded concurrently and written back in one pipeline
+    """
+    start = time.perf_counter()
+    responses = await run(redis_client.r.mget, names)
+    cache_latency = (time.perf_counter() - start) * 1000
+    missed = [name for name, response in zip(names, responses) if not response]
+    loaded = dict(zip(missed, await fan_out(load_restaurant, missed)))
+    restaurants = []
+    for name, response in zip(names, responses):
+        restaurant = redis_client.parse_cached_restaurant(response) if response else loaded[name]
+        restaurant.cache_latency = cache_latency
+        restaurant.latency = cache_latency + max(restaurant.load_latency, 0)
+        restaurants.append(restaurant)
+    if loaded:
+        await run(redis_client.store_restaurant_summaries_in_cache, list(loaded.values()))
+    return restaurants
+
+
+@app.route("/")
+async def index():
+    return await render_template('index.html')
+
+@app.route("/query-ddb")
+async def query_ddb():
+    restaurants = await fetch_multiple_restaurants('ddb', 120)
+    return await render_template('query_ddb.html', restaurants=restaurants)
+
+@app.route("/query-dax")
+async def query_dax():
+    restaurants = await fetch_multiple_restaurants('dax', 120)
+    return await render_template('query_dax.html', restaurants=restaurants)
+
+
+@app.route("/query-redis")
+@async_page_cached
+async def query_redis():
+    names = await run(redis_client.scan_restaurant, 120)
+    restaurants = await fetch_restaurant_summaries(names)
+    return await render_template('query_redis.html', restaurants=restaurants)
+
+
+@app.route("/query-routed")
+async def query_routed():
+    names = await run(dax_client.scan_restaurant, 120)
+    restaurants = await fan_out(router.router.get, names)
+    return await render_template('query_routed.html', restaurants=restaurants)
+
+
+@app.route("/reviews", methods=["POST"])
+async def post_review():
+    body = await request.get_json(silent=True) or {}
+    try:
+        item = redis_client.new_review(body.get("restaurant"), body.get("username"), body.get("rating"), body.get("review", ""))
+    except (TypeError, ValueError) as e:
+        abort(400, description=str(e))
+    await run(redis_client.restaurant_cache.put_review, item)
+    return jsonify({"id": item["id"], "write_mode": redis_client.restaurant_cache.write_mode}), 201
+
+
+@app.route("/router-stats")
+async def router_stats():
+    return jsonify(router.router.snapshot())
+
+
+if __name__=="__main__":
+    app.run(host='0.0.0.0', port=5000)
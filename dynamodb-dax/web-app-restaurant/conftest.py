@@ -0,0 +1,6 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+# the fakeredis and local table fixtures of the shared cache module
+from common.conftest import cache, table
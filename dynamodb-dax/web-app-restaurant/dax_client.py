@@ -3,9 +3,20 @@ Hai Tran: 12 JUN 2022
 DynamoDB with DAX Performance 
 """
 
-from asyncore import write
 import os
+import sys
 import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+# helpers shared by the demo apps, see common/ at the repository root 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from common.local_backend import use_local, get_local_client, get_local_table
+from common.applog import get_logger, quiet, LOG_SAMPLE
+from common.bulk_loader import bulk_load, iter_items_from_file, provisioned_wcu
+from common.scanner import scan_values
+from common.models import Restaurant, Review
+from common.tracing import span, propagate
 import names 
 import amazondax 
 import boto3
@@ -24,22 +35,59 @@ DAX_ENDPOINT = "dax://test.a7wlr3.dax-clusters.ap-southeast-1.amazonaws.com"
 TABLE_NAME = "RestaurantsDax"
 # number of thread 
 NUM_THREAD = 100
-# dynamodb client 
-dynamodb = boto3.client("dynamodb")
+# number of concurrent queries across all page loads 
+MAX_WORKERS = int(os.environ.get("MAX_WORKERS", 64))
+# dynamodb client, or the in-process stand-in with DDB_BACKEND=local 
+if use_local():
+  dynamodb = get_local_client('ddb')
+else:
+  dynamodb = boto3.client("dynamodb", config=Config(max_pool_connections=MAX_WORKERS))
+# long-lived clients shared by all requests, one per mode 
+clients = {"ddb": dynamodb}
+clients_lock = threading.Lock()
+# bounded pool running the per restaurant queries 
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+# page summaries, and per item records sampled at debug level 
+log = get_logger(__name__)
+item_log = get_logger(__name__ + '.items', sample=LOG_SAMPLE)
+
+
+def get_client(mode='ddb'):
+  """
+  get the shared client for a mode, created on first use outside the lock so an
+  unreachable DAX endpoint never holds up the ddb fallback, the first one published wins 
+  """
+  client = clients.get(mode)
+  if client is not None:
+    return client
+  client = get_local_client(mode) if use_local() else amazondax.AmazonDaxClient(endpoint_url=DAX_ENDPOINT)
+  with clients_lock:
+    shared = clients.setdefault(mode, client)
+  if shared is not client:
+    client.close()
+  return shared
+
+
+def client_mode(client):
+  """
+  mode of a shared client, the backend label of its spans 
+  """
+  return next((mode for mode, shared in clients.items() if shared is client), 'ddb')
 
 
 def fetch_multiple_restaurants( mode='dax', limit=100): 
   """
+  query restaurants concurrently, results keep the order of the scan 
   """
-  # table
-  if mode=='dax':
-    client = amazondax.AmazonDaxClient(endpoint_url=DAX_ENDPOINT)
-  else:
-    client = boto3.client('dynamodb')
+  # shared client 
+  client = get_client(mode)
   # get some user ids 
   names = scan_restaurant(limit)
-  # loop over user_ids
-  restaurants = [fetch_restaurant_summary(client, name) for name in names]
+  # fan out over the pool, map keeps input order 
+  start = time.perf_counter()
+  restaurants = list(executor.map(propagate(lambda name: fetch_restaurant_summary(client, name)), names))
+  end = time.perf_counter()
+  log.info('%s page latency %.4fms for %d queries', mode, (end - start) * 1000, len(names))
   # return 
   return restaurants
 
@@ -49,20 +97,22 @@ def fetch_restaurant_summary(client, restaurant_name):
     from directory from db 
     """
     start = time.perf_counter()
-    resp =client.query(
-        TableName=TABLE_NAME,
-        IndexName="GSI1",
-        KeyConditionExpression="GSI1PK = :gsi1pk",
-        ExpressionAttributeValues={
-            ":gsi1pk": {"S": "REST#{}".format(restaurant_name)},
-        },
-        ScanIndexForward=False,
-        Limit=6,
-    )
+    with span("db-query", client_mode(client)):
+        resp =client.query(
+            TableName=TABLE_NAME,
+            IndexName="GSI1",
+            KeyConditionExpression="GSI1PK = :gsi1pk",
+            ExpressionAttributeValues={
+                ":gsi1pk": {"S": "REST#{}".format(restaurant_name)},
+            },
+            ScanIndexForward=False,
+            Limit=6,
+        )
     end = time.perf_counter()
-    print(f'db query latency {(end - start) * 1000: .4f}ms')
-    restaurant = Restaurant(resp["Items"][0])
-    restaurant.reviews = [Review(item) for item in resp["Items"][1:]]
+    item_log.debug('db query latency %.4fms', (end - start) * 1000)
+    with span("model"):
+        restaurant = Restaurant.from_ddb(resp["Items"][0])
+        restaurant.reviews = [Review.from_ddb(item) for item in resp["Items"][1:]]
     restaurant.latency = (end - start) * 1000
     print_restaurant(restaurant)
     # return 
@@ -71,20 +121,10 @@ def fetch_restaurant_summary(client, restaurant_name):
 
 def scan_restaurant(limit=100):
     """
+    first limit restaurant names of a paged scan reading about limit items 
     """
-    names = []
-    res = dynamodb.scan(
-        TableName=TABLE_NAME,
-        Limit=limit
-    )
-    items = res['Items']
-    for item in items:
-        try: 
-            names.append(item['restaurant']['S'])
-        except:
-            pass
-    # print(names)
-    return names
+    with span("scan", "ddb"):
+        return scan_values(dynamodb, TABLE_NAME, "restaurant", limit)
 
 
 def create_table() -> None:
@@ -120,10 +160,9 @@ def create_table() -> None:
             ],
             ProvisionedThroughput={"ReadCapacityUnits": 5, "WriteCapacityUnits": 5},
         )
-        print("Table created successfully.")
-    except Exception as e:
-        print("Could not create table. Error:")
-        print(e)
+        log.info("Table created successfully.")
+    except Exception:
+        log.exception("Could not create table.")
 
 
 def delete_table() -> None:
@@ -134,29 +173,22 @@ def delete_table() -> None:
   table = get_table(TABLE_NAME)
   # delete table 
   res = table.delete()
-  # print 
-  print(res)
+  # log 
+  log.info('%s', res)
 
 
 def buck_load_table(mode='ddb'):
   """
+  stream items.json into the table with the parallel bulk loader 
   """
-  if mode=='dax':
-    dax = amazondax.AmazonDaxClient.resource(endpoint_url=DAX_ENDPOINT)
-    table = dax.Table(TABLE_NAME)
-  else: 
-    dynamodb = boto3.resource("dynamodb")
-    table = dynamodb.Table(TABLE_NAME)
-  items = []
-  # open local file data 
-  with open("items.json", "r") as f:
-      for row in f:
-          items.append(json.loads(row))
-  # batch write to dyanmodb
-  with table.batch_writer() as batch:
-      for item in items:
-          batch.put_item(Item=item)
-  print("Items loaded successfully.")
+  bulk_load(
+    get_client(mode),
+    TABLE_NAME,
+    iter_items_from_file("items.json"),
+    partition_key="PK",
+    wcu=provisioned_wcu(TABLE_NAME, dynamodb),
+  )
+  log.info("Items loaded successfully.")
 
 
 
@@ -164,7 +196,9 @@ def get_table(table_name: str, mode='ddb'):
   """
   get table 
   """
-  if mode=='dax':
+  if use_local():
+    table = get_local_table(TABLE_NAME, mode)
+  elif mode=='dax':
     dax = amazondax.AmazonDaxClient.resource(endpoint_url=DAX_ENDPOINT)
     # table  
     table = dax.Table(TABLE_NAME)
@@ -176,44 +210,12 @@ def get_table(table_name: str, mode='ddb'):
   # return 
   return table
 
-# support 
-class Restaurant:
-    def __init__(self, item):
-        self.name = item.get("name")
-        self.cuisine = item.get("cuisine")
-        self.address = item.get("address")
-        self.five_stars = item.get("five_stars", {})
-        self.four_stars = item.get("four_stars", {})
-        self.three_stars = item.get("three_stars", {})
-        self.two_stars = item.get("two_stars", {})
-        self.one_stars = item.get("one_stars", {})
-        self.latency = -1
-
-    def __repr__(self):
-        return "Restaurant<{} -- {}>".format(self.name, self.cuisine)
-
-
-class Review:
-    def __init__(self, item):
-        self.restaurant = item.get("restaurant")
-        self.username = item.get("username")
-        self.rating = item.get("rating")
-        self.review = item.get("review")
-        self.id = item.get("id")
-        self.created_at = item.get("created_at")
-
-    def __repr__(self):
-        return "Review<{} -- {} ({})>".format(
-            self.restaurant, self.username, self.created_at
-        )
-
 
 def print_restaurant(restaurant):
     """
+    log a restaurant and its reviews as one debug record, formatted on the log thread 
     """
-    print(restaurant)
-    for review in restaurant.reviews:
-        print(review)
+    item_log.debug('%r %r', restaurant, restaurant.reviews)
 
 
 def plot_performance(db_latencies, cache_latencies):
@@ -222,11 +224,10 @@ def plot_performance(db_latencies, cache_latencies):
     fig,axes = plt.subplots(1,1,figsize=(10,5))
     axes.plot(db_latencies,'k--o',markersize=3,linewidth=0.5)
     axes.plot(cache_latencies,'b--o',markersize=3,linewidth=0.5)
-    axes.legend(['dax-query','db-query'])
+    axes.legend(['db-query','dax-query'])
     axes.set_ylabel('milisecond')
     axes.set_xlabel('read db')
-    axes.set_yticks([k for k in range(10)])
-    axes.set_ylim(0,10)
+    axes.set_ylim(bottom=0)
     fig.suptitle('cache latency')
     fig.savefig('dax-ddb-performance.png')
 
@@ -235,12 +236,16 @@ def plot_performance(db_latencies, cache_latencies):
 
 
 if __name__=="__main__":
+  quiet()
   # delete_table()
   # create_table()
   # buck_load_table(mode='dax')
+  # warm the clients up and discard it, rather than dropping the first reads 
+  for mode in ['ddb', 'dax']:
+    fetch_multiple_restaurants(mode, 10)
   db_latencies = [restaurant.latency for restaurant in  fetch_multiple_restaurants('ddb', 120)]
   cache_latencies = [restaurant.latency for restaurant in  fetch_multiple_restaurants('dax', 120)]
-  plot_performance(db_latencies[10:], cache_latencies[10:])
+  plot_performance(db_latencies, cache_latencies)
 
 
 
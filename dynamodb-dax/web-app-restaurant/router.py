@@ -0,0 +1,234 @@
+"""
+Adaptive read routing between DAX, Redis and DynamoDB
+each read goes to the fastest healthy tier by rolling latency, a second tier is
+hedged when the first one runs past its p95, and tiers that keep failing are
+skipped for a cooldown before being probed again
+"""
+
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import dax_client
+from common.tracing import propagate
+import redis_client
+
+# samples kept per tier for latency percentiles and error rate
+WINDOW = int(os.environ.get("ROUTER_WINDOW", 200))
+# a tier with fewer samples is tried first so every tier gets measured
+MIN_SAMPLES = 20
+# fraction of reads sent to a random healthy tier to keep stats fresh
+EXPLORE_RATE = 0.05
+# hedge timeout in ms before a tier has enough samples for its p95
+HEDGE_DEFAULT_MS = float(os.environ.get("ROUTER_HEDGE_MS", 50))
+# lower bound of the hedge timeout in ms
+HEDGE_MIN_MS = 1.0
+# consecutive failures before a tier is marked down
+FAILURE_LIMIT = 3
+# error rate over the window before a tier is marked down
+MAX_ERROR_RATE = 0.5
+# seconds a tier stays down before it is probed again
+COOLDOWN = float(os.environ.get("ROUTER_COOLDOWN", 10))
+# threads running tier reads, primaries and hedges
+ROUTER_WORKERS = int(os.environ.get("ROUTER_WORKERS", 64))
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100.0))]
+
+
+class TierStats:
+    """
+    rolling latency and error window of one tier, plus counters for dashboards
+    """
+    def __init__(self, name, window=WINDOW):
+        self.name = name
+        self.samples = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.served = 0
+        self.hedges = 0
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.down_until = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, latency, ok, hit=None):
+        with self.lock:
+            self.samples.append((latency, ok))
+            self.requests += 1
+            if hit is not None:
+                self.hits += hit
+                self.misses += not hit
+            if ok:
+                self.failures = 0
+                return
+            self.errors += 1
+            self.failures += 1
+            if self.failures >= FAILURE_LIMIT or (
+                len(self.samples) >= MIN_SAMPLES and self.error_rate() > MAX_ERROR_RATE
+            ):
+                self.down_until = time.monotonic() + COOLDOWN
+
+    def latencies(self):
+        return [latency for latency, ok in self.samples if ok]
+
+    def error_rate(self):
+        if not self.samples:
+            return 0.0
+        return sum(not ok for _, ok in self.samples) / len(self.samples)
+
+    def healthy(self):
+        return time.monotonic() >= self.down_until
+
+    def rank(self):
+        """
+        sort key, unmeasured tiers first then by median latency
+        """
+        with self.lock:
+            latencies = self.latencies()
+        if len(latencies) < MIN_SAMPLES:
+            return 0.0
+        return percentile(latencies, 50)
+
+    def hedge_timeout(self):
+        """
+        seconds to wait on this tier before hedging, its rolling p95
+        """
+        with self.lock:
+            latencies = self.latencies()
+        if len(latencies) < MIN_SAMPLES:
+            return HEDGE_DEFAULT_MS / 1000
+        return max(HEDGE_MIN_MS, percentile(latencies, 95)) / 1000
+
+    def snapshot(self):
+        with self.lock:
+            latencies = self.latencies()
+            lookups = self.hits + self.misses
+            return {
+                "healthy": self.healthy(),
+                "requests": self.requests,
+                "errors": self.errors,
+                "served": self.served,
+                "hedges": self.hedges,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "error_rate": self.error_rate(),
+                "latency_ms": {
+                    "p50": percentile(latencies, 50),
+                    "p95": percentile(latencies, 95),
+                    "p99": percentile(latencies, 99),
+                    "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+                },
+            }
+
+
+class ReadRouter:
+    """
+    routes a read to one of several tiers, each a function of the restaurant name,
+    hit_checks optionally tell whether a tier answered from its cache
+    """
+    def __init__(self, tiers, hit_checks=None, workers=ROUTER_WORKERS):
+        self.tiers = tiers
+        self.hit_checks = hit_checks or {}
+        self.stats = {name: TierStats(name) for name in tiers}
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def ranked(self):
+        """
+        healthy tiers fastest first, then the ones that are down as a last resort
+        """
+        healthy = sorted(
+            (name for name in self.tiers if self.stats[name].healthy()),
+            key=lambda name: self.stats[name].rank(),
+        )
+        if len(healthy) > 1 and random.random() < EXPLORE_RATE:
+            healthy.insert(0, healthy.pop(random.randrange(1, len(healthy))))
+        down = [name for name in self.tiers if name not in healthy]
+        return healthy + down
+
+    def call(self, tier, restaurant_name):
+        """
+        one read on one tier, recorded whether it wins or not
+        """
+        stats = self.stats[tier]
+        start = time.perf_counter()
+        try:
+            restaurant = self.tiers[tier](restaurant_name)
+        except Exception:
+            stats.record((time.perf_counter() - start) * 1000, False)
+            raise
+        check = self.hit_checks.get(tier)
+        stats.record((time.perf_counter() - start) * 1000, True, check(restaurant) if check else None)
+        return restaurant
+
+    def get(self, restaurant_name):
+        """
+        read from the fastest healthy tier, hedging once on the next healthy tier
+        after the running tier's p95, and falling back in rank order on errors
+        """
+        order = self.ranked()
+        pending = {}
+        hedged = False
+        error = None
+
+        def launch(tier):
+            pending[self.executor.submit(propagate(self.call), tier, restaurant_name)] = tier
+            return tier
+
+        current = launch(order.pop(0))
+        while pending or order:
+            if not pending:
+                current = launch(order.pop(0))
+            can_hedge = not hedged and order and self.stats[order[0]].healthy()
+            timeout = self.stats[current].hedge_timeout() if can_hedge else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                with self.stats[order[0]].lock:
+                    self.stats[order[0]].hedges += 1
+                launch(order.pop(0))
+                continue
+            for future in done:
+                tier = pending.pop(future)
+                try:
+                    restaurant = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                with self.stats[tier].lock:
+                    self.stats[tier].served += 1
+                restaurant.tier = tier
+                return restaurant
+        raise error
+
+    def snapshot(self):
+        """
+        per tier stats for dashboards
+        """
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+
+def fetch_multiple_restaurants(limit=100):
+    """
+    routed reads for a page of restaurants, concurrent and in scan order
+    """
+    names = dax_client.scan_restaurant(limit)
+    return list(dax_client.executor.map(propagate(router.get), names))
+
+
+# tiers by name, each returns a Restaurant
+router = ReadRouter(
+    {
+        "dax": lambda name: dax_client.fetch_restaurant_summary(dax_client.get_client("dax"), name),
+        "redis": redis_client.restaurant_cache.get,
+        "ddb": lambda name: dax_client.fetch_restaurant_summary(dax_client.get_client("ddb"), name),
+    },
+    # the read-through cache leaves load_latency unset on a hit
+    hit_checks={"redis": lambda restaurant: restaurant.load_latency < 0},
+)
@@ -0,0 +1,23 @@
+import pytest
+
+import app
+import redis_client
+from common import redis_cache
+
+
+@pytest.fixture
+def client(cache, table, monkeypatch):
+    monkeypatch.setattr(redis_client, "restaurant_cache", redis_cache.ReadThroughCache(redis_cache.load_restaurant_summary_from_db))
+    return app.app.test_client()
+
+
+def test_posted_review_is_written(client, table):
+    res = client.post("/reviews", json={"restaurant": "Thai", "username": "alice", "rating": 5, "review": "great"})
+    assert res.status_code == 201
+    assert res.get_json()["write_mode"] == "write-through"
+    assert any(item.get("id", {}).get("S") == res.get_json()["id"] for item in table.items.values())
+
+
+@pytest.mark.parametrize("body", [{"restaurant": "Thai", "username": "alice", "rating": 9}, {"restaurant": "Thai"}, None])
+def test_bad_review_is_rejected(client, body):
+    assert client.post("/reviews", json=body).status_code == 400
@@ -0,0 +1,55 @@
+import time
+import threading
+from types import SimpleNamespace
+
+import dax_client
+
+
+def test_slow_dax_client_does_not_block_the_ddb_client(monkeypatch):
+    building = threading.Event()
+
+    def slow_client(**kwargs):
+        building.set()
+        time.sleep(0.5)
+        return SimpleNamespace(close=lambda: None)
+
+    monkeypatch.setattr(dax_client, "use_local", lambda: False)
+    monkeypatch.setattr(dax_client.amazondax, "AmazonDaxClient", slow_client)
+    monkeypatch.setattr(dax_client, "clients", {"ddb": dax_client.clients["ddb"]})
+    thread = threading.Thread(target=dax_client.get_client, args=("dax",))
+    thread.start()
+    building.wait()
+    start = time.monotonic()
+    assert dax_client.get_client("ddb") is dax_client.dynamodb
+    assert time.monotonic() - start < 0.1
+    thread.join()
+    assert dax_client.get_client("dax") is dax_client.clients["dax"]
+
+
+def test_racing_first_calls_share_one_client(monkeypatch):
+    built, closed = [], []
+
+    def new_client(**kwargs):
+        client = SimpleNamespace()
+        client.close = lambda: closed.append(client)
+        built.append(client)
+        return client
+
+    monkeypatch.setattr(dax_client, "use_local", lambda: False)
+    monkeypatch.setattr(dax_client.amazondax, "AmazonDaxClient", new_client)
+    monkeypatch.setattr(dax_client, "clients", {})
+    barrier = threading.Barrier(8)
+    results = []
+
+    def first_call():
+        barrier.wait()
+        results.append(dax_client.get_client("dax"))
+
+    threads = [threading.Thread(target=first_call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(client) for client in results}) == 1
+    # every client that lost the race to publish is closed
+    assert len(closed) == len(built) - 1 and results[0] not in closed
@@ -0,0 +1,45 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import router
+
+
+@pytest.fixture(autouse=True)
+def no_exploring(monkeypatch):
+    monkeypatch.setattr(router, "EXPLORE_RATE", 0.0)
+    monkeypatch.setattr(router, "HEDGE_DEFAULT_MS", 20.0)
+
+
+def tier(delay=0.0, error=None):
+    def read(name):
+        time.sleep(delay)
+        if error:
+            raise error
+        return SimpleNamespace(name=name)
+    return read
+
+
+def test_slow_tier_is_hedged_on_the_next_one():
+    reads = router.ReadRouter({"slow": tier(0.5), "fast": tier()}, workers=4)
+    start = time.monotonic()
+    restaurant = reads.get("Thai")
+    assert restaurant.tier == "fast"
+    assert time.monotonic() - start < 0.3
+    assert reads.stats["fast"].hedges == 1
+    assert reads.stats["fast"].served == 1
+
+
+def test_failing_tier_falls_back_and_is_marked_down():
+    reads = router.ReadRouter({"broken": tier(error=RuntimeError("down")), "ddb": tier()}, workers=4)
+    for _ in range(router.FAILURE_LIMIT):
+        assert reads.get("Thai").tier == "ddb"
+    assert not reads.stats["broken"].healthy()
+    assert reads.ranked() == ["ddb", "broken"]
+
+
+def test_error_is_raised_when_every_tier_fails():
+    reads = router.ReadRouter({"a": tier(error=RuntimeError("a")), "b": tier(error=KeyError("b"))}, workers=4)
+    with pytest.raises((RuntimeError, KeyError)):
+        reads.get("Thai")
@@ -4,8 +4,10 @@
 from flask import Flask
 from flask import Flask, render_template
 from dax_client import *
+from common import tracing
 
 app = Flask(__name__)
+tracing.init_app(app)
 
 @app.route("/")
 def index():
@@ -0,0 +1,55 @@
+# ASGI variant of app.py, same routes and templates with async handlers
+# blocking DAX and DynamoDB calls run on a bounded thread pool and the get-items
+# of a page fan out concurrently, so one worker serves many page loads at once
+# hypercorn asgi_app:app --bind 0.0.0.0:5000
+
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from quart import Quart, render_template
+from dax_client import TABLE_NAME, get_client, get_player, scan_user_ids
+from common import tracing
+
+# backend calls in flight per worker process, shared by all page loads
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT", 64))
+
+app = Quart(__name__)
+tracing.init_async_app(app)
+executor = ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT)
+
+
+async def run(fn, *args):
+    """
+    run a blocking backend call on the shared pool, its spans go to the request trace
+    """
+    return await asyncio.get_running_loop().run_in_executor(executor, tracing.propagate(fn), *args)
+
+
+async def get_items_by_primary_key(table_name, mode='dax', no_user=100):
+    """
+    scan user ids, then get every item concurrently, results in scan order
+    """
+    # get_client caches the client of each mode, only the first call builds it
+    client = await run(get_client, mode)
+    user_ids = await run(scan_user_ids, table_name, no_user, mode)
+    items = await asyncio.gather(*(run(get_player, client, table_name, user_id, mode) for user_id in user_ids))
+    return {"latencies": [item['latency'] for item in items], "items": items}
+
+
+@app.route("/")
+async def index():
+    return await render_template('index.html')
+
+@app.route("/query-dax")
+async def query_dax():
+    dic = await get_items_by_primary_key(TABLE_NAME, mode='dax', no_user=100)
+    return await render_template('query_dax.html', items=dic['items'], latencies=dic['latencies'])
+
+@app.route("/query-ddb")
+async def query_ddb():
+    dic = await get_items_by_primary_key(TABLE_NAME, mode='ddb', no_user=100)
+    return await render_template('query_ddb.html', items=dic['items'], latencies=dic['latencies'])
+
+
+if __name__=="__main__":
+    app.run(host='0.0.0.0', port=5000)
@@ -3,16 +3,24 @@ Hai Tran: 12 JUN 2022
 DynamoDB with DAX Performance 
 """
 
-from asyncore import write
 import os
+import sys
 import uuid
+import threading
 from concurrent.futures import ThreadPoolExecutor
 import names 
 import amazondax 
 import boto3
 import random 
 import datetime
-from boto3.dynamodb.conditions import Key
+# helpers shared by the demo apps, see common/ at the repository root 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from common.local_backend import use_local, get_local_client, get_local_table
+from common.applog import get_logger, quiet, LOG_SAMPLE
+from common.bulk_loader import bulk_load, provisioned_wcu
+from common.scanner import parallel_scan, scan_values
+from common.ddb_codec import for_table
+from common.tracing import span
 import time
 import matplotlib.pyplot as plt
 
@@ -33,6 +41,18 @@ NUM_THREAD = 100
 NUM_USER = 1000
 # get a single user 
 USER_ID_SINGLE = '8577287c-eb20-11ec-a8e5-022d3357acbe'
+# max keys per BatchGetItem request 
+BATCH_GET_SIZE = 100
+# max retries of UnprocessedKeys 
+BATCH_GET_RETRIES = 8
+# low-level item deserializer, numbers as int/float 
+deserializer = for_table(TABLE_NAME)
+# per batch records, and per item records sampled at debug level 
+log = get_logger(__name__)
+item_log = get_logger(__name__ + '.items', sample=LOG_SAMPLE)
+# low-level clients by mode, shared by all threads 
+clients = {}
+clients_lock = threading.Lock()
 
 def create_table(table_name: str) -> None:
     """
@@ -60,8 +80,8 @@ def create_table(table_name: str) -> None:
         # PROVISIONED when load is predictable
         BillingMode="PAY_PER_REQUEST"
     )
-    # print table meta data 
-    print(res)
+    # log table meta data 
+    log.info('%s', res)
 
 
 
@@ -69,7 +89,10 @@ def get_table(table_name: str, mode='ddb'):
   """
   get table 
   """
-  if mode=='dax':
+  if use_local():
+    # in-process stand-in 
+    table = get_local_table(table_name, mode)
+  elif mode=='dax':
     # dax client 
     dax = amazondax.AmazonDaxClient.resource(endpoint_url=DAX_ENDPOINT)
     # table  
@@ -85,50 +108,60 @@ def get_table(table_name: str, mode='ddb'):
 
 def scan_user_ids(table_name: str, no_user: int, mode='ddb'):
   """
-  always return first no_user items 
+  return the first no_user ids of a paged scan reading about no_user items 
   """
-  # table 
-  table = get_table(table_name, mode)
-  # scan 
-  res = table.scan(
-    Limit=no_user
-  )
-  # print(res['Items'])
-  # return user ids 
-  user_ids = [item['UserId'] for item in res['Items']]
-  return user_ids
+  with span('scan', mode):
+    return scan_values(get_client(mode), table_name, 'UserId', no_user)
+
+
+def iter_user_ids(table_name: str, mode='ddb', limit=None):
+  """
+  stream user ids with a parallel segmented scan projecting only UserId 
+  """
+  return parallel_scan(get_client(mode), table_name, 'UserId', limit=limit)
 
 
 
 def write_table(table_name: str, mode='dax') -> None:
   """
-  write data items to a table 
+  write data items to a table one at a time 
   """
   # table
   table = get_table(table_name, mode)
   # create a new item
-  for game_title in GAME_TITLES:
+  for item in generate_players():
+      table.put_item(Item=item)
+
+
+def generate_players(passes=1):
+  """
+  stream random players, NUM_USER per game title per pass 
+  """
+  for _ in range(passes):
+    for game_title in GAME_TITLES:
       for k in range(NUM_USER):
-          res = table.put_item(
-              Item={
-                  'UserId': str(uuid.uuid1()),
-                  "UserName": names.get_full_name(),
-                  'GameTitle': game_title,
-                  'Score': random.randint(1000, 6000),
-                  'Wins': random.randint(0, 100),
-                  'Losses': random.randint(5, 50),
-                  'CreatedTime': int(datetime.datetime.now().timestamp() * 1000)
-              }
-          )
-          print(k)
+        yield {
+          'UserId': str(uuid.uuid1()),
+          "UserName": names.get_full_name(),
+          'GameTitle': game_title,
+          'Score': random.randint(1000, 6000),
+          'Wins': random.randint(0, 100),
+          'Losses': random.randint(5, 50),
+          'CreatedTime': int(datetime.datetime.now().timestamp() * 1000)
+        }
 
 
 def write_table_thread(table_name: str, mode='dax') -> None: 
   """
+  load NUM_THREAD - 1 passes of players with the parallel bulk loader 
   """
-  with ThreadPoolExecutor(max_workers=NUM_THREAD) as executor:
-    for k in range(1, NUM_THREAD):
-      executor.submit(write_table, TABLE_NAME)
+  bulk_load(
+    get_client(mode),
+    table_name,
+    generate_players(passes=NUM_THREAD - 1),
+    partition_key='UserId',
+    wcu=provisioned_wcu(table_name, get_client('ddb')),
+  )
 
 
 def get_items_by_primary_key(table_name: str, mode='dax', no_user=100):
@@ -138,30 +171,116 @@ def get_items_by_primary_key(table_name: str, mode='dax', no_user=100):
   items, latencies = [], []
   # buffer time lags 
   latencies = []
-  # table 
-  table = get_table(table_name, mode)
+  # low-level client, items decoded by the precompiled schema 
+  client = get_client(mode)
   # get user id 
   user_ids = scan_user_ids(table_name, no_user, mode=mode)
   # loop get item 
   for user_id in user_ids:
-    start = time.perf_counter()
-    res = table.get_item(
-      Key={"UserId": user_id}
-    )
-    end = time.perf_counter()
-    # time lag in ms 
-    duration = (end - start) * 1000
-    print(f'{mode} get-item {res["Item"]["UserId"]} latency: {duration:.4f}ms ')
-    # print(res)
-    # tag latency to each query 
-    item = res['Item']
-    item['latency'] = duration
+    item = get_player(client, table_name, user_id, mode)
     # parse items 
     items.append(item)
     # buffer time lag 
-    latencies.append(duration)
+    latencies.append(item['latency'])
   # return 
-  return {"latencies": latencies[2:], "items": items[2:]}
+  return {"latencies": latencies, "items": items}
+
+
+def get_player(client, table_name: str, user_id: str, mode='dax'):
+  """
+  get one item by primary key, tagged with its latency 
+  """
+  start = time.perf_counter()
+  with span('db-query', mode):
+    res = client.get_item(
+      TableName=table_name,
+      Key={"UserId": {"S": user_id}}
+    )
+  end = time.perf_counter()
+  # time lag in ms 
+  duration = (end - start) * 1000
+  # tag latency to each query 
+  with span('deserialize'):
+    item = deserializer.item(res['Item'])
+  item['latency'] = duration
+  item_log.debug('%s get-item %s latency: %.4fms', mode, item['UserId'], duration)
+  return item
+
+
+def get_client(mode='ddb'):
+  """
+  get the shared low-level client of a mode, created on first use outside the lock
+  so a slow DAX endpoint never holds up the ddb client, the first one published wins 
+  """
+  client = clients.get(mode)
+  if client is not None:
+    return client
+  if use_local():
+    client = get_local_client(mode)
+  elif mode=='dax':
+    client = amazondax.AmazonDaxClient(endpoint_url=DAX_ENDPOINT)
+  else:
+    client = boto3.client('dynamodb')
+  with clients_lock:
+    shared = clients.setdefault(mode, client)
+  if shared is not client:
+    client.close()
+  return shared
+
+
+def batch_get_keys(client, table_name: str, keys):
+  """
+  one BatchGetItem request, retrying UnprocessedKeys with jittered backoff 
+  """
+  items, latencies = [], []
+  request = {table_name: {'Keys': keys}}
+  start = time.perf_counter()
+  for attempt in range(BATCH_GET_RETRIES + 1):
+    res = client.batch_get_item(RequestItems=request)
+    # keys returned by this call waited from batch start until now 
+    duration = (time.perf_counter() - start) * 1000
+    returned = res['Responses'].get(table_name, [])
+    items += returned
+    latencies += [duration] * len(returned)
+    request = res.get('UnprocessedKeys')
+    if not request:
+      break
+    # full jitter exponential backoff 
+    time.sleep(random.uniform(0, min(1.0, 0.05 * 2 ** attempt)))
+  else:
+    raise RuntimeError(f'{len(request[table_name]["Keys"])} keys unprocessed after {BATCH_GET_RETRIES} retries')
+  end = time.perf_counter()
+  return {"items": items, "latencies": latencies, "latency": (end - start) * 1000, "retries": attempt}
+
+
+def batch_get_items_by_primary_key(table_name: str, mode='dax', no_user=100):
+  """
+  get items with BatchGetItem, 100 keys per request, batches run in parallel 
+  """
+  # client 
+  client = get_client(mode)
+  # get user id, BatchGetItem rejects duplicate keys 
+  user_ids = list(dict.fromkeys(scan_user_ids(table_name, no_user, mode=mode)))
+  keys = [{'UserId': {'S': user_id}} for user_id in user_ids]
+  batches = [keys[k:k + BATCH_GET_SIZE] for k in range(0, len(keys), BATCH_GET_SIZE)]
+  # parallel batches 
+  with ThreadPoolExecutor(max_workers=max(1, min(NUM_THREAD, len(batches)))) as executor:
+    results = list(executor.map(lambda batch: batch_get_keys(client, table_name, batch), batches))
+  # parse items and tag latency to each key 
+  by_id = {}
+  for result in results:
+    log.info('%s batch-get %d items latency: %.4fms retries: %d', mode, len(result['items']), result['latency'], result['retries'])
+    for raw, duration in zip(result['items'], result['latencies']):
+      item = deserializer.item(raw)
+      item['latency'] = duration
+      by_id[item['UserId']] = item
+  # keep the scan order 
+  items = [by_id[user_id] for user_id in user_ids if user_id in by_id]
+  return {
+    "latencies": [item['latency'] for item in items],
+    "items": items,
+    "batch_latencies": [result['latency'] for result in results],
+  }
 
 
 def query_items(table_name: str, mode='dax', no_user=100): 
@@ -171,30 +290,34 @@ def query_items(table_name: str, mode='dax', no_user=100):
   latencies = []
   # buffer items 
   items = []
-  # table
-  table = get_table(table_name, mode)
+  # low-level client
+  client = get_client(mode)
   # get some user ids 
   user_ids = scan_user_ids(table_name, no_user, mode)
   # loop over user_ids
   for user_id in user_ids:
     # query by user_id 
     start = time.perf_counter()
-    res = table.query(
-      KeyConditionExpression=Key('UserId').eq(user_id),
-      ScanIndexForward=False)
+    with span('db-query', mode):
+      res = client.query(
+        TableName=table_name,
+        KeyConditionExpression='UserId = :id',
+        ExpressionAttributeValues={':id': {'S': user_id}},
+        ScanIndexForward=False)
     end = time.perf_counter()
     # time lag 
     duration = (end - start) * 1000
-    print(f'{mode} query latency {duration:.4f} ms')
-    # tag latency to each query 
-    for item in res['Items']:
+    item_log.debug('%s query latency %.4f ms', mode, duration)
+    # parse items in one pass and tag latency to each query 
+    with span('deserialize'):
+      parsed = deserializer.items(res['Items'])
+    for item in parsed:
       item['latency'] = duration
-    # parse items 
-    items += res['Items']
+      items.append(item)
     # buffer time lag 
     latencies.append(duration)
   # return 
-  return {"latencies": latencies[2:], "items": items[2:]}
+  return {"latencies": latencies, "items": items}
 
 
 def delete_table(table_name) -> None:
@@ -205,10 +328,11 @@ def delete_table(table_name) -> None:
   table = get_table(table_name)
   # delete table 
   res = table.delete()
-  # print 
-  print(res)
+  # log 
+  log.info('%s', res)
 
 if __name__=="__main__":
+  quiet()
   # create_table(TABLE_NAME)
   # write_table(TABLE_NAME, mode='ddb')
   # write_table_thread(TABLE_NAME)
@@ -217,15 +341,20 @@ if __name__=="__main__":
   # get_items_wo_dax(table_name, 1)
   # get_items_wi_dax(table_name, 1)
   # delete_table(TABLE_NAME)
+  # warm the connections up and discard it, rather than dropping the first reads 
+  for mode in ['ddb', 'dax']:
+    get_items_by_primary_key(TABLE_NAME, mode=mode, no_user=10)
   dic_wo_dax = get_items_by_primary_key(TABLE_NAME, mode='ddb', no_user=100)
   dic_wi_dax = get_items_by_primary_key(TABLE_NAME, mode='dax', no_user=100)
+  for mode in ['ddb', 'dax']:
+    dic_batch = batch_get_items_by_primary_key(TABLE_NAME, mode=mode, no_user=100)
+    log.info('%s batched: %d items in %.4fms', mode, len(dic_batch["items"]), max(dic_batch["batch_latencies"], default=0.0))
   fig,axes = plt.subplots(1,1,figsize=(10,5))
-  axes.plot(dic_wo_dax['latencies'][1:],'k--o',markersize=3,linewidth=0.5)
-  axes.plot(dic_wi_dax['latencies'][1:],'b--o',markersize=3,linewidth=0.5)
+  axes.plot(dic_wo_dax['latencies'],'k--o',markersize=3,linewidth=0.5)
+  axes.plot(dic_wi_dax['latencies'],'b--o',markersize=3,linewidth=0.5)
   axes.legend(['wo-dax','wi-dax'])
   axes.set_ylabel('milisecond')
   axes.set_xlabel('read db')
-  axes.set_yticks([k for k in range(10)])
-  axes.set_ylim(0,10)
+  axes.set_ylim(bottom=0)
   fig.suptitle('DAX performance')
   fig.savefig('dax_performance.png')
\ No newline at end of file
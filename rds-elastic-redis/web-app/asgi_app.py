@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# ASGI variant of webApp.py, same routes and templates with async handlers.
+# Blocking MySQL and Redis calls run on a bounded thread pool so the event loop
+# keeps serving other requests while one waits on the database.
+# hypercorn asgi_app:app --bind 0.0.0.0:8008
+
+import os
+import json
+import asyncio
+import functools
+import itertools
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import pymysql
+from quart import Quart, render_template, stream_template, request, make_response, g, abort
+
+from cacheLib import *
+from common import tracing
+
+# Backend calls in flight per worker process, shared by all requests
+max_in_flight = int(os.environ.get('MAX_IN_FLIGHT', 32))
+
+app = Quart(__name__)
+tracing.init_async_app(app)
+executor = ThreadPoolExecutor(max_workers=max_in_flight)
+
+
+async def run(fn, *args):
+    '''
+    This function runs a blocking call on the shared pool, its spans go to the request trace.
+    '''
+    return await asyncio.get_running_loop().run_in_executor(executor, tracing.propagate(fn), *args)
+
+
+def streaming():
+    '''
+    Streaming renders rows as they are read, ?stream=0 or 1 overrides the stream_results config.
+    '''
+    default = '1' if context.configs.get('stream_results') else '0'
+    return request.args.get('stream', default) == '1'
+
+
+def page_query():
+    '''
+    The page of the request, same parameters as webApp.py: ?term=, ?after= and ?size=.
+    '''
+    term = request.args.get('term', context.search_term)
+    after = request.args.get('after', 0, type=int)
+    size = request.args.get('size', context.page_size, type=int)
+    try:
+        sql, params = build_query(term, after, size)
+    except ValueError as e:
+        abort(400, description=str(e))
+    return sql, params, {'term': term, 'page_size': params[-1]}
+
+
+async def database_error(e):
+    '''
+    A failed query answers 500, the worker keeps serving other requests.
+    '''
+    return 'The database query failed, see the application log.', 500
+
+app.register_error_handler(pymysql.MySQLError, database_error)
+
+
+async def iterate_rows(rows):
+    '''
+    This function turns a blocking row iterator into an async one. Rows are read on the pool
+    stream_batch at a time, so a chunked or streamed result is never held in memory as a whole.
+    '''
+    batch_size = context.configs.get('stream_batch', 100)
+    try:
+        while True:
+            batch = await run(lambda: list(itertools.islice(rows, batch_size)))
+            if not batch:
+                return
+            for row in batch:
+                yield row
+    finally:
+        # Closing the page closes the cursor or chunk reader behind it
+        if hasattr(rows, 'close'):
+            await run(rows.close)
+
+
+def page_cached(view):
+    '''
+    The page cache of webApp.py, the Redis calls run on the pool. Views set g.page_tables
+    and g.page_ttl to make their page cacheable.
+    '''
+    @functools.wraps(view)
+    async def wrapper(*args, **kwargs):
+        key = page_key(request.path, request.args.items(multi=True))
+        etag, body = await run(get_cached_page, key, request.if_none_match)
+        if etag and body is None:
+            response = app.response_class('', status=304)
+        elif body is not None:
+            response = app.response_class(body, mimetype='text/html')
+        else:
+            response = await make_response(await view(*args, **kwargs))
+            if 'page_tables' not in g:
+                return response
+            etag = await run(cache_page, key, await response.get_data(), g.page_tables, g.page_ttl)
+        response.set_etag(etag)
+        return await response.make_conditional(request)
+    return wrapper
+
+
+###############################  Quart Routes #################################
+
+@app.route("/")
+async def index():
+    # The first use of the context may call AWS, keep it off the event loop
+    await run(lambda: context.configs)
+    sql, params, page = page_query()
+    return await render_template('index.html', rows=page['page_size'], sql=sql, params=params)
+
+@app.route("/query_mysql")
+async def query_mysql_endpoint():
+    configs = await run(lambda: context.configs)
+    sql, params, page = page_query()
+    start_time = datetime.now()
+    args = (sql, configs['db_host'], configs['db_username'], configs['db_password'], configs['db_name'], params)
+    if streaming():
+        # Execution time is the time to the first row, the rest streams with the page
+        rows = await run(lambda: peek_rows(mysql_stream_data(*args)))
+        delta = (datetime.now() - start_time).total_seconds()
+        return await stream_template('query_mysql.html', delta=delta, data=rows and iterate_rows(rows), sql=sql, params=params,
+                                     fields=db_tbl_fields, **page)
+
+    data = await run(query_mysql, *args)
+    delta = (datetime.now() - start_time).total_seconds()
+    return await render_template('query_mysql.html', delta=delta, data=data, sql=sql, params=params, fields=db_tbl_fields, **page)
+
+@app.route("/query_cache")
+@page_cached
+async def query_cache_endpoint():
+    configs = await run(lambda: context.configs)
+    sql, params, page = page_query()
+    start_time = datetime.now()
+    args = (sql, configs['db_host'], configs['db_username'], configs['db_password'], configs['db_name'], params)
+    stream = streaming()
+    result = await run(stream_mysql_and_cache if stream else query_mysql_and_cache, *args)
+    delta = (datetime.now() - start_time).total_seconds()
+    if result is None:
+        # Past the last page, or nothing matched the search
+        result = {'records_in_cache': False, 'data': None}
+
+    data = result['data']
+    if stream and not result['records_in_cache']:
+        # On a miss the result is cached once the last row went out, its TTL starts then
+        return await stream_template('query_cache.html', delta=delta, data=data and iterate_rows(data),
+                                     records_in_cache=False, TTL=configs['ttl'], sql=sql, params=params, fields=db_tbl_fields, **page)
+
+    # Small results come back as JSON, chunked results as a lazy row iterator read on the pool
+    if isinstance(data, bytes):
+        data = json.loads(data)
+    elif data is not None and not isinstance(data, list):
+        data = iterate_rows(data)
+
+    ttl = await run(context.cache.ttl, query_key(sql, params))
+    # A page rendered from cached records is cached along with them
+    if result['records_in_cache']:
+        g.page_tables = extract_tables(sql, configs['db_name'])
+        g.page_ttl = ttl
+
+    return await render_template('query_cache.html', delta=delta, data=data, records_in_cache=result['records_in_cache'],
+                                 TTL=ttl, sql=sql, params=params, fields=db_tbl_fields, **page)
+
+@app.route("/delete_cache")
+async def delete_cache_endpoint():
+    await run(flush_cache)
+    return await render_template('delete_cache.html')
+
+if __name__ == "__main__":
+    app.run(host='0.0.0.0', port=context.configs['app_port'])
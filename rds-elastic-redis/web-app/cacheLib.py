@@ -5,7 +5,21 @@ import pymysql
 import boto3
 import sys
 import os.path
+import re
+import time
+import hashlib
+import base64
+import argparse
+import itertools
+import threading
+import queue
+import tempfile
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.exceptions import ClientError
+# helpers shared by the demo apps, see common/ at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from common.tracing import span
 
 def store_configs (config_file, configs):
     '''
@@ -97,9 +111,11 @@ def get_stack_outputs(stack_name,region_name):
     return stack_outputs
 
 
-def mysql_execute_command(sql, db_host, db_username, db_password):
+def mysql_execute_command(sql, db_host, db_username, db_password, db_name=None):
     '''
     This function excutes the sql statement, does not return any value.
+    Cached queries reading the tables written by the statement are invalidated, unqualified
+    table names belong to db_name, the demo database by default.
     '''
     try:
         con = pymysql.connect(host=db_host,
@@ -116,10 +132,41 @@ def mysql_execute_command(sql, db_host, db_username, db_password):
         print('Error: {}'.format(str(e)))
         sys.exit(1)
 
+    invalidate_tables(extract_tables(sql, db_name or default_db_name))
 
-def mysql_fetch_data(sql, db_host, db_username, db_password, db_name):
+
+def mysql_fetch_data(sql, db_host, db_username, db_password, db_name, params=None):
+    '''
+    This function excutes the sql query with its parameters and returns dataset.
+    Errors are raised to the caller, a request answers 500 instead of stopping the worker.
+    '''
+    con = None
+    try:
+        with span('db-query', 'mysql'):
+            con = pymysql.connect(host=db_host,
+                                    user=db_username,
+                                    password=db_password,
+                                    database=db_name,
+                                    autocommit=True,
+                                    local_infile=1,
+                                    charset='utf8mb4',
+                                    cursorclass=pymysql.cursors.DictCursor)                              
+            # Create cursor and execute SQL statement
+            cursor = con.cursor()
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+       
+    except Exception as e:
+        print('Error: {}'.format(str(e)))
+        raise
+    finally:
+        if con is not None:
+            con.close()
+
+def mysql_stream_data(sql, db_host, db_username, db_password, db_name, params=None):
     '''
-    This function excutes the sql query and returns dataset.
+    This function excutes the sql query and yields rows from an unbuffered cursor,
+    so only stream_batch rows are held in memory at a time.
     '''
     try:
         con = pymysql.connect(host=db_host,
@@ -127,55 +174,406 @@ def mysql_fetch_data(sql, db_host, db_username, db_password, db_name):
                                 password=db_password,
                                 database=db_name,
                                 autocommit=True,
-                                local_infile=1,
                                 charset='utf8mb4',
-                                cursorclass=pymysql.cursors.DictCursor)                              
-        # Create cursor and execute SQL statement
-        cursor = con.cursor()
-        cursor.execute(sql)
-        data_set = cursor.fetchall()
-        con.close()
-        return data_set
-       
+                                cursorclass=pymysql.cursors.SSDictCursor)
     except Exception as e:
         print('Error: {}'.format(str(e)))
-        sys.exit(1)
+        raise
+
+    try:
+        cursor = con.cursor()
+        # Only the execution is timed, reading the rows overlaps the render
+        with span('db-query', 'mysql'):
+            cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(context.configs.get('stream_batch', 100))
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        # Also runs when the client goes away and the generator is closed
+        con.close()
+
+
+def peek_rows(rows):
+    '''
+    This function waits for the first row of a row iterator, so the query has run before
+    the response starts. Returns None when there are no rows.
+    '''
+    first = next(rows, None)
+    if first is None:
+        return None
+
+    def chained():
+        try:
+            yield first
+            yield from rows
+        finally:
+            # Closing the page closes the cursor behind it
+            if hasattr(rows, 'close'):
+                rows.close()
+
+    return chained()
+
+
+def extract_tables(sql, db_name=None):
+    '''
+    This function returns the tables a sql statement reads or writes, qualified with the database name.
+    '''
+    tables = set()
+    for table in table_pattern.findall(sql):
+        table = table.replace('`', '').lower()
+        if '.' not in table and db_name:
+            table = db_name.lower() + '.' + table
+        tables.add(table)
+    return sorted(tables)
+
+
+def tag_key(table):
+    '''
+    This function returns the name of the Redis set holding the cache keys tagged with a table.
+    '''
+    return 'tag:' + table
+
+
+def version_key(table):
+    '''
+    This function returns the name of the Redis counter bumped each time a table is invalidated.
+    '''
+    return 'version:' + table
+
+
+def table_versions(tables):
+    '''
+    This function returns the invalidation counters of the given tables. They are read before a query
+    runs, so its result is only cached if no table was invalidated while it ran.
+    '''
+    if not tables:
+        return []
+    with span('cache-get', 'redis'):
+        return context.cache.mget([version_key(table) for table in tables])
+
+
+def chunk_key(key, num):
+    '''
+    This function returns the cache key of one chunk of a large result set.
+    '''
+    return '{}:chunk:{}'.format(key, num)
+
+
+def cache_with_tags(entries, tables, chunks=(), stored_keys=(), versions=None):
+    '''
+    This function stores key/value pairs in the cache with one pipeline and tags the keys with the tables they were read from.
+    Chunks are written first and expire chunk_grace seconds after the entries, so a manifest never outlives its chunks.
+    Chunk keys in stored_keys were already written, they are only tagged and get the same expiry as the new chunks.
+    With versions, the table versions read before the query ran, nothing is stored if a table was invalidated since
+    and the stored_keys are deleted. Returns whether the entries were stored.
+    '''
+    ttl, chunk_ttl = context.configs['ttl'], context.chunk_ttl
+    check = versions is not None and bool(tables)
+    pipe = context.cache.pipeline(transaction=check)
+    try:
+        if check:
+            # WATCH aborts the write if invalidate_tables bumps a version before it executes
+            pipe.watch(*[version_key(table) for table in tables])
+            if pipe.mget([version_key(table) for table in tables]) != versions:
+                raise redis.WatchError
+            pipe.multi()
+        for key, value in chunks:
+            pipe.set(key, value, ex=chunk_ttl)
+        for key in stored_keys:
+            pipe.expire(key, chunk_ttl)
+        for key, value in entries:
+            pipe.set(key, value, ex=ttl)
+        keys = [key for key, value in itertools.chain(chunks, entries)]
+        for table in tables:
+            pipe.sadd(tag_key(table), *keys, *stored_keys)
+            # Refresh the tag TTL so the set never expires before the keys it tracks
+            pipe.expire(tag_key(table), chunk_ttl)
+        with span('cache-set', 'redis'):
+            pipe.execute()
+    except redis.WatchError:
+        print ('{} changed while the query ran, the result is not cached...'.format(', '.join(tables)))
+        if stored_keys:
+            context.cache.delete(*stored_keys)
+        return False
+    finally:
+        pipe.reset()
+    return True
+
+
+def cache_result(key, rows, tables, versions=None):
+    '''
+    This function stores a result set in the cache. Results larger than chunk_rows are split
+    across several keys so no single write blocks Redis for long. versions are the table versions
+    read before the query ran, see cache_with_tags.
+    '''
+    chunk_rows = context.chunk_rows
+    if len(rows) <= chunk_rows:
+        return cache_with_tags([(key, json.dumps(rows))], tables, versions=versions)
+
+    chunks = []
+    for num, start in enumerate(range(0, len(rows), chunk_rows)):
+        chunks.append((chunk_key(key, num), json.dumps(rows[start:start + chunk_rows])))
+    # The manifest goes after its chunks so a reader never finds it before them
+    return cache_with_tags([(key, json.dumps({'chunks': len(chunks), 'rows': len(rows)}))], tables, chunks, versions=versions)
+
+
+def iter_cached_rows(key, chunks, refetch=None):
+    '''
+    This function yields the rows of a chunked result set, fetching one chunk at a time.
+    A chunk evicted or invalidated while the rows are read is a cache miss: the remaining rows
+    come from refetch, which returns the rows of the query, or a LookupError is raised without it.
+    '''
+    read = 0
+    for num in range(chunks):
+        with span('cache-get', 'redis'):
+            chunk = context.cache.get(chunk_key(key, num))
+        if chunk is None:
+            if refetch is None:
+                raise LookupError('Chunk {} of {} is no longer cached'.format(num, key))
+            print ('Chunk {} is no longer cached, reading the rest from the database...'.format(num))
+            rows = refetch()
+            try:
+                # Rows come in a stable order, so the rows already read are skipped
+                yield from itertools.islice(rows, read, None)
+            finally:
+                if hasattr(rows, 'close'):
+                    rows.close()
+            return
+        with span('deserialize'):
+            rows = json.loads(chunk)
+        for row in rows:
+            yield row
+        read += len(rows)
+
+
+def stream_and_cache(key, rows, tables):
+    '''
+    This function yields rows while writing them to the cache one chunk at a time, in the same
+    layout as cache_result. The manifest is written only after the last row, so a stream that is
+    abandoned half way never leaves a partial result behind. The table versions are read before
+    the first row, a stream that outlives an invalidation of its tables is not cached.
+    '''
+    chunk_rows = context.chunk_rows
+    versions = table_versions(tables)
+    chunk, stored_keys = [], []
+    for row in rows:
+        # A full chunk is only stored once more rows follow, a single chunk is stored as a plain value
+        if len(chunk) == chunk_rows:
+            stored_keys.append(chunk_key(key, len(stored_keys)))
+            context.cache.set(stored_keys[-1], json.dumps(chunk), ex=context.chunk_ttl)
+            chunk = []
+        chunk.append(row)
+        yield row
+
+    if not chunk:
+        return
+    if not stored_keys:
+        cache_with_tags([(key, json.dumps(chunk))], tables, versions=versions)
+        return
+    chunks = [(chunk_key(key, len(stored_keys)), json.dumps(chunk))]
+    manifest = {'chunks': len(stored_keys) + 1, 'rows': len(stored_keys) * chunk_rows + len(chunk)}
+    # The chunks stored while streaming get their expiry refreshed, so none expires before the manifest
+    cache_with_tags([(key, json.dumps(manifest))], tables, chunks, stored_keys, versions)
+
+
+def get_cached_result(key, refetch=None):
+    '''
+    This function returns a cached result set, either as the raw JSON of a small result
+    or as a lazy row iterator over the chunks of a large one. Returns None on a miss.
+    refetch returns the rows of the query when a chunk disappears while the rows are read.
+    '''
+    with span('cache-get', 'redis'):
+        res = context.cache.get(key)
+
+    if not res or not res.startswith(b'{'):
+        return res
+
+    chunks = json.loads(res)['chunks']
+    # A partially expired result counts as a miss
+    with span('cache-get', 'redis'):
+        complete = context.cache.exists(*[chunk_key(key, num) for num in range(chunks)]) == chunks
+    if not complete:
+        return None
+    return iter_cached_rows(key, chunks, refetch)
+
+
+def invalidate_tables(tables):
+    '''
+    This function deletes only the cached queries tagged with the given tables.
+    '''
+    if not tables:
+        return 0
+
+    keys = set()
+    for table in tables:
+        keys.update(context.cache.smembers(tag_key(table)))
+
+    pipe = context.cache.pipeline(transaction=False)
+    for key in keys:
+        pipe.delete(key)
+    for table in tables:
+        pipe.delete(tag_key(table))
+        # Results of queries still running when the tags were dropped are not cached after them
+        pipe.incr(version_key(table))
+    pipe.execute()
+    print ('Invalidated {} cached queries for {}'.format(len(keys), ', '.join(tables)))
+    return len(keys)
+
+
+def page_key(path, args):
+    '''
+    This function returns the response cache key of a route and its sorted query parameters.
+    '''
+    return 'page:{}?{}'.format(path, '&'.join('{}={}'.format(name, value) for name, value in sorted(args)))
+
+
+def get_cached_page(key, etags=()):
+    '''
+    This function returns the ETag and body of a cached page. The body is only fetched
+    when the client does not hold the ETag already. Returns (None, None) on a miss.
+    '''
+    with span('cache-get', 'redis'):
+        etag = context.cache.hget(key, 'etag')
+    if etag is None:
+        return None, None
+    etag = etag.decode()
+    if etag in etags:
+        return etag, None
+    return etag, context.cache.hget(key, 'body')
+
+
+def cache_page(key, body, tables, ttl):
+    '''
+    This function stores a rendered page with a content hash ETag. The page is tagged with the
+    tables of its query, so it is invalidated with the cached result it was rendered from, and
+    expires with it after ttl seconds.
+    '''
+    etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+    if ttl <= 0:
+        return etag
+    pipe = context.cache.pipeline(transaction=False)
+    pipe.hset(key, mapping={'etag': etag, 'body': body})
+    pipe.expire(key, ttl)
+    for table in tables:
+        pipe.sadd(tag_key(table), key)
+    pipe.execute()
+    return etag
+
 
 def flush_cache():
     '''
-    This function flushes all records from the cache.
+    This function removes the cached queries on the demo table from the cache.
     '''     
-    
-    Cache.flushall()
+
+    return invalidate_tables([context.configs['db_name'].lower() + '.' + db_table])
+
+
+def query_key(sql, params=None):
+    '''
+    This function returns the cache key of a statement and its parameters, so every page
+    and search term of a parameterized query is cached separately.
+    '''
+    if not params:
+        return sql
+    return sql + ' ' + json.dumps(list(params))
+
+
+def search_expression(term):
+    '''
+    This function validates a full text search term and returns it normalized for BOOLEAN MODE.
+    Words and quoted phrases may have one of the + - ~ < > operators in front and words a * behind,
+    words joined by punctuation such as covid-19 become the phrase "covid 19". Anything else, such as
+    a dangling operator or an unclosed quote, raises a ValueError instead of a MySQL syntax error.
+    '''
+    if not search_pattern.fullmatch(term):
+        raise ValueError('Invalid search term: {}'.format(term))
+    expression = []
+    for operator, operand in search_token_pattern.findall(term):
+        words = re.findall(r'\w+', operand)
+        if not words or not (operand.startswith('"') or operand[0].isalnum() or operand[0] == '_'):
+            raise ValueError('Invalid search term: {}'.format(term))
+        if operand.startswith('"') or len(words) > 1:
+            expression.append(operator + '"' + ' '.join(words) + '"')
+        else:
+            expression.append(operator + words[0] + ('*' if operand.endswith('*') else ''))
+    return ' '.join(expression)
 
 
-def query_mysql_and_cache(sql,db_host, db_username, db_password, db_name):
+def build_query(term=None, after=0, page_size=None):
+    '''
+    This function returns the parameterized statement and parameters of one page of the demo table.
+    Rows come in OBJECTID order after the OBJECTID cursor, so a page is read from the primary key
+    however deep it is. A search term is matched through the FULLTEXT index on Sentence and Title,
+    an invalid term raises a ValueError.
+    '''
+    page_size = max(1, min(page_size or context.page_size, context.max_rows))
+    conditions, params = ['OBJECTID > %s'], [after]
+    term = search_expression(term) if term else None
+    if term:
+        conditions.insert(0, 'MATCH (' + search_fields + ') AGAINST (%s IN BOOLEAN MODE)')
+        params.insert(0, term)
+    sql = "select SQL_NO_CACHE " + sql_fields + " from " + db_table + " where " + ' and '.join(conditions) + " order by OBJECTID limit %s"
+    params.append(page_size)
+    return sql, tuple(params)
+
+
+def query_mysql_and_cache(sql,db_host, db_username, db_password, db_name, params=None):
     '''
     This function retrieves records from the cache if it exists, or else gets it from the MySQL database.
     '''     
 
-    res = Cache.get(sql)
+    key = query_key(sql, params)
+    res = get_cached_result(key, lambda: mysql_fetch_data(sql, db_host, db_username, db_password, db_name, params))
 
     if res:
         print ('Records in cache...')
         return ({'records_in_cache': True, 'data' : res})
           
-    res = mysql_fetch_data(sql, db_host, db_username, db_password, db_name)
+    tables = extract_tables(sql, db_name)
+    versions = table_versions(tables)
+    res = mysql_fetch_data(sql, db_host, db_username, db_password, db_name, params)
     
     if res:
         print ('Cache was empty. Now populating cache...')  
-        Cache.setex(sql, ttl, json.dumps(res))
+        cache_result(key, res, tables, versions)
         return ({'records_in_cache': False, 'data' : res})
     else:
         return None
 
 
-def query_mysql(sql,db_host, db_username, db_password, db_name):
+def stream_mysql_and_cache(sql, db_host, db_username, db_password, db_name, params=None):
+    '''
+    This function is the streaming variant of query_mysql_and_cache. Data is an iterator of rows,
+    read from the cache chunk by chunk or from an unbuffered cursor that populates the cache as it goes.
+    Returns None when the query has no rows.
+    '''
+
+    key = query_key(sql, params)
+    res = get_cached_result(key, lambda: mysql_stream_data(sql, db_host, db_username, db_password, db_name, params))
+
+    if res:
+        print ('Records in cache...')
+        data = iter(json.loads(res)) if isinstance(res, bytes) else res
+        return ({'records_in_cache': True, 'data' : data})
+
+    rows = mysql_stream_data(sql, db_host, db_username, db_password, db_name, params)
+    data = peek_rows(stream_and_cache(key, rows, extract_tables(sql, db_name)))
+
+    if data is None:
+        return None
+    print ('Cache was empty. Now streaming and populating cache...')
+    return ({'records_in_cache': False, 'data' : data})
+
+
+def query_mysql(sql,db_host, db_username, db_password, db_name, params=None):
     '''
     This function retrieve records from the database.
     ''' 
 
-    res = mysql_fetch_data(sql, db_host, db_username, db_password, db_name)
+    res = mysql_fetch_data(sql, db_host, db_username, db_password, db_name, params)
     
     if res:
         print ('Records in database...')
@@ -183,71 +581,433 @@ def query_mysql(sql,db_host, db_username, db_password, db_name):
     else:
         return None
 
-def initialize_database(configs):
+def initialize_database(configs, fresh=False):
     '''
     This function initialize the MySQL database if not already done so and generates
     all configurations needed for the application.
+    The CSV file is loaded in parallel into a staging table, which then replaces the live table
+    in one step, so the demo table is never missing or half loaded. An interrupted load resumes
+    from its checkpoint unless fresh is set.
     ''' 
    
     # Initialize Database
     print ('Initializing MySQL Database...')
 
-    #Drop table if exists
-    sql_command = "DROP TABLE IF EXISTS covid.articles;"
-    mysql_execute_command(sql_command, configs['db_host'], configs['db_username'], configs['db_password'])
+    checkpoint_file = configs.get('ingest_checkpoint_file', '.ingest_checkpoint.json')
+    checkpoint = None if fresh else load_checkpoint(checkpoint_file, configs)
+    if checkpoint is None:
+        checkpoint = new_checkpoint(configs)
+        #Create staging table
+        mysql_execute_command("DROP TABLE IF EXISTS " + checkpoint['table'] + ";", configs['db_host'], configs['db_username'], configs['db_password'])
+        mysql_execute_command(create_table_sql(checkpoint['table']), configs['db_host'], configs['db_username'], configs['db_password'])
+        store_checkpoint(checkpoint_file, checkpoint)
+    else:
+        print ('Resuming load, {} of {} chunks done...'.format(len(checkpoint['done']), len(checkpoint['chunks'])))
+
+    #Load CSV chunks into the staging table
+    if checkpoint.get('phase', 'load') == 'load':
+        failed = load_chunks(configs, checkpoint, checkpoint_file)
+        if failed:
+            print ('Error: {} chunks failed, run init-db again to resume'.format(failed))
+            sys.exit(1)
+        checkpoint['phase'] = 'index'
+        store_checkpoint(checkpoint_file, checkpoint)
+
+    #Index after loading, building it once is faster than maintaining it row by row
+    if checkpoint['phase'] == 'index':
+        create_search_index(configs, checkpoint['table'])
+        checkpoint['phase'] = 'swap'
+        store_checkpoint(checkpoint_file, checkpoint)
+
+    #Swap the staging table in
+    swap_tables(configs, checkpoint['table'], 'covid.' + db_table)
+    os.remove(checkpoint_file)
+
+def create_table_sql(table):
+    '''
+    This function returns the statement creating a table with the layout of the CSV file.
+    '''
+    return "CREATE TABLE " + table + " (OBJECTID INT, SHA TEXT, PossiblePlace TEXT, Sentence TEXT, MatchedPlace TEXT, DOI  TEXT, Title TEXT, Abstract TEXT, PublishedDate TEXT, Authors TEXT, Journal TEXT, Source TEXT, License TEXT, PRIMARY KEY (OBJECTID));"
 
-    #Create table
-    sql_command = "CREATE TABLE covid.articles (OBJECTID INT, SHA TEXT, PossiblePlace TEXT, Sentence TEXT, MatchedPlace TEXT, DOI  TEXT, Title TEXT, Abstract TEXT, PublishedDate TEXT, Authors TEXT, Journal TEXT, Source TEXT, License TEXT, PRIMARY KEY (OBJECTID));"
-    mysql_execute_command(sql_command, configs['db_host'], configs['db_username'], configs['db_password'])
 
-    #Load CSV file into mysql
-    sql_command = """
-    LOAD DATA LOCAL INFILE '{0}' 
-    INTO TABLE covid.articles 
-    FIELDS TERMINATED BY ',' 
-    ENCLOSED BY '"'
-    LINES TERMINATED BY '\n'
-    IGNORE 1 ROWS;
-    """.format(configs['dataset_file'])
+def split_csv(path, chunk_bytes):
+    '''
+    This function returns the byte ranges of about chunk_bytes each that the records of a CSV file
+    fall into, as [start, end, rows] after the header row. Ranges end on a newline outside quotes,
+    so a quoted field spanning several lines is never cut in two.
+    '''
+    chunks = []
+    with open(path, 'rb') as fp:
+        pos, quotes, start, rows = 0, 0, None, 0
+        for line in fp:
+            pos += len(line)
+            # Doubled quotes inside a field keep the count even
+            quotes += line.count(b'"')
+            if quotes % 2:
+                continue
+            if start is None:
+                # End of the header row
+                start = pos
+                continue
+            rows += 1
+            if pos - start >= chunk_bytes:
+                chunks.append([start, pos, rows])
+                start, rows = pos, 0
+        if start is not None and pos > start:
+            chunks.append([start, pos, rows])
+    return chunks
+
+
+def new_checkpoint(configs):
+    '''
+    This function splits the dataset and returns the progress record of a new load.
+    '''
+    path = configs['dataset_file']
+    chunk_bytes = configs.get('ingest_chunk_mb', 16) * 1024 * 1024
+    stat = os.stat(path)
+    return {'dataset_file': path, 'size': stat.st_size, 'mtime': stat.st_mtime, 'chunk_bytes': chunk_bytes,
+            'table': 'covid.' + db_table + '_staging', 'chunks': split_csv(path, chunk_bytes), 'done': []}
+
+
+def load_checkpoint(checkpoint_file, configs):
+    '''
+    This function returns the progress record of an interrupted load, or None when there is none
+    or the dataset changed since.
+    '''
+    if not os.path.exists(checkpoint_file):
+        return None
+    checkpoint = load_configs(checkpoint_file)
+    path = configs['dataset_file']
+    if (not os.path.exists(path) or checkpoint['dataset_file'] != path
+            or checkpoint['size'] != os.stat(path).st_size or checkpoint['mtime'] != os.stat(path).st_mtime):
+        print ('Dataset changed since the last load, starting over...')
+        return None
+    return checkpoint
+
+
+def store_checkpoint(checkpoint_file, checkpoint):
+    '''
+    This function writes the progress record, replacing the previous one in one step.
+    '''
+    tmp_file = checkpoint_file + '.tmp'
+    store_configs(tmp_file, checkpoint)
+    os.replace(tmp_file, checkpoint_file)
+
+
+def load_chunk(pool, configs, table, chunk, chunk_dir):
+    '''
+    This function loads one byte range of the dataset into a table over a pooled connection.
+    Rows are loaded with REPLACE on the primary key, so a chunk loaded again after a crash
+    does not fail on duplicates.
+    '''
+    start, end, rows = chunk
+    chunk_file = os.path.join(chunk_dir, 'chunk-{}.csv'.format(start))
+    with open(configs['dataset_file'], 'rb') as src, open(chunk_file, 'wb') as dst:
+        src.seek(start)
+        dst.write(src.read(end - start))
+
+    # Connections are opened on first use and reused for later chunks
+    con = pool.get()
+    try:
+        if con is None:
+            con = pymysql.connect(host=configs['db_host'], user=configs['db_username'], password=configs['db_password'],
+                                  autocommit=True, local_infile=1, charset='utf8mb4')
+        cursor = con.cursor()
+        cursor.execute("""
+        LOAD DATA LOCAL INFILE %s
+        REPLACE INTO TABLE """ + table + """
+        FIELDS TERMINATED BY ','
+        ENCLOSED BY '"'
+        LINES TERMINATED BY '\\n';
+        """, (chunk_file,))
+        cursor.close()
+        pool.put(con)
+    except Exception:
+        # A failed connection is replaced rather than handed to the next chunk
+        if con is not None:
+            con.close()
+        pool.put(None)
+        raise
+    finally:
+        os.remove(chunk_file)
+    return rows
+
+
+def load_chunks(configs, checkpoint, checkpoint_file):
+    '''
+    This function loads the chunks not done yet in parallel, ingest_workers connections at a time,
+    and records each finished chunk in the checkpoint. Returns the number of chunks that failed.
+    '''
+    workers = configs.get('ingest_workers', 4)
+    done = set(checkpoint['done'])
+    pending = [num for num in range(len(checkpoint['chunks'])) if num not in done]
+    chunk_dir = tempfile.mkdtemp(prefix='ingest-')
+    # One slot per worker, None until the slot's connection is opened
+    pool = queue.Queue()
+    for _ in range(workers):
+        pool.put(None)
+
+    loaded_rows, failed = 0, 0
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(load_chunk, pool, configs, checkpoint['table'], checkpoint['chunks'][num], chunk_dir): num
+                   for num in pending}
+        for future in as_completed(futures):
+            num = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                print('Error: chunk {} failed: {}'.format(num, str(e)))
+                failed += 1
+                continue
+            # Only this thread writes the checkpoint
+            loaded_rows += rows
+            checkpoint['done'].append(num)
+            store_checkpoint(checkpoint_file, checkpoint)
+            elapsed = time.perf_counter() - start_time
+            print ('Loaded chunk {} ({}/{} done), {} rows at {:.0f} rows/sec'.format(
+                num, len(checkpoint['done']), len(checkpoint['chunks']), loaded_rows, loaded_rows / elapsed))
+
+    while not pool.empty():
+        con = pool.get()
+        if con is not None:
+            con.close()
+    os.rmdir(chunk_dir)
+    elapsed = time.perf_counter() - start_time
+    print ('Loaded {} rows in {:.1f}s ({:.0f} rows/sec)'.format(loaded_rows, elapsed, loaded_rows / elapsed if elapsed else 0))
+    return failed
+
+
+def mysql_exists(sql, params, configs):
+    '''
+    This function returns whether a query on the MySQL server finds any row.
+    '''
+    con = pymysql.connect(host=configs['db_host'], user=configs['db_username'], password=configs['db_password'])
+    try:
+        cursor = con.cursor()
+        return bool(cursor.execute(sql, params))
+    finally:
+        con.close()
+
+
+def table_exists(configs, table):
+    '''
+    This function returns whether a schema qualified table exists.
+    '''
+    schema, name = table.split('.')
+    return mysql_exists("SELECT 1 FROM information_schema.tables WHERE table_schema = %s AND table_name = %s", (schema, name), configs)
+
+
+def index_exists(configs, table, index):
+    '''
+    This function returns whether a schema qualified table has an index of the given name.
+    '''
+    schema, name = table.split('.')
+    return mysql_exists("SELECT 1 FROM information_schema.statistics WHERE table_schema = %s AND table_name = %s AND index_name = %s",
+                        (schema, name, index), configs)
+
+
+def swap_tables(configs, staging, table):
+    '''
+    This function replaces a table with the staging table in one RENAME TABLE, readers see
+    either the old or the new data. Cached queries on the table are invalidated.
+    A swap interrupted after the RENAME finds the staging table gone and only drops the old table.
+    '''
+    old = table + "_old"
+    if not table_exists(configs, staging):
+        print ('{} already swapped in as {}'.format(staging, table))
+        invalidate_tables([table])
+    elif table_exists(configs, table):
+        # Left over from a swap interrupted before its DROP
+        mysql_execute_command("DROP TABLE IF EXISTS " + old + ";", configs['db_host'], configs['db_username'], configs['db_password'])
+        sql_command = "RENAME TABLE " + table + " TO " + old + ", " + staging + " TO " + table + ";"
+        mysql_execute_command(sql_command, configs['db_host'], configs['db_username'], configs['db_password'])
+    else:
+        mysql_execute_command("RENAME TABLE " + staging + " TO " + table + ";", configs['db_host'], configs['db_username'], configs['db_password'])
+        invalidate_tables([table])
+    mysql_execute_command("DROP TABLE IF EXISTS " + old + ";", configs['db_host'], configs['db_username'], configs['db_password'])
+    print ('Swapped {} in as {}'.format(staging, table))
+
+
+def create_search_index(configs, table='covid.articles'):
+    '''
+    This function creates the FULLTEXT index the search queries use, a leading wildcard LIKE
+    would scan the whole table instead. An index left by an interrupted load is kept.
+    '''
+    if index_exists(configs, table, 'articles_search'):
+        print ('Search index already exists')
+        return
+    print ('Creating search index...')
+    sql_command = "ALTER TABLE " + table + " ADD FULLTEXT INDEX articles_search (" + search_fields + ");"
     mysql_execute_command(sql_command, configs['db_host'], configs['db_username'], configs['db_password'])
 
+def cached_call(name, ttl, fn, cache_file):
+    '''
+    This function returns the value of fn cached on disk under name for ttl seconds.
+    The cache file may hold secrets, so it is only readable by its owner.
+    '''
+    entries = {}
+    if os.path.exists(cache_file):
+        try:
+            entries = load_configs(cache_file)
+        except ValueError:
+            entries = {}
+
+    entry = entries.get(name)
+    if entry and entry['expires'] > time.time():
+        return entry['value']
+
+    value = fn()
+    entries[name] = {'expires': time.time() + ttl, 'value': value}
+    tmp_file = cache_file + '.tmp'
+    with os.fdopen(os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as fp:
+        json.dump(entries, fp)
+    os.replace(tmp_file, cache_file)
+    return value
+
+
+def get_region(timeout):
+    '''
+    This function returns the region of the instance, from the environment or the instance metadata service.
+    '''
+    region_name = os.environ.get('AWS_REGION') or os.environ.get('AWS_DEFAULT_REGION')
+    if region_name:
+        return region_name
+    return requests.get(metadata_url, timeout=timeout).json()['region']
+
 
-# Load configurations from config file
-config_file = 'configs.json'
+def resolve_configs(config_file):
+    '''
+    This function loads the config file and adds the region and the stack outputs,
+    both cached on disk so only the first start after they expire calls AWS.
+    '''
+    if not os.path.exists(config_file):
+        print ('Missing config file...')
+        sys.exit(1)
 
-if os.path.exists(config_file):
-    configs = load_configs (config_file)
+    configs = load_configs(config_file)
     print('Local config file found...')
-else:
-    print ('Missing config file...')
-    exit
-
-stack_name = configs['stack_name']
-ttl = configs['ttl']
-app_port = configs['app_port']
-max_rows = configs['max_rows'] #max # of rows to query from database
-dataset_file = configs['dataset_file']
-region_name = requests.get('http://169.254.169.254/latest/dynamic/instance-identity/document').json()['region']
-configs['region_name'] = region_name
-
-# If datbase is not populated, retrieve endpoints for the database, cache and compute instance from CloudFormation and populate the database
-if configs['database_populated'] is False:
-
-    # Get additional configurations from CloudFormation and save on disk
-    stack_outputs = get_stack_outputs(stack_name,region_name)
-    for key in stack_outputs.keys():
-        configs[key] = stack_outputs[key] 
-
-    # Get all configs. If database was not initialized, it will be populated with sample data.
-    initialize_database(configs)
+
+    cache_file = configs.get('metadata_cache_file', '.metadata_cache.json')
+    cache_ttl = configs.get('metadata_ttl', 3600)
+    timeout = configs.get('metadata_timeout', 2)
+
+    if 'region_name' not in configs:
+        configs['region_name'] = cached_call('region_name', cache_ttl, lambda: get_region(timeout), cache_file)
+
+    # Endpoints written into the config file take precedence over the stack outputs
+    if 'redisendpoint' not in configs or 'db_host' not in configs:
+        stack_outputs = cached_call('stack_outputs', cache_ttl,
+                                    lambda: get_stack_outputs(configs['stack_name'], configs['region_name']), cache_file)
+        for key in stack_outputs.keys():
+            configs.setdefault(key, stack_outputs[key])
+
+    if configs['database_populated'] is False:
+        print ('Database not populated yet, run: python cacheLib.py init-db')
+
+    return configs
+
+
+class AppContext:
+    '''
+    This class holds the configurations and the Redis client of the application.
+    Nothing is loaded or connected until first use, so importing the module has no side effects
+    and worker processes can be forked after import.
+    '''
+
+    def __init__(self, config_file='configs.json'):
+        self.config_file = config_file
+        self._configs = None
+        self._cache = None
+        self._lock = threading.RLock()
+
+    @property
+    def configs(self):
+        if self._configs is None:
+            with self._lock:
+                if self._configs is None:
+                    self._configs = resolve_configs(self.config_file)
+        return self._configs
+
+    @property
+    def cache(self):
+        # redis-py connects on the first command and reconnects after a fork
+        if self._cache is None:
+            with self._lock:
+                if self._cache is None:
+                    self._cache = redis.Redis.from_url('redis://' + self.configs['redisendpoint'] + ':6379')
+        return self._cache
+
+    @property
+    def max_rows(self):
+        return self.configs['max_rows'] #max # of rows to query from database
+
+    @property
+    def chunk_rows(self):
+        return self.configs.get('cache_chunk_rows', 100) #max # of rows per cached value
+
+    @property
+    def chunk_ttl(self):
+        return self.configs['ttl'] + self.configs.get('chunk_grace', 30) #chunks outlive their manifest by chunk_grace seconds
+
+    @property
+    def page_size(self):
+        return self.configs.get('page_size', 100) #default # of rows per page
+
+    @property
+    def search_term(self):
+        return self.configs.get('search_term', '') #default full text search term
+
+
+def init_db(force=False, fresh=False):
+    '''
+    This function seeds the MySQL database with the sample dataset and records it in the config file.
+    '''
+    configs = context.configs
+    if configs['database_populated'] is True and not force:
+        print ('Database already populated, use --force to reload it')
+        return
+
+    initialize_database(configs, fresh)
+
+    # Only the flag is persisted, stack outputs stay in the metadata cache
+    stored_configs = load_configs(context.config_file)
+    stored_configs['database_populated'] = True
+    store_configs(context.config_file, stored_configs)
     configs['database_populated'] = True
-    store_configs (config_file, configs)
 
-# Initialize the cache
-Cache = redis.Redis.from_url('redis://' + configs['redisendpoint'] + ':6379')
 
+# Instance metadata endpoint, only used when the region is not in the environment
+metadata_url = 'http://169.254.169.254/latest/dynamic/instance-identity/document'
+
+# Tables referenced after FROM, JOIN, INTO, UPDATE and TABLE keywords
+table_pattern = re.compile(r'\b(?:from|join|update|into(?:\s+table)?|table)\s+(?:if\s+(?:not\s+)?exists\s+)?([`\w]+(?:\.[`\w]+)?)', re.IGNORECASE)
+
+# Database of the demo table, cached queries are tagged with qualified table names
+default_db_name = 'covid'
 db_table = 'articles'
 db_tbl_fields = ['OBJECTID', 'Sentence', 'Title', 'Source']
 sql_fields = ', '.join(db_tbl_fields)
-
-sql = "select SQL_NO_CACHE " + sql_fields + " from " + db_table  +  " where  Sentence like '%delta%' order by OBJECTID limit " + str(max_rows)
+db_search_fields = ['Sentence', 'Title']
+search_fields = ', '.join(db_search_fields)
+# Full text search terms: space separated words or quoted phrases, each with an optional operator
+search_token_pattern = re.compile(r'(?:^|(?<=\s))([-+~<>]?)("[^"]*"|[^\s"]+)')
+search_pattern = re.compile(r'\s*(?:[-+~<>]?(?:"[^"]*"|[^\s"]+)(?:\s+|$))*')
+
+# Application context, loaded lazily
+context = AppContext()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='cache demo administration')
+    commands = parser.add_subparsers(dest='command', required=True)
+    init_parser = commands.add_parser('init-db', help='load the sample dataset into MySQL')
+    init_parser.add_argument('--force', action='store_true', help='reload even if already populated')
+    init_parser.add_argument('--fresh', action='store_true', help='ignore the checkpoint of an interrupted load')
+    commands.add_parser('create-index', help='add the search index to a database seeded without it')
+    args = parser.parse_args()
+
+    if args.command == 'init-db':
+        init_db(args.force, args.fresh)
+    elif args.command == 'create-index':
+        create_search_index(context.configs)
@@ -0,0 +1,62 @@
+import fakeredis
+import pytest
+
+import cacheLib
+
+CONFIGS = {
+    'ttl': 60,
+    'max_rows': 500,
+    'page_size': 100,
+    'search_term': 'delta',
+    'cache_chunk_rows': 2,
+    'stream_batch': 2,
+    'db_host': 'localhost',
+    'db_username': 'admin',
+    'db_password': 'secret',
+    'db_name': 'covid',
+}
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=None):
+        self.connection.executed.append((sql, params))
+        if self.connection.error is not None:
+            raise self.connection.error
+
+    def fetchall(self):
+        return list(self.connection.rows)
+
+
+class FakeConnection:
+    '''
+    pymysql connection recording the statements it runs, returning rows or raising error
+    '''
+    def __init__(self):
+        self.executed = []
+        self.rows = []
+        self.error = None
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    server = fakeredis.FakeRedis()
+    monkeypatch.setattr(cacheLib.context, '_cache', server)
+    monkeypatch.setattr(cacheLib.context, '_configs', dict(CONFIGS))
+    return server
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    connection = FakeConnection()
+    monkeypatch.setattr(cacheLib.pymysql, 'connect', lambda **kwargs: connection)
+    return connection
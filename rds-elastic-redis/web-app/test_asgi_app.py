@@ -0,0 +1,49 @@
+import asyncio
+
+import asgi_app
+
+ROWS = [{'OBJECTID': i, 'Sentence': f'delta {i}', 'Title': 'delta', 'Source': 'x'} for i in range(5)]
+
+
+def get(path, **args):
+    async def request():
+        client = asgi_app.app.test_client()
+        response = await client.get(path, **args)
+        return response, await response.get_data()
+    return asyncio.run(request())
+
+
+def test_chunked_cached_rows_stream_into_the_page_and_the_page_is_cached(cache, connection):
+    connection.rows = ROWS
+    query = {'term': 'delta', 'stream': '0'}
+    response, body = get('/query_cache', query_string=query)
+    assert response.status_code == 200
+    assert b'delta 4' in body
+
+    # The second view renders the cached chunks and keeps the page, the third is a 304
+    response, body = get('/query_cache', query_string=query)
+    assert response.status_code == 200
+    assert b'delta 4' in body
+    assert len(connection.executed) == 1
+    etag = response.headers['ETag']
+    response, body = get('/query_cache', query_string=query, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert len(connection.executed) == 1
+
+
+def test_database_error_answers_500(cache, connection):
+    connection.error = asgi_app.pymysql.err.OperationalError(2003, "Can't connect to MySQL server")
+    response, _ = get('/query_mysql', query_string={'stream': '0'})
+    assert response.status_code == 500
+
+
+def test_requests_are_traced_with_spans_from_the_pool(cache, connection):
+    connection.rows = ROWS
+    response, _ = get('/query_cache', query_string={'term': 'delta', 'stream': '0'})
+    timing = response.headers['Server-Timing']
+    assert 'db-query.mysql;' in timing
+    assert 'render;' in timing
+    assert 'total;' in timing
+
+    response, body = get('/metrics')
+    assert b'/query_cache' in body
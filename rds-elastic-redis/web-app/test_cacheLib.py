@@ -0,0 +1,204 @@
+import json
+import os
+
+import pymysql
+import pytest
+
+import cacheLib
+
+ROWS = [{'OBJECTID': num, 'Title': 'title {}'.format(num)} for num in range(1, 6)]
+
+
+def test_unqualified_write_invalidates_qualified_tag(cache, connection):
+    sql, params = cacheLib.build_query('delta')
+    key = cacheLib.query_key(sql, params)
+    cacheLib.cache_result(key, [{'OBJECTID': 1}], cacheLib.extract_tables(sql, 'covid'))
+    assert cache.exists(key)
+
+    cacheLib.mysql_execute_command("UPDATE articles SET Title = 'x' WHERE OBJECTID = 1", 'localhost', 'admin', 'secret')
+    assert connection.executed
+    assert not cache.exists(key)
+    assert not cache.exists(cacheLib.tag_key('covid.articles'))
+
+
+def test_write_to_another_table_keeps_cached_queries(cache, connection):
+    key = cacheLib.query_key('select * from articles')
+    cacheLib.cache_result(key, [{'OBJECTID': 1}], ['covid.articles'])
+    cacheLib.mysql_execute_command("INSERT INTO sources VALUES (1)", 'localhost', 'admin', 'secret')
+    assert cache.exists(key)
+    assert json.loads(cache.get(key)) == [{'OBJECTID': 1}]
+
+
+def assert_manifest_expires_first(cache, key, chunks):
+    manifest_ttl = cache.ttl(key)
+    assert 0 < manifest_ttl <= cacheLib.context.configs['ttl']
+    for num in range(chunks):
+        assert cache.ttl(cacheLib.chunk_key(key, num)) > manifest_ttl
+
+
+def test_chunked_result_round_trip(cache):
+    cacheLib.cache_result('rows', ROWS, ['covid.articles'])
+    assert json.loads(cache.get('rows')) == {'chunks': 3, 'rows': 5}
+    assert_manifest_expires_first(cache, 'rows', 3)
+    assert list(cacheLib.get_cached_result('rows')) == ROWS
+
+
+def test_streamed_chunks_do_not_expire_before_the_manifest(cache):
+    assert list(cacheLib.stream_and_cache('rows', iter(ROWS), ['covid.articles'])) == ROWS
+    assert_manifest_expires_first(cache, 'rows', 3)
+    assert list(cacheLib.get_cached_result('rows')) == ROWS
+
+
+def test_chunk_missing_mid_read_is_refetched(cache):
+    cacheLib.cache_result('rows', ROWS, ['covid.articles'])
+    rows = cacheLib.get_cached_result('rows', refetch=lambda: iter(ROWS))
+    assert [next(rows), next(rows)] == ROWS[:2]
+    cache.delete(cacheLib.chunk_key('rows', 1))
+    assert list(rows) == ROWS[2:]
+
+
+def test_chunk_missing_mid_read_without_refetch_raises(cache):
+    cacheLib.cache_result('rows', ROWS, ['covid.articles'])
+    rows = cacheLib.get_cached_result('rows')
+    next(rows)
+    cache.delete(cacheLib.chunk_key('rows', 2))
+    with pytest.raises(LookupError):
+        list(rows)
+
+
+def test_cached_query_falls_back_to_the_database(cache, monkeypatch):
+    queries = []
+
+    def fetch(*args):
+        queries.append(args)
+        return list(ROWS)
+
+    monkeypatch.setattr(cacheLib, 'mysql_fetch_data', fetch)
+    sql, params = cacheLib.build_query('delta')
+    args = (sql, 'localhost', 'admin', 'secret', 'covid', params)
+    assert cacheLib.query_mysql_and_cache(*args)['records_in_cache'] is False
+
+    res = cacheLib.query_mysql_and_cache(*args)
+    assert res['records_in_cache'] is True
+    rows = res['data']
+    assert next(rows) == ROWS[0]
+    cache.delete(cacheLib.chunk_key(cacheLib.query_key(sql, params), 2))
+    assert [ROWS[0]] + list(rows) == ROWS
+    assert len(queries) == 2
+
+
+def test_search_terms_are_normalized(cache):
+    sql, params = cacheLib.build_query('  +covid   -delta vacc* covid-19 ')
+    assert params == ('+covid -delta vacc* "covid 19"', 0, 100)
+    assert 'AGAINST (%s IN BOOLEAN MODE)' in sql
+
+
+@pytest.mark.parametrize('term', ['foo +', '+', '"open', '*foo', '++foo', 'a (b c)'])
+def test_malformed_search_terms_are_rejected(cache, term):
+    with pytest.raises(ValueError):
+        cacheLib.build_query(term)
+
+
+def test_query_errors_are_raised_not_exited(cache, connection):
+    connection.error = pymysql.err.ProgrammingError(1064, 'syntax error')
+    sql, params = cacheLib.build_query()
+    with pytest.raises(pymysql.err.ProgrammingError):
+        cacheLib.query_mysql_and_cache(sql, 'localhost', 'admin', 'secret', 'covid', params)
+    assert connection.closed
+
+
+class FakeServer:
+    '''
+    MySQL server keeping the tables and indexes the load statements create, crash_on names a
+    statement prefix that fails once after taking effect, as if the process died right after it
+    '''
+    def __init__(self, crash_on=None):
+        self.tables = {'covid.articles'}
+        self.indexes = set()
+        self.crash_on = crash_on
+
+    def execute(self, sql, *args):
+        words = sql.rstrip(';').split()
+        if sql.startswith('DROP TABLE IF EXISTS'):
+            self.tables.discard(words[-1])
+        elif sql.startswith('CREATE TABLE'):
+            self.tables.add(words[2])
+        elif sql.startswith('ALTER TABLE'):
+            assert (words[2], 'articles_search') not in self.indexes, 'index added twice'
+            self.indexes.add((words[2], 'articles_search'))
+        elif sql.startswith('RENAME TABLE'):
+            renames = [pair.split(' TO ') for pair in sql[len('RENAME TABLE '):].rstrip(';').split(', ')]
+            for src, dst in renames:
+                assert src in self.tables and dst not in self.tables, sql
+                self.tables.remove(src)
+                self.tables.add(dst)
+                self.indexes = {(dst if table == src else table, name) for table, name in self.indexes}
+        if self.crash_on and sql.startswith(self.crash_on):
+            self.crash_on = None
+            raise KeyboardInterrupt
+
+
+@pytest.fixture
+def server(cache, monkeypatch, tmp_path):
+    dataset = tmp_path / 'articles.csv'
+    dataset.write_text('OBJECTID,Title\n1,a\n2,b\n')
+    configs = dict(cacheLib.context.configs, dataset_file=str(dataset), ingest_checkpoint_file=str(tmp_path / 'checkpoint.json'))
+    server = FakeServer()
+
+    def load_chunks(configs, checkpoint, checkpoint_file):
+        checkpoint['done'] = list(range(len(checkpoint['chunks'])))
+        return 0
+
+    monkeypatch.setattr(cacheLib, 'mysql_execute_command', server.execute)
+    monkeypatch.setattr(cacheLib, 'table_exists', lambda configs, table: table in server.tables)
+    monkeypatch.setattr(cacheLib, 'index_exists', lambda configs, table, index: (table, index) in server.indexes)
+    monkeypatch.setattr(cacheLib, 'load_chunks', load_chunks)
+    server.configs = configs
+    return server
+
+
+@pytest.mark.parametrize('crash_on', ['ALTER TABLE', 'RENAME TABLE', 'DROP TABLE IF EXISTS covid.articles_old'])
+def test_interrupted_load_resumes_to_the_same_end_state(server, crash_on):
+    server.crash_on = crash_on
+    with pytest.raises(KeyboardInterrupt):
+        cacheLib.initialize_database(server.configs)
+
+    cacheLib.initialize_database(server.configs)
+    assert server.tables == {'covid.articles'}
+    assert server.indexes == {('covid.articles', 'articles_search')}
+    assert not os.path.exists(server.configs['ingest_checkpoint_file'])
+
+
+def test_old_table_left_by_an_earlier_swap_is_dropped(server):
+    server.tables.add('covid.articles_old')
+    cacheLib.initialize_database(server.configs)
+    assert server.tables == {'covid.articles'}
+
+
+def test_streamed_result_invalidated_mid_stream_is_not_cached(cache):
+    rows = cacheLib.stream_and_cache('rows', iter(ROWS), ['covid.articles'])
+    assert [next(rows) for _ in range(4)] == ROWS[:4]
+    assert cache.exists(cacheLib.chunk_key('rows', 0))
+    cacheLib.invalidate_tables(['covid.articles'])
+    assert list(rows) == ROWS[4:]
+    assert not cache.exists('rows')
+    assert not cache.keys('rows:chunk:*')
+
+
+def test_small_streamed_result_invalidated_mid_stream_is_not_cached(cache):
+    rows = cacheLib.stream_and_cache('rows', iter(ROWS[:1]), ['covid.articles'])
+    next(rows)
+    cacheLib.invalidate_tables(['covid.articles'])
+    assert list(rows) == []
+    assert not cache.exists('rows')
+
+
+def test_result_read_before_an_invalidation_is_not_cached(cache):
+    versions = cacheLib.table_versions(['covid.articles'])
+    cacheLib.invalidate_tables(['covid.articles'])
+    assert not cacheLib.cache_result('rows', ROWS, ['covid.articles'], versions)
+    assert not cache.keys('rows*')
+
+    versions = cacheLib.table_versions(['covid.articles'])
+    assert cacheLib.cache_result('rows', ROWS, ['covid.articles'], versions)
+    assert list(cacheLib.get_cached_result('rows')) == ROWS
@@ -0,0 +1,22 @@
+import pymysql
+
+import webApp
+
+
+def test_malformed_search_term_is_a_bad_request(cache, connection):
+    client = webApp.app.test_client()
+    response = client.get('/query_cache', query_string={'term': 'foo +'})
+    assert response.status_code == 400
+    assert not connection.executed
+
+
+def test_database_error_answers_500_and_the_app_keeps_serving(cache, connection):
+    client = webApp.app.test_client()
+    connection.error = pymysql.err.OperationalError(2003, "Can't connect to MySQL server")
+    assert client.get('/query_mysql', query_string={'stream': '0'}).status_code == 500
+
+    connection.error = None
+    connection.rows = [{'OBJECTID': 1, 'Sentence': 'delta', 'Title': 'delta', 'Source': 'x'}]
+    response = client.get('/query_cache', query_string={'term': 'delta', 'stream': '0'})
+    assert response.status_code == 200
+    assert b'delta' in response.data
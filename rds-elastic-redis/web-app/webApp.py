@@ -2,41 +2,130 @@
 # -*- coding: utf-8 -*-
 
 import json
+import functools
 from datetime import datetime
-from flask import Flask, render_template
+import pymysql
+from flask import Flask, render_template, stream_template, request, make_response, g, abort
 
 from cacheLib import *
+from common import tracing
 
 app = Flask(__name__)
+tracing.init_app(app)
 
 
 ###############################  Flask Routes #################################
 
+def streaming():
+    '''
+    Streaming renders rows as they are read, ?stream=0 or 1 overrides the stream_results config.
+    '''
+    default = '1' if context.configs.get('stream_results') else '0'
+    return request.args.get('stream', default) == '1'
+
+def page_query():
+    '''
+    The page of the request: ?term= searches Sentence and Title, ?after= is the OBJECTID cursor
+    of the previous page and ?size= the page size, capped at max_rows.
+    '''
+    term = request.args.get('term', context.search_term)
+    after = request.args.get('after', 0, type=int)
+    size = request.args.get('size', context.page_size, type=int)
+    try:
+        sql, params = build_query(term, after, size)
+    except ValueError as e:
+        abort(400, description=str(e))
+    # The page size is the last parameter, after capping
+    return sql, params, {'term': term, 'page_size': params[-1]}
+
+def database_error(e):
+    '''
+    A failed query answers 500, the worker keeps serving other requests.
+    '''
+    return 'The database query failed, see the application log.', 500
+
+app.register_error_handler(pymysql.MySQLError, database_error)
+
+def page_cached(view):
+    '''
+    Pages rendered from cached records are kept in Redis with a content hash ETag, repeat views
+    are served without querying or rendering and get a 304 when the client holds the page.
+    Views set g.page_tables and g.page_ttl to make their page cacheable.
+    '''
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = page_key(request.path, request.args.items(multi=True))
+        etag, body = get_cached_page(key, request.if_none_match)
+        if etag and body is None:
+            response = app.response_class(status=304)
+        elif body is not None:
+            response = app.response_class(body, mimetype='text/html')
+        else:
+            response = make_response(view(*args, **kwargs))
+            if 'page_tables' not in g or response.is_streamed:
+                return response
+            etag = cache_page(key, response.get_data(), g.page_tables, g.page_ttl)
+        response.set_etag(etag)
+        return response.make_conditional(request)
+    return wrapper
+
 @app.route("/")
 def index():
-    return render_template('index.html', rows=max_rows, sql=sql)
+    sql, params, page = page_query()
+    return render_template('index.html', rows=page['page_size'], sql=sql, params=params)
 
 @app.route("/query_mysql")
 def query_mysql_endpoint():
+    configs = context.configs
+    sql, params, page = page_query()
     start_time = datetime.now()
-    data = query_mysql(sql,configs['db_host'], configs['db_username'], configs['db_password'], configs['db_name'])
+    if streaming():
+        # Execution time is the time to the first row, the rest streams with the page
+        data = peek_rows(mysql_stream_data(sql,configs['db_host'], configs['db_username'], configs['db_password'], configs['db_name'], params))
+        delta = (datetime.now() - start_time).total_seconds()
+        return app.response_class(stream_template('query_mysql.html', delta=delta, data=data, sql=sql, params=params,
+                                fields=db_tbl_fields, **page))
+
+    data = query_mysql(sql,configs['db_host'], configs['db_username'], configs['db_password'], configs['db_name'], params)
     delta = (datetime.now() - start_time).total_seconds()
-    return render_template('query_mysql.html', delta=delta, data=data, sql=sql, fields=db_tbl_fields)
+    return render_template('query_mysql.html', delta=delta, data=data, sql=sql, params=params, fields=db_tbl_fields, **page)
 
 @app.route("/query_cache")
+@page_cached
 def query_cache_endpoint():
     data = None 
+    configs = context.configs
+    sql, params, page = page_query()
     start_time = datetime.now()
-    result = query_mysql_and_cache(sql,configs['db_host'], configs['db_username'], configs['db_password'], configs['db_name'])
+    stream = streaming()
+    if stream:
+        result = stream_mysql_and_cache(sql,configs['db_host'], configs['db_username'], configs['db_password'], configs['db_name'], params)
+    else:
+        result = query_mysql_and_cache(sql,configs['db_host'], configs['db_username'], configs['db_password'], configs['db_name'], params)
     delta = (datetime.now() - start_time).total_seconds()    
+    if result is None:
+        # Past the last page, or nothing matched the search
+        result = {'records_in_cache': False, 'data': None}
 
-    if isinstance(result['data'], list):
-        data = result['data']
-    else:
-        data = json.loads(result['data'])
+    if stream and not result['records_in_cache']:
+        # On a miss the result is cached once the last row went out, its TTL starts then
+        return app.response_class(stream_template('query_cache.html', delta=delta, data=result['data'],
+                                records_in_cache=False, TTL=configs['ttl'], sql=sql, params=params, fields=db_tbl_fields, **page))
+
+    # Small results come back as JSON, chunked results as a lazy row iterator
+    data = result['data']
+    if isinstance(data, bytes):
+        with span('deserialize'):
+            data = json.loads(data)
+
+    ttl = context.cache.ttl(query_key(sql, params))
+    # A page rendered from cached records is cached along with them
+    if result['records_in_cache']:
+        g.page_tables = extract_tables(sql, configs['db_name'])
+        g.page_ttl = ttl
 
     return render_template('query_cache.html', delta=delta, data=data, records_in_cache=result['records_in_cache'], 
-                                TTL=Cache.ttl(sql), sql=sql, fields=db_tbl_fields)
+                                TTL=ttl, sql=sql, params=params, fields=db_tbl_fields, **page)
 
 @app.route("/delete_cache")
 def delete_cache_endpoint():
@@ -44,5 +133,5 @@ def delete_cache_endpoint():
     return render_template('delete_cache.html')    
 
 if __name__ == "__main__":
-    app.run(debug=False, use_reloader=False, host='0.0.0.0', port=app_port)
+    app.run(debug=False, use_reloader=False, host='0.0.0.0', port=context.configs['app_port'])
     
\ No newline at end of file
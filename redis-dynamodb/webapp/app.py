@@ -2,10 +2,14 @@
 # Setup flask 
 
 from flask import Flask
-from flask import Flask, render_template
+from flask import Flask, render_template, jsonify, request, abort
 from redis_client import *
+from common import tracing
+from common.page_cache import page_cached
 
 app = Flask(__name__)
+tracing.init_app(app)
+
 
 @app.route("/")
 def index():
@@ -17,10 +21,21 @@ def query_dax():
     return render_template('query_ddb.html', restaurants=restaurants)
 
 @app.route("/query-cache")
+@page_cached
 def query_ddb():
     restaurants = fetch_multiple_restaurants(mode='cache', limit=100)
     return render_template('query_cache.html', restaurants=restaurants)
 
+@app.route("/reviews", methods=["POST"])
+def post_review():
+    body = request.get_json(silent=True) or {}
+    try:
+        item = new_review(body.get("restaurant"), body.get("username"), body.get("rating"), body.get("review", ""))
+    except (TypeError, ValueError) as e:
+        abort(400, description=str(e))
+    restaurant_cache.put_review(item)
+    return jsonify({"id": item["id"], "write_mode": restaurant_cache.write_mode}), 201
+
 
 if __name__=="__main__":
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
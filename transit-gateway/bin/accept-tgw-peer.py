@@ -1,20 +1,82 @@
-import boto3
-
-client = boto3.client('ec2', region_name='us-east-1')
-
-query = client.describe_transit_gateway_peering_attachments(
-    Filters=[
-        {
-            'Name': 'state',
-            'Values': [
-                'pendingAcceptance',
-            ]
-        }
-    ]
-)
-
-attachment_id=(query['TransitGatewayPeeringAttachments'][0]['TransitGatewayAttachmentId'])
-
-response = client.accept_transit_gateway_peering_attachment(
-    TransitGatewayAttachmentId=(attachment_id),
-)
\ No newline at end of file
+"""
+accept every peering attachment pending acceptance in the accepter regions,
+concurrently, and wait until they are available, attachments that fail to be
+accepted are reported at the end
+python accept-tgw-peer.py us-west-1
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tgw_discovery import get_client, describe_all, MAX_WORKERS
+
+# accepter regions of the peering demo, create-tgw-peer.py requests from us-east-1 
+REGIONS = ['us-west-1']
+# seconds to wait for accepted attachments to become available 
+TIMEOUT = 600
+# seconds between attachment state polls 
+POLL_INTERVAL = 10
+
+
+def pending_peerings(region_name: str):
+  """
+  peering attachments pending acceptance whose accepter is in the region, the
+  requester region lists the same attachment as pending but cannot accept it 
+  """
+  paginator = get_client(region_name).get_paginator('describe_transit_gateway_peering_attachments')
+  pages = paginator.paginate(Filters=[{'Name': 'state', 'Values': ['pendingAcceptance']}])
+  return [
+    dict(attachment, Region=region_name)
+    for page in pages
+    for attachment in page['TransitGatewayPeeringAttachments']
+    if attachment['AccepterTgwInfo']['Region'] == region_name
+  ]
+
+
+def accept(attachment):
+  """
+  accept one peering attachment in its region, returns the error instead of raising
+  so one failure does not stop the others 
+  """
+  try:
+    get_client(attachment['Region']).accept_transit_gateway_peering_attachment(
+      TransitGatewayAttachmentId=attachment['TransitGatewayAttachmentId'],
+    )
+  except Exception as e:
+    return e
+  return None
+
+
+def wait_available(attachments, timeout=TIMEOUT):
+  """
+  poll until every attachment is available, returns the ids still pending 
+  """
+  pending = {attachment['TransitGatewayAttachmentId']: attachment['Region'] for attachment in attachments}
+  deadline = time.monotonic() + timeout
+  while pending and time.monotonic() < deadline:
+    time.sleep(POLL_INTERVAL)
+    for region_name in set(pending.values()):
+      ids = [attachment_id for attachment_id, region in pending.items() if region == region_name]
+      for attachment in describe_all(region_name, 'attachments', [{'Name': 'transit-gateway-attachment-id', 'Values': ids}]):
+        if attachment['State'] == 'available':
+          pending.pop(attachment['TransitGatewayAttachmentId'])
+  return sorted(pending)
+
+
+if __name__ == '__main__':
+  regions = sys.argv[1:] or REGIONS
+  with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(regions)))) as executor:
+    attachments = [attachment for found in executor.map(pending_peerings, regions) for attachment in found]
+  accepted, failed = [], []
+  with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(attachments)))) as executor:
+    for attachment, error in zip(attachments, executor.map(accept, attachments)):
+      if error is None:
+        print(f'accepted {attachment["TransitGatewayAttachmentId"]} in {attachment["Region"]}')
+        accepted.append(attachment)
+      else:
+        print(f'failed {attachment["TransitGatewayAttachmentId"]} in {attachment["Region"]}: {error}')
+        failed.append(attachment)
+  pending = wait_available(accepted)
+  print(f'{len(accepted) - len(pending)} of {len(attachments)} attachments available, {len(failed)} failed')
+  if failed or pending:
+    sys.exit(1)
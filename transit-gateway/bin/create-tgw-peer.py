@@ -5,39 +5,34 @@ create peering tgw attachment
 aws ec2 describe-transit-gateway-peering-attachments --region us-east-1
 """
 
-import boto3
+from tgw_discovery import discover, get_client
 
-def get_tgw_id_from_region(region_name: str) -> str:
+# requester and accepter regions 
+REGION = 'us-east-1'
+PEER_REGION = 'us-west-1'
+
+
+def get_tgw_id_from_region(topology, region_name: str) -> str:
   """
   get tgw id given region 
   """
-  client = boto3.client('ec2', region_name=region_name)
-  query = client.describe_transit_gateways(
-    Filters = [
-        {
-            'Name': 'state',
-            'Values': [
-                'available',
-            ]
-        }
-    ]
-  )
-  tgw_id = (query['TransitGateways'][0]['TransitGatewayId'])
-  account_id=(query['TransitGateways'][0]['OwnerId'])
-  return tgw_id,account_id
+  tgw = topology.first('gateways', region_name, 'available')
+  return tgw['TransitGatewayId'], tgw['OwnerId']
 
 
-# print tgw id
-tgw_us_east_1,account_id =  get_tgw_id_from_region(region_name='us-east-1')
-tgw_us_west_1,account_id =  get_tgw_id_from_region(region_name='us-west-1')
-print(f'tgw-us-east-1: {tgw_us_east_1}')
-print(f'tgw-us-west-1: {tgw_us_west_1}')
+if __name__ == '__main__':
+  # both regions are described concurrently 
+  topology = discover([REGION, PEER_REGION], kinds=['gateways'])
+  # print tgw id
+  tgw_us_east_1,account_id = get_tgw_id_from_region(topology, REGION)
+  tgw_us_west_1,account_id = get_tgw_id_from_region(topology, PEER_REGION)
+  print(f'tgw-{REGION}: {tgw_us_east_1}')
+  print(f'tgw-{PEER_REGION}: {tgw_us_west_1}')
 
-# create tgw peering attachment 
-client = boto3.client('ec2', region_name='us-east-1') 
-response = client.create_transit_gateway_peering_attachment(
-    TransitGatewayId=(tgw_us_east_1),
-    PeerTransitGatewayId=(tgw_us_west_1),
-    PeerAccountId=(account_id),
-    PeerRegion='us-west-1'
-)
\ No newline at end of file
+  # create tgw peering attachment 
+  response = get_client(REGION).create_transit_gateway_peering_attachment(
+      TransitGatewayId=(tgw_us_east_1),
+      PeerTransitGatewayId=(tgw_us_west_1),
+      PeerAccountId=(account_id),
+      PeerRegion=PEER_REGION
+  )
@@ -5,50 +5,32 @@ double check tgw-route-table-id and tgw-attachment-id
 because query here check inex 0 only 
 """
 
-import boto3
+from tgw_discovery import discover, get_client
 
-def get_tgw_attachments(region_name: str):
+
+def get_tgw_attachments(topology, region_name: str):
   """
+  route table and id of the first available peering attachment in a region 
   """
-  client = boto3.client('ec2', region_name='us-east-1')
-  query = client.describe_transit_gateway_attachments(
-      Filters=[
-          {
-              'Name': 'resource-type',
-              'Values': [
-                  'peering',
-              ]
-          },
-          {
-              'Name': 'state',
-              'Values': [
-                  'available',
-              ]
-          }
-      ]
-  )
-  #
-  print(query)
+  attachment = topology.first('attachments', region_name, 'available', ResourceType='peering')
   # parse response 
-  tgw_rt_id=(query['TransitGatewayAttachments'][0]['Association']['TransitGatewayRouteTableId'])
-  tgw_attachment_id=(query['TransitGatewayAttachments'][0]['TransitGatewayAttachmentId'])
+  tgw_rt_id=(attachment['Association']['TransitGatewayRouteTableId'])
+  tgw_attachment_id=(attachment['TransitGatewayAttachmentId'])
   # return 
   return tgw_rt_id, tgw_attachment_id
 
 
 
-def create_tgw_route(region_name: str, dest_cidr: str):
+def create_tgw_route(topology, region_name: str, dest_cidr: str):
   """
-  create transit gateway route us-east-1
+  create transit gateway route in a region 
   """
-  # client 
-  client = boto3.client('ec2', region_name=region_name)
   # get tgw-route-table-id and tgw-attachment-id
-  tgw_rt_id, tgw_attachment_id = get_tgw_attachments(region_name)
+  tgw_rt_id, tgw_attachment_id = get_tgw_attachments(topology, region_name)
   print(f'tgw-rt-id-{region_name}: {tgw_rt_id}')
   print(f'tgw-attachment-id: {tgw_attachment_id}')
   # create tgw-route
-  response = client.create_transit_gateway_route(
+  response = get_client(region_name).create_transit_gateway_route(
       DestinationCidrBlock=dest_cidr,
       TransitGatewayRouteTableId=(tgw_rt_id),
       TransitGatewayAttachmentId=(tgw_attachment_id)
@@ -57,5 +39,6 @@ def create_tgw_route(region_name: str, dest_cidr: str):
   print(response)
 
 # create tgw routes 
-# create_tgw_route(region_name='us-east-1', dest_cidr='172.16.1.0/24')
-# create_tgw_route(region_name='us-west-1', dest_cidr='172.16.0.0/24')
+# topology = discover(['us-east-1', 'us-west-1'], kinds=['attachments'])
+# create_tgw_route(topology, region_name='us-east-1', dest_cidr='172.16.1.0/24')
+# create_tgw_route(topology, region_name='us-west-1', dest_cidr='172.16.0.0/24')
@@ -0,0 +1,106 @@
+import time
+import ipaddress
+
+import pytest
+
+import tgw_discovery
+import tgw_route_sync
+from tgw_discovery import Topology
+from tgw_route_sync import RateLimiter, diff, load_desired, search_routes
+
+
+class RouteTableClient:
+  """
+  ec2 client serving search_transit_gateway_routes from a list of static routes
+  """
+  def __init__(self, cidrs):
+    self.routes = [
+      {"DestinationCidrBlock": cidr, "State": "active", "Type": "static",
+       "TransitGatewayAttachments": [{"TransitGatewayAttachmentId": "tgw-attach-1"}]}
+      for cidr in cidrs
+    ]
+    self.calls = 0
+
+  def search_transit_gateway_routes(self, TransitGatewayRouteTableId, Filters, MaxResults=1000):
+    self.calls += 1
+    routes = self.routes
+    for name, values in ((f["Name"], f["Values"]) for f in Filters):
+      net = ipaddress.ip_network(values[0]) if name.startswith("route-search") else None
+      if name == "route-search.subnet-of-match":
+        routes = [r for r in routes if net.version == ipaddress.ip_network(r["DestinationCidrBlock"]).version
+                  and ipaddress.ip_network(r["DestinationCidrBlock"]).subnet_of(net)]
+      elif name == "route-search.exact-match":
+        routes = [r for r in routes if ipaddress.ip_network(r["DestinationCidrBlock"]) == net]
+    return {"Routes": routes[:MaxResults], "AdditionalRoutesAvailable": len(routes) > MaxResults}
+
+
+def topology():
+  topology = Topology()
+  topology.add("us-east-1", "attachments", [
+    {"TransitGatewayAttachmentId": "tgw-attach-vpc", "State": "available", "ResourceType": "vpc",
+     "Association": {"TransitGatewayRouteTableId": "tgw-rtb-east"}},
+    {"TransitGatewayAttachmentId": "tgw-attach-peer", "State": "available", "ResourceType": "peering"},
+  ])
+  topology.add("us-west-1", "attachments", [
+    {"TransitGatewayAttachmentId": "tgw-attach-west", "State": "available", "ResourceType": "vpc",
+     "Association": {"TransitGatewayRouteTableId": "tgw-rtb-west"}},
+  ])
+  return topology
+
+
+def test_rate_limiter_allows_a_burst_then_the_rate():
+  limiter = RateLimiter(20, burst=10)
+  start = time.monotonic()
+  for _ in range(10):
+    limiter.acquire()
+  assert time.monotonic() - start < 0.1
+  for _ in range(10):
+    limiter.acquire()
+  # the next 10 tokens refill at 20/s
+  assert 0.4 <= time.monotonic() - start < 2.0
+
+
+def test_diff_creates_replaces_and_prunes():
+  desired = {("us-east-1", "tgw-rtb-east"): {"10.0.0.0/24": "a", "10.0.1.0/24": "b", "10.0.2.0/24": "c"}}
+  current = {("us-east-1", "tgw-rtb-east"): {"10.0.1.0/24": "b", "10.0.2.0/24": "x", "10.0.9.0/24": "y"}}
+  assert diff(desired, current) == [
+    ("create", "us-east-1", "tgw-rtb-east", "10.0.0.0/24", "a"),
+    ("replace", "us-east-1", "tgw-rtb-east", "10.0.2.0/24", "c"),
+  ]
+  assert diff(desired, current, prune=True)[-1] == ("delete", "us-east-1", "tgw-rtb-east", "10.0.9.0/24", "y")
+  assert diff(desired, desired, prune=True) == []
+
+
+def test_load_desired_normalizes_cidrs():
+  spec = {"us-east-1": {"FD00:0::/64": "tgw-attach-vpc"}, "us-west-1": {"172.16.0.0/24": "tgw-attach-west"}}
+  assert load_desired(spec, topology()) == {
+    ("us-east-1", "tgw-rtb-east"): {"fd00::/64": "tgw-attach-vpc"},
+    ("us-west-1", "tgw-rtb-west"): {"172.16.0.0/24": "tgw-attach-west"},
+  }
+
+
+@pytest.mark.parametrize("spec", [
+  {"us-east-1": {"10.0.0.0/24": "tgw-attach-unknown"}},
+  {"us-east-1": {"10.0.0.0/24": "tgw-attach-west"}},
+  {"us-east-1": {"10.0.0.0/24": "peering"}},
+  {"us-west-1": {"10.0.0.0/24": "peering"}},
+])
+def test_load_desired_names_the_route_it_cannot_resolve(spec):
+  with pytest.raises(LookupError, match="10.0.0.0/24") as e:
+    load_desired(spec, topology())
+  assert list(spec)[0] in str(e.value)
+
+
+def test_load_desired_takes_an_explicit_route_table():
+  spec = {"us-east-1": {"10.0.0.0/24": {"attachment": "peering", "route_table": "tgw-rtb-east"}}}
+  assert load_desired(spec, topology()) == {("us-east-1", "tgw-rtb-east"): {"10.0.0.0/24": "tgw-attach-peer"}}
+
+
+def test_capped_search_is_split_until_complete(monkeypatch):
+  cidrs = [f"10.{i}.0.0/16" for i in range(40)] + ["0.0.0.0/0", "10.0.0.0/8", "fd00::/64"]
+  client = RouteTableClient(cidrs)
+  monkeypatch.setitem(tgw_discovery.clients, "us-east-1", client)
+  monkeypatch.setattr(tgw_route_sync, "SEARCH_PAGE", 4)
+  routes = [route["DestinationCidrBlock"] for route in search_routes("us-east-1", "tgw-rtb-east")]
+  assert sorted(routes) == sorted(cidrs)
+  assert client.calls > 1
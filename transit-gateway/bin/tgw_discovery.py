@@ -0,0 +1,117 @@
+"""
+Transit gateway discovery across regions
+all regions and resource kinds are described concurrently with one shared ec2
+client per region and paginators, results go into an in-memory index keyed by
+region and state
+
+python tgw_discovery.py us-east-1 us-west-1
+"""
+
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from botocore.config import Config
+
+# regions of the peering demo
+REGIONS = ['us-east-1', 'us-west-1']
+# concurrent describe calls across all regions
+MAX_WORKERS = 16
+# kind -> (paginated operation, result key, id field)
+KINDS = {
+  'gateways': ('describe_transit_gateways', 'TransitGateways', 'TransitGatewayId'),
+  'attachments': ('describe_transit_gateway_attachments', 'TransitGatewayAttachments', 'TransitGatewayAttachmentId'),
+  'route_tables': ('describe_transit_gateway_route_tables', 'TransitGatewayRouteTables', 'TransitGatewayRouteTableId'),
+}
+# adaptive retries absorb throttling when many regions are described at once
+CLIENT_CONFIG = Config(retries={'mode': 'adaptive', 'max_attempts': 10}, max_pool_connections=MAX_WORKERS)
+# boto3 sessions are not thread safe, clients are
+session = boto3.session.Session()
+clients = {}
+clients_lock = threading.Lock()
+
+
+def get_client(region_name: str):
+  """
+  shared ec2 client of a region, created on first use
+  """
+  with clients_lock:
+    if region_name not in clients:
+      clients[region_name] = session.client('ec2', region_name=region_name, config=CLIENT_CONFIG)
+    return clients[region_name]
+
+
+def describe_all(region_name: str, kind: str, filters=None):
+  """
+  every page of a describe call in a region
+  """
+  operation, key, _ = KINDS[kind]
+  paginator = get_client(region_name).get_paginator(operation)
+  items = []
+  for page in paginator.paginate(Filters=filters or []):
+    items.extend(page[key])
+  return items
+
+
+class Topology:
+  """
+  gateways, attachments and route tables indexed by kind, region and state, and by id
+  """
+  def __init__(self):
+    self.index = {kind: {} for kind in KINDS}
+    self.by_id = {}
+
+  def add(self, region_name: str, kind: str, items):
+    _, _, id_field = KINDS[kind]
+    for item in items:
+      item['Region'] = region_name
+      self.index[kind].setdefault((region_name, item['State']), []).append(item)
+      self.by_id[item[id_field]] = item
+
+  def find(self, kind: str, region_name=None, state=None, **match):
+    """
+    items of a kind, optionally in one region and state and with matching top level fields
+    """
+    return [
+      item
+      for (region, item_state), items in self.index[kind].items()
+      if (region_name is None or region == region_name) and (state is None or item_state == state)
+      for item in items
+      if all(item.get(name) == value for name, value in match.items())
+    ]
+
+  def first(self, kind: str, region_name=None, state=None, **match):
+    """
+    first matching item, raises LookupError when there is none
+    """
+    items = self.find(kind, region_name, state, **match)
+    if not items:
+      raise LookupError(f'no {state or ""} {kind} in {region_name or "any region"} matching {match}')
+    return items[0]
+
+  def get(self, resource_id: str):
+    return self.by_id[resource_id]
+
+  def regions(self):
+    return sorted({region for kinds in self.index.values() for region, _ in kinds})
+
+
+def discover(regions=REGIONS, kinds=tuple(KINDS), filters=None) -> Topology:
+  """
+  describe every kind in every region concurrently and index the results
+  """
+  topology = Topology()
+  jobs = [(region_name, kind) for region_name in regions for kind in kinds]
+  with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(jobs)))) as executor:
+    results = executor.map(lambda job: describe_all(*job, filters=filters), jobs)
+    # results come back in job order, the index is built on this thread only
+    for (region_name, kind), items in zip(jobs, results):
+      topology.add(region_name, kind, items)
+  return topology
+
+
+if __name__ == '__main__':
+  topology = discover(sys.argv[1:] or REGIONS)
+  for kind in KINDS:
+    for (region_name, state), items in sorted(topology.index[kind].items()):
+      print(f'{region_name} {kind} {state}: {len(items)}')
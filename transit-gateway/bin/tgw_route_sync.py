@@ -0,0 +1,265 @@
+"""
+Declarative transit gateway route sync
+reads the desired CIDR -> attachment routes of each region, searches the current
+static routes of every affected route table in parallel, and applies the minimal
+set of creates, replaces and deletes concurrently under a per region rate limit
+
+python tgw_route_sync.py routes.json --dry-run
+python tgw_route_sync.py routes.json --prune
+
+routes.json maps region -> CIDR -> attachment id, or "peering" for the available
+peering attachment of the region, routes go into the route table associated
+with the attachment unless given as {"attachment": ..., "route_table": ...}
+"""
+
+import sys
+import json
+import time
+import argparse
+import ipaddress
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tgw_discovery import discover, get_client, MAX_WORKERS
+
+# mutating ec2 calls per second per region and the burst allowed on top, the ec2
+# token bucket for mutating actions refills 5 per second up to 50, raise --rate
+# only for an account whose limits were raised, 5000 routes take about 17 minutes
+RATE = 5.0
+BURST = 50
+# max routes returned by one search call
+SEARCH_PAGE = 1000
+# seconds to wait for applied routes to settle
+TIMEOUT = 60
+# seconds between route state polls
+POLL_INTERVAL = 1.0
+
+
+class RateLimiter:
+  """
+  token bucket holding up to burst tokens, calls beyond them wait for a token
+  refilled at rate per second
+  """
+  def __init__(self, rate, burst=None):
+    self.rate = rate
+    self.burst = burst or rate
+    self.tokens = self.burst
+    self.last = time.monotonic()
+    self.lock = threading.Lock()
+
+  def acquire(self):
+    while True:
+      with self.lock:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens >= 1:
+          self.tokens -= 1
+          return
+        wait = (1 - self.tokens) / self.rate
+      time.sleep(wait)
+
+
+def load_desired(spec, topology):
+  """
+  desired routes of a routes file as {(region, route table id): {cidr: attachment id}},
+  raises LookupError naming the route when its attachment or route table is not found
+  """
+  desired = {}
+  for region_name, routes in spec.items():
+    for cidr, target in routes.items():
+      if isinstance(target, str):
+        target = {"attachment": target}
+      attachment = find_attachment(topology, region_name, target["attachment"])
+      if attachment is None:
+        raise LookupError(f"{region_name} {cidr}: no available attachment {target['attachment']} in {region_name}")
+      route_table = target.get("route_table") or (attachment.get("Association") or {}).get("TransitGatewayRouteTableId")
+      if route_table is None:
+        raise LookupError(f"{region_name} {cidr}: attachment {attachment['TransitGatewayAttachmentId']} "
+                          f"is not associated with a route table, give route_table")
+      # normalized so FD00:0::/64 and fd00::/64 compare equal
+      cidr = str(ipaddress.ip_network(cidr))
+      desired.setdefault((region_name, route_table), {})[cidr] = attachment["TransitGatewayAttachmentId"]
+  return desired
+
+
+def find_attachment(topology, region_name: str, attachment_id: str):
+  """
+  available attachment of a region by id, or the peering attachment for "peering",
+  None when the region has no such attachment
+  """
+  if attachment_id == "peering":
+    found = topology.find("attachments", region_name, "available", ResourceType="peering")
+  else:
+    found = topology.find("attachments", region_name, "available", TransitGatewayAttachmentId=attachment_id)
+  return found[0] if found else None
+
+def search_routes(region_name: str, route_table: str, prefix=None):
+  """
+  static routes of a route table, a search capped at SEARCH_PAGE results is split
+  into the two halves of its address range until every part is complete
+  """
+  client = get_client(region_name)
+  filters = [{"Name": "type", "Values": ["static"]}]
+  if prefix:
+    filters.append({"Name": "route-search.subnet-of-match", "Values": [prefix]})
+  res = client.search_transit_gateway_routes(
+    TransitGatewayRouteTableId=route_table, Filters=filters, MaxResults=SEARCH_PAGE
+  )
+  if not res.get("AdditionalRoutesAvailable"):
+    return res["Routes"]
+  nets = [ipaddress.ip_network(prefix)] if prefix else [ipaddress.ip_network("0.0.0.0/0"), ipaddress.ip_network("::/0")]
+  routes = []
+  for net in nets:
+    # a route on the split prefix itself is in neither half
+    routes += client.search_transit_gateway_routes(
+      TransitGatewayRouteTableId=route_table,
+      Filters=[{"Name": "type", "Values": ["static"]}, {"Name": "route-search.exact-match", "Values": [str(net)]}],
+    )["Routes"]
+    for half in net.subnets():
+      routes += search_routes(region_name, route_table, str(half))
+  return routes
+
+
+def route_states(region_name: str, route_table: str):
+  """
+  {cidr: (state, attachment id)} of the static routes of a route table, blackholes have no attachment
+  """
+  return {
+    route["DestinationCidrBlock"]: (
+      route["State"],
+      (route.get("TransitGatewayAttachments") or [{}])[0].get("TransitGatewayAttachmentId"),
+    )
+    for route in search_routes(region_name, route_table)
+  }
+
+
+def fetch_route_states(route_table_keys):
+  """
+  route states of many (region, route table id) keys, searched in parallel
+  """
+  keys = sorted(route_table_keys)
+  with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(keys)))) as executor:
+    return dict(zip(keys, executor.map(lambda key: route_states(*key), keys)))
+
+
+def current_routes(route_table_keys):
+  """
+  {(region, route table id): {cidr: attachment id}} of the routes not being deleted
+  """
+  return {
+    key: {cidr: attachment for cidr, (state, attachment) in states.items() if state not in ("deleting", "deleted")}
+    for key, states in fetch_route_states(route_table_keys).items()
+  }
+
+
+def diff(desired, current, prune=False):
+  """
+  minimal changes as (action, region, route table, cidr, attachment) tuples, routes
+  pointing elsewhere are replaced in place, extra static routes are deleted only with prune
+  """
+  changes = []
+  for (region_name, route_table), routes in sorted(desired.items()):
+    existing = current.get((region_name, route_table), {})
+    for cidr, attachment in sorted(routes.items()):
+      if cidr not in existing:
+        changes.append(("create", region_name, route_table, cidr, attachment))
+      elif existing[cidr] != attachment:
+        changes.append(("replace", region_name, route_table, cidr, attachment))
+    if prune:
+      for cidr in sorted(set(existing) - set(routes)):
+        changes.append(("delete", region_name, route_table, cidr, existing[cidr]))
+  return changes
+
+
+def apply_change(change, limiters):
+  """
+  one route change, rate limited per region
+  """
+  action, region_name, route_table, cidr, attachment = change
+  client = get_client(region_name)
+  limiters[region_name].acquire()
+  if action == "create":
+    client.create_transit_gateway_route(
+      DestinationCidrBlock=cidr, TransitGatewayRouteTableId=route_table, TransitGatewayAttachmentId=attachment
+    )
+  elif action == "replace":
+    client.replace_transit_gateway_route(
+      DestinationCidrBlock=cidr, TransitGatewayRouteTableId=route_table, TransitGatewayAttachmentId=attachment
+    )
+  else:
+    client.delete_transit_gateway_route(DestinationCidrBlock=cidr, TransitGatewayRouteTableId=route_table)
+  return change
+
+
+def wait_for_routes(changes, timeout=TIMEOUT):
+  """
+  poll the changed route tables until created routes are active and deleted ones are
+  gone, ec2 has no waiter for transit gateway routes, returns the changes not settled
+  """
+  pending = set(changes)
+  deadline = time.monotonic() + timeout
+  while pending and time.monotonic() < deadline:
+    states = fetch_route_states({(region_name, route_table) for _, region_name, route_table, _, _ in pending})
+    pending = {change for change in pending if not settled(change, states[(change[1], change[2])])}
+    if pending:
+      time.sleep(POLL_INTERVAL)
+  return sorted(pending)
+
+
+def settled(change, states):
+  """
+  whether a route table shows the outcome of a change
+  """
+  action, _, _, cidr, attachment = change
+  state, target = states.get(cidr, ("deleted", None))
+  if action == "delete":
+    return state == "deleted"
+  return state == "active" and target == attachment
+
+
+def sync(path: str, dry_run=False, prune=False, rate=RATE, burst=BURST, timeout=TIMEOUT):
+  """
+  converge the route tables to the routes file, returns the planned changes
+  """
+  with open(path) as f:
+    spec = json.load(f)
+  regions = list(spec)
+  topology = discover(regions, kinds=["attachments"])
+  desired = load_desired(spec, topology)
+  current = current_routes(desired)
+  changes = diff(desired, current, prune)
+  for action, region_name, route_table, cidr, attachment in changes:
+    print(f"{action:<8} {region_name} {route_table} {cidr} -> {attachment}")
+  if dry_run or not changes:
+    print(f"{len(changes)} changes{' (dry run)' if dry_run else ''}")
+    return changes
+
+  start = time.perf_counter()
+  limiters = {region_name: RateLimiter(rate, burst) for region_name in regions}
+  with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(changes)))) as executor:
+    futures = [executor.submit(apply_change, change, limiters) for change in changes]
+    failed = []
+    for change, future in zip(changes, futures):
+      try:
+        future.result()
+      except Exception as e:
+        print(f"failed {change[0]} {change[3]} in {change[2]}: {e}")
+        failed.append(change)
+  unsettled = wait_for_routes([change for change in changes if change not in failed], timeout)
+  print(f"{len(changes) - len(failed)} changes applied in {time.perf_counter() - start:.1f}s at {rate:g}/s per region, "
+        f"{len(failed)} failed, {len(unsettled)} not settled")
+  if failed or unsettled:
+    sys.exit(1)
+  return changes
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="sync transit gateway routes to a routes file")
+  parser.add_argument("routes", help="JSON file, region -> CIDR -> attachment")
+  parser.add_argument("--dry-run", action="store_true", help="print the changes without applying them")
+  parser.add_argument("--prune", action="store_true", help="delete static routes not in the file")
+  parser.add_argument("--rate", type=float, default=RATE, help="route changes per second per region, the ec2 default limit")
+  parser.add_argument("--burst", type=int, default=BURST, help="route changes allowed at once before --rate applies")
+  parser.add_argument("--timeout", type=float, default=TIMEOUT, help="seconds to wait for routes to settle")
+  args = parser.parse_args()
+  sync(args.routes, args.dry_run, args.prune, args.rate, args.burst, args.timeout)